@@ -1,12 +1,318 @@
-import streamlit as st
-import pandas as pd
-import tempfile
-import os
 import io
+import os
+import tempfile
+import time
+import zipfile
+from datetime import datetime
+from types import SimpleNamespace
+
+import streamlit as st
+
+# Import our custom modules. Reports are generated by worker processes (report_jobs);
+# the app itself only imports the small VISITS reader when looking up trends.
+from report_cache import ReportCache, make_cache_key
+from report_jobs import ReportJobPool, ServerBusyError, generate_reports, generate_visit_report, split_export
+
+REPORT_BACKEND = "xlsxwriter"
+# Seconds between status checks while a report job is queued or running
+POLL_INTERVAL = 0.5
+
+def load_pipeline():
+    """Import the modules the app needs for the trend lookup and return their entry points."""
+    from ingest import read_visits
+    from visit_store import visit_identity
+    return SimpleNamespace(
+        read_visits=read_visits,
+        visit_identity=visit_identity,
+    )
+
+@st.cache_resource
+def get_job_pool():
+    """
+    Process-wide pool of report workers, shared by all sessions.
+
+    PPAR_REPORT_WORKERS sets the number of worker processes (default: up to 4, 0 runs
+    reports inline) and PPAR_MAX_QUEUED_REPORTS how many reports may be queued or
+    running before new requests are turned away (default: twice the workers).
+    """
+    workers = os.environ.get("PPAR_REPORT_WORKERS")
+    max_pending = os.environ.get("PPAR_MAX_QUEUED_REPORTS")
+    return ReportJobPool(max_workers=int(workers) if workers else None,
+                         max_pending=int(max_pending) if max_pending else None)
+
+@st.cache_resource(show_spinner=False)
+def start_pipeline_warmup():
+    """Start the report workers (which import the pipeline) once per process. Disable with PPAR_WARM_IMPORTS=0."""
+    if os.environ.get("PPAR_WARM_IMPORTS") == "0":
+        return False
+    get_job_pool().warm_up()
+    return True
+
+@st.cache_resource
+def get_report_cache():
+    """Process-wide report cache, shared by all sessions. Set PPAR_REPORT_CACHE_DIR to add a disk tier."""
+    return ReportCache(
+        disk_dir=os.environ.get("PPAR_REPORT_CACHE_DIR"),
+        max_disk_bytes=int(os.environ.get("PPAR_REPORT_CACHE_MAX_MB", "512")) * 1024 * 1024,
+        ttl_seconds=int(os.environ.get("PPAR_REPORT_CACHE_TTL", str(7 * 24 * 3600))),
+    )
+
+def parse_cache_settings():
+    """
+    Directory and size bound of the parsed raw export cache (Arrow files) used by the workers,
+    so re-running an upload skips the xlsx parse.
+    Set PPAR_PARSE_CACHE_DIR to choose the directory and PPAR_PARSE_CACHE_MAX_MB to bound it.
+    """
+    return (os.environ.get("PPAR_PARSE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "ppar_parsed_exports")),
+            int(os.environ.get("PPAR_PARSE_CACHE_MAX_MB", "1024")) * 1024 * 1024)
+
+@st.cache_resource
+def get_visit_store():
+    """Process-wide store of visit metrics for trend sheets. Set PPAR_VISIT_STORE to choose the SQLite file."""
+    from visit_store import VisitStore
+    return VisitStore()
+
+def profile_path(base_name, cache_key):
+    """
+    Where a job writes its cProfile data, or None when profiling is off.
+
+    Set PPAR_PROFILE_DIR to profile each request with cProfile (the .pstats files are
+    written there) and PPAR_TRACK_MEMORY=1 to record peak Python memory per stage.
+    """
+    profile_dir = os.environ.get("PPAR_PROFILE_DIR")
+    if not profile_dir:
+        return None
+    return os.path.join(profile_dir, f"{base_name}_{cache_key[:12]}.pstats")
+
+def store_reports(excel_data, pdf_data, excel_filename, pdf_filename, pipeline_stats):
+    """Keep the generated reports in session state for persistent downloads."""
+    st.session_state.excel_data = excel_data
+    st.session_state.pdf_data = pdf_data
+    st.session_state.excel_filename = excel_filename
+    st.session_state.pdf_filename = pdf_filename
+    st.session_state.pipeline_stats = pipeline_stats
+    st.session_state.processing_complete = True
+
+def report_cache_keys(upload_bytes, filename, manual_patient_data, previous_visits=None):
+    """
+    Cache keys of one upload's reports.
+
+    Returns:
+        (workbook key, PDF key, data key). Trend workbooks also depend on the earlier
+        visits in the store. The PDF shows the file name but none of the patient fields,
+        so editing them keeps its entry. The data key covers everything except the
+        patient fields, i.e. what Sheet2 and the PDF depend on
+    """
+    return (make_cache_key(upload_bytes, manual_patient_data, REPORT_BACKEND, extra=previous_visits),
+            make_cache_key(upload_bytes, None, "pdf", extra=filename),
+            make_cache_key(upload_bytes, None, REPORT_BACKEND, extra=previous_visits))
+
+def submit_report(filename, upload_bytes, manual_patient_data, include_trends=False, previous=None):
+    """
+    Look up one upload in the report cache, or queue it on the shared worker pool.
+
+    Args:
+        filename: Name of the uploaded file
+        upload_bytes: Raw bytes of the uploaded workbook
+        manual_patient_data: Dictionary with manual patient data
+        include_trends: Add the trend sheet with the patient's earlier visits
+        previous: The session's last report (see remember_report); when only the patient
+            fields changed since, just its Sheet1 is regenerated (optional)
+
+    Returns:
+        Dictionary with name, filenames, data_key, cache_keys, job (None when no job was
+        needed) and result (the reports, or None until the job is collected)
+
+    Raises:
+        ServerBusyError: the worker pool is full
+    """
+    # Create output filenames
+    base_name = filename.replace('.xlsx', '').replace('.xls', '').replace('.csv', '')
+    request = {
+        'name': filename,
+        'filenames': (f"processed_{base_name}.xlsx", f"report_{base_name}.pdf"),
+        'job': None,
+        'result': None,
+    }
+    
+    previous_visits = None
+    if include_trends:
+        # Only the small VISITS sheet is parsed to find the patient's earlier visits
+        pipeline = load_pipeline()
+        identity = pipeline.visit_identity(pipeline.read_visits(io.BytesIO(upload_bytes)), manual_patient_data)
+        previous_visits = get_visit_store().previous_visits(
+            identity['patient_id'], identity['visit_date']) if identity else []
+    
+    # Identical upload + patient fields return the stored reports without reprocessing
+    report_cache = get_report_cache()
+    cache_key, pdf_cache_key, request['data_key'] = report_cache_keys(upload_bytes, filename, manual_patient_data,
+                                                                      previous_visits)
+    request['cache_keys'] = (cache_key, pdf_cache_key)
+    excel_data = report_cache.get(cache_key)
+    pdf_data = report_cache.get(pdf_cache_key)
+    if excel_data is not None and pdf_data is not None:
+        request['result'] = {'excel_data': excel_data, 'pdf_data': pdf_data,
+                             'stages': [], 'total_seconds': 0, 'profile': ""}
+        return request
+    
+    if previous is not None and previous['data_key'] == request['data_key']:
+        result = patch_previous_report(previous, manual_patient_data)
+        if result is not None:
+            report_cache.put(cache_key, result['excel_data'])
+            report_cache.put(pdf_cache_key, result['pdf_data'])
+            request['result'] = result
+            return request
+    
+    parse_cache_dir, parse_cache_max_bytes = parse_cache_settings()
+    request['job'] = get_job_pool().submit(
+        generate_reports, upload_bytes, filename, manual_patient_data,
+        backend=REPORT_BACKEND, previous_visits=previous_visits,
+        parse_cache_dir=parse_cache_dir, parse_cache_max_bytes=parse_cache_max_bytes,
+        visit_store_path=get_visit_store().path,
+        profile_path=profile_path(base_name, cache_key),
+        track_memory=os.environ.get("PPAR_TRACK_MEMORY") == "1",
+        label=filename)
+    return request
+
+def submit_split(filename, upload_bytes):
+    """
+    Queue parsing one upload and splitting it by visit (see report_jobs.split_export).
+
+    Raises:
+        ServerBusyError: the worker pool is full
+    """
+    parse_cache_dir, parse_cache_max_bytes = parse_cache_settings()
+    job = get_job_pool().submit(split_export, upload_bytes, parse_cache_dir=parse_cache_dir,
+                                parse_cache_max_bytes=parse_cache_max_bytes, label=filename)
+    return {'name': filename, 'kind': 'split', 'job': job, 'result': None}
 
-# Import our custom modules
-from excel_processor import process_excel_report
-from pdf_processor import process_pdf_report
+def visit_request(filename, part):
+    """Request for one visit of a split upload; its job is submitted by submit_visit_report."""
+    base_name = filename.replace('.xlsx', '').replace('.xls', '').replace('.csv', '')
+    label = part['label']
+    return {
+        'name': f"{filename} [{label}]",
+        'source_name': filename,
+        'filenames': (f"processed_{base_name}_{label}.xlsx", f"report_{base_name}_{label}.pdf"),
+        'part': part,
+        'job': None,
+        'result': None,
+        # Per-visit reports are not cached, a repeated upload is split and built again
+        'cache_keys': None,
+        'status': 'waiting',
+    }
+
+def submit_visit_report(request, manual_patient_data):
+    """
+    Queue the reports of one visit from a split upload.
+
+    Raises:
+        ServerBusyError: the worker pool is full; the request keeps waiting
+    """
+    part = request['part']
+    request['job'] = get_job_pool().submit(
+        generate_visit_report, part['processed_df'], part['visits_df'], request['source_name'],
+        manual_patient_data, backend=REPORT_BACKEND, visit_store_path=get_visit_store().path,
+        track_memory=os.environ.get("PPAR_TRACK_MEMORY") == "1",
+        label=request['name'])
+    # The job holds the visit's data now
+    request['part'] = None
+    request['status'] = 'queued'
+
+def unique_filenames(archive_names, filenames, number):
+    """Archive names of one request's reports; names already in the archive get numbered."""
+    if filenames[0] in archive_names:
+        filenames = tuple(f"{number}_{name}" for name in filenames)
+    archive_names.update(filenames)
+    return filenames
+
+def patch_previous_report(previous, manual_patient_data):
+    """
+    Rebuild only Sheet1 of the session's last report for new patient fields.
+
+    Returns:
+        Result dictionary like generate_reports, or None when the whole report has to be regenerated
+    """
+    from pipeline_stats import PipelineStats
+    from report_patch import patch_sheet1
+    
+    stats = PipelineStats()
+    try:
+        with stats.stage('sheet1_patch', rows=previous['num_data_rows']):
+            excel_data = patch_sheet1(previous['excel_data'], previous['visits_df'], previous['num_data_rows'],
+                                      previous['manual_patient_data'], manual_patient_data)
+    except Exception as e:
+        print(f"Warning: could not patch Sheet1, regenerating the report: {e}")
+        return None
+    if excel_data is None:
+        return None
+    # The PDF does not show the patient fields
+    return {
+        'excel_data': excel_data,
+        'pdf_data': previous['pdf_data'],
+        'stages': stats.as_rows(),
+        'total_seconds': stats.total_seconds,
+        'profile': "",
+        'visits_df': previous['visits_df'],
+        'num_data_rows': previous['num_data_rows'],
+    }
+
+def remember_report(request, manual_patient_data):
+    """Keep the session's last generated report, so a patient-field edit only has to patch Sheet1."""
+    result = request['result']
+    if 'visits_df' in result:
+        st.session_state.report_source = {
+            'data_key': request['data_key'],
+            'excel_data': result['excel_data'],
+            'pdf_data': result['pdf_data'],
+            'visits_df': result['visits_df'],
+            'num_data_rows': result['num_data_rows'],
+            'manual_patient_data': manual_patient_data,
+        }
+    elif (st.session_state.report_source or {}).get('data_key') != request['data_key']:
+        # A cache hit for other data; the cached bytes alone cannot be patched
+        st.session_state.report_source = None
+
+def collect_report(request):
+    """
+    Reports of a request whose job is done (or that was a cache hit); fresh reports are added to the report cache.
+
+    Re-raises the exception of a failed job.
+    """
+    if request['result'] is None:
+        result = request['job'].result()
+        if request['cache_keys']:
+            cache_key, pdf_cache_key = request['cache_keys']
+            report_cache = get_report_cache()
+            report_cache.put(cache_key, result['excel_data'])
+            report_cache.put(pdf_cache_key, result['pdf_data'])
+        request['result'] = result
+    return request['result']
+
+def add_to_zip(zip_path, filenames, result):
+    """
+    Append one upload's reports to the ZIP archive on disk.
+
+    The archive grows as jobs finish, so the session holds at most one
+    upload's reports in memory rather than all of them plus the archive.
+    """
+    excel_filename, pdf_filename = filenames
+    with zipfile.ZipFile(zip_path, 'a') as archive:
+        # .xlsx files are ZIP archives already, compressing them again gains nothing
+        archive.writestr(excel_filename, result['excel_data'], compress_type=zipfile.ZIP_STORED)
+        archive.writestr(pdf_filename, result['pdf_data'], compress_type=zipfile.ZIP_DEFLATED)
+
+def show_processing_error(e):
+    st.error(f"❌ Error processing file: {str(e)}")
+    st.warning("💡 **Troubleshooting tips:**")
+    st.write("• Make sure your Excel file has the required sheets: 'FILES_DAT' and 'VISITS'")
+    st.write("• Check that the 'FILES_DAT' sheet has the required columns:")
+    st.write("  - File comment")
+    st.write("  - Maximum force (normalized to BW) /Total object/ [%BW]")
+    st.write("  - Force-time integral (normalized to BW) /Total object/ [%BW*s]")
+    st.write("  - Contact time/TO [ms]")
+    st.write("• If some data is missing, the app will use default values (0) for calculations")
+    st.write("• Try uploading a different Excel file or check the file format")
 
 def main():
     st.set_page_config(page_title="PVM gait lab report", page_icon="🏥", layout="centered")
@@ -25,9 +331,19 @@ def main():
         st.session_state.pdf_filename = None
     if 'processing_complete' not in st.session_state:
         st.session_state.processing_complete = False
+    if 'pipeline_stats' not in st.session_state:
+        st.session_state.pipeline_stats = None
+    if 'report_job' not in st.session_state:
+        st.session_state.report_job = None
+    if 'batch' not in st.session_state:
+        st.session_state.batch = None
+    if 'report_source' not in st.session_state:
+        st.session_state.report_source = None
     
-    # File uploader - only for Excel file now
-    uploaded_file = st.file_uploader("Choose the raw-data excel file", type=['xlsx', 'xls'], help="Upload Excel file with FILES_DAT and VISITS sheets")
+    # File uploader - one raw export, or several to get their reports as a ZIP
+    uploaded_files = st.file_uploader("Choose the raw-data excel file(s)", type=['xlsx', 'xls', 'csv'],
+                                      accept_multiple_files=True,
+                                      help="Upload Excel files with FILES_DAT and VISITS sheets")
     
     # Optional patient information input section
     st.subheader("📋 Optional Patient Information")
@@ -45,98 +361,266 @@ def main():
         purdue_id = st.text_input("Purdue_ID")
         primary_dvm = st.text_input("Primary DVM")
     
+    include_trends = st.checkbox("Add trend sheet with previous visits",
+                                 help="Compare this visit with earlier visits of the same patient (by MR-ID) "
+                                      "processed on this server")
+    per_visit = st.checkbox("One report per visit",
+                            help="Split exports that hold several visits (one VISITS row each) and "
+                                 "generate a report for every visit, downloaded as a ZIP. "
+                                 "Trend sheets are not added in this mode")
+    
+    # Prepare manual patient data
+    manual_patient_data = {
+        'species': species,
+        'breed': breed,
+        'color': color,
+        'purdue_id': purdue_id,
+        'primary_dvm': primary_dvm
+    }
+    
     # Add a button to generate reports
-    if uploaded_file is not None:
+    idle = st.session_state.report_job is None and st.session_state.batch is None
+    if len(uploaded_files) == 1 and idle and not per_visit:
+        uploaded_file = uploaded_files[0]
         # Generate Reports button
         if st.button("Generate Report", type="secondary", use_container_width=True):
             try:
-                with st.spinner("Processing your file and generating report..."):
-                    # Read the Excel file - both sheets
-                    df_files_dat = pd.read_excel(uploaded_file, sheet_name="FILES_DAT")
-                    df_visits = pd.read_excel(uploaded_file, sheet_name="VISITS")
-                    
-                    # Create output filenames
-                    base_name = uploaded_file.name.replace('.xlsx', '').replace('.xls', '')
-                    excel_filename = f"processed_{base_name}.xlsx"
-                    pdf_filename = f"report_{base_name}.pdf"
-                    
-                    # Create Excel output with colors and formatting
-                    excel_output = io.BytesIO()
-                    temp_excel = tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx")
-                    temp_excel.close()
-                    
-                    # Prepare manual patient data
-                    manual_patient_data = {
-                        'species': species,
-                        'breed': breed,
-                        'color': color,
-                        'purdue_id': purdue_id,
-                        'primary_dvm': primary_dvm
-                    }
-                    
-                    # Process Excel with patient data from VISITS sheet and manual inputs
-                    process_excel_report(df_files_dat, temp_excel.name, df_visits, manual_patient_data)
-                    
-                    # Create PDF report from Sheet1 of the processed Excel file
-                    # pdf_data = process_pdf_report(temp_excel.name, uploaded_file.name)
-                    
-                    # Read the processed Excel file into memory
-                    with open(temp_excel.name, "rb") as f:
-                        excel_output.write(f.read())
-                    excel_output.seek(0)
-                    
-                    # Clean up temporary Excel file AFTER both Excel and PDF processing
-                    os.unlink(temp_excel.name)
-                    
-                    # Store data in session state for persistent downloads
-                    st.session_state.excel_data = excel_output.getvalue()
-                    # st.session_state.pdf_data = pdf_data
-                    st.session_state.excel_filename = excel_filename
-                    # st.session_state.pdf_filename = pdf_filename
-                    st.session_state.processing_complete = True
-                
-                # st.success("✅ Reports generated successfully!")
-                st.rerun()  # Rerun to show download buttons
+                request = submit_report(uploaded_file.name, uploaded_file.getvalue(), manual_patient_data,
+                                        include_trends, previous=st.session_state.report_source)
+                request['manual_patient_data'] = manual_patient_data
+                if request['job'] is None:
+                    result = collect_report(request)
+                    remember_report(request, manual_patient_data)
+                    store_reports(result['excel_data'], result['pdf_data'], *request['filenames'], {
+                        'stages': result['stages'],
+                        'total_seconds': result['total_seconds'],
+                        'profile': result['profile'],
+                    })
+                else:
+                    # The report runs on the shared worker pool; this session polls it below
+                    st.session_state.report_job = request
+                st.rerun()  # Rerun to show the job status or the download buttons
             
+            except ServerBusyError as e:
+                st.error(f"⏳ Server busy: {e}")
             except Exception as e:
-                st.error(f"❌ Error processing file: {str(e)}")
-                st.warning("💡 **Troubleshooting tips:**")
-                st.write("• Make sure your Excel file has the required sheets: 'FILES_DAT' and 'VISITS'")
-                st.write("• Check that the 'FILES_DAT' sheet has the required columns:")
-                st.write("  - File comment")
-                st.write("  - Maximum force (normalized to BW) /Total object/ [%BW]")
-                st.write("  - Force-time integral (normalized to BW) /Total object/ [%BW*s]")
-                st.write("  - Contact time/TO [ms]")
-                st.write("• If some data is missing, the app will use default values (0) for calculations")
-                st.write("• Try uploading a different Excel file or check the file format")
+                show_processing_error(e)
+    
+    elif uploaded_files and (len(uploaded_files) > 1 or per_visit) and idle:
+        label = "Generate Reports per Visit" if per_visit else f"Generate {len(uploaded_files)} Reports"
+        if st.button(label, type="secondary", use_container_width=True):
+            # All files are queued at once and processed in parallel by the workers; split
+            # uploads get one request per visit once their split job is done
+            requests = []
+            archive_names = set()
+            for uploaded_file in uploaded_files:
+                try:
+                    if per_visit:
+                        request = submit_split(uploaded_file.name, uploaded_file.getvalue())
+                    else:
+                        request = submit_report(uploaded_file.name, uploaded_file.getvalue(), manual_patient_data,
+                                                include_trends)
+                    request['status'] = 'queued'
+                except ServerBusyError as e:
+                    request = {'name': uploaded_file.name, 'status': 'busy', 'error': str(e)}
+                except Exception as e:
+                    request = {'name': uploaded_file.name, 'status': 'failed', 'error': str(e)}
+                # Uploads with the same name get numbered entries in the archive
+                if 'filenames' in request:
+                    request['filenames'] = unique_filenames(archive_names, request['filenames'], len(requests) + 1)
+                requests.append(request)
+            
+            # The directory is removed with the batch: on "Process New Files", when a new batch
+            # replaces it, or when the session ends and its state is garbage collected
+            zip_dir = tempfile.TemporaryDirectory(prefix="ppar_reports_")
+            zip_path = os.path.join(zip_dir.name, "reports.zip")
+            with zipfile.ZipFile(zip_path, 'w'):
+                pass
+            st.session_state.batch = {
+                'requests': requests,
+                'archive_names': archive_names,
+                'manual_patient_data': manual_patient_data,
+                'zip_dir': zip_dir,
+                'zip_path': zip_path,
+                'zip_filename': f"gait_reports_{datetime.now():%Y%m%d_%H%M}.zip",
+            }
+            st.rerun()
+    
+    # Add finished files of a multi-file upload to the ZIP and show each file's status
+    batch = st.session_state.batch
+    if batch is not None:
+        in_progress = False
+        # Split jobs add their visits' requests to the list while it is walked
+        for request in list(batch['requests']):
+            if request['status'] == 'waiting':
+                try:
+                    submit_visit_report(request, batch['manual_patient_data'])
+                except ServerBusyError:
+                    # Submitted on a later poll, once other reports have finished
+                    in_progress = True
+                    continue
+            if request['status'] not in ('queued', 'running'):
+                continue
+            job = request['job']
+            if job is not None and not job.done():
+                request['status'] = job.status
+                in_progress = True
+                continue
+            if request.get('kind') == 'split':
+                try:
+                    parts = job.result()
+                except Exception as e:
+                    request['status'] = 'failed'
+                    request['error'] = str(e)
+                else:
+                    request['status'] = 'split'
+                    request['visits'] = len(parts)
+                    visit_requests = []
+                    for part in parts:
+                        visit = visit_request(request['name'], part)
+                        visit['filenames'] = unique_filenames(batch['archive_names'], visit['filenames'],
+                                                              len(batch['requests']) + len(visit_requests) + 1)
+                        visit_requests.append(visit)
+                    position = batch['requests'].index(request) + 1
+                    batch['requests'][position:position] = visit_requests
+                    in_progress = True
+                request['job'] = None
+                continue
+            try:
+                result = collect_report(request)
+                add_to_zip(batch['zip_path'], request['filenames'], result)
+                request['status'] = 'done'
+                request['seconds'] = result['total_seconds']
+            except Exception as e:
+                request['status'] = 'failed'
+                request['error'] = str(e)
+            # The reports live in the archive now
+            request['result'] = None
+            request['job'] = None
+        
+        for request in batch['requests']:
+            status = request['status']
+            if status in ('queued', 'waiting'):
+                st.write(f"⏳ {request['name']}: waiting for a free worker")
+            elif status == 'split':
+                st.write(f"🔀 {request['name']}: {request['visits']} visit{'s' if request['visits'] != 1 else ''}")
+            elif status == 'running':
+                st.write(f"⚙️ {request['name']}: processing...")
+            elif status == 'done':
+                cached = " (from cache)" if not request['seconds'] else f" in {request['seconds']:.1f}s"
+                st.write(f"✅ {request['name']}: done{cached}")
+            elif status == 'busy':
+                st.write(f"⏳ {request['name']}: server busy, not processed - {request['error']}")
+            elif status == 'cancelled':
+                st.write(f"✖️ {request['name']}: cancelled")
+            else:
+                st.write(f"❌ {request['name']}: {request['error']}")
+        
+        if in_progress:
+            if st.button("✖️ Cancel remaining", use_container_width=True):
+                for request in batch['requests']:
+                    if request['status'] == 'waiting' or (request['status'] == 'queued'
+                                                          and request['job'].cancel()):
+                        request['status'] = 'cancelled'
+                        request['job'] = None
+                        request['part'] = None
+                st.rerun()
+            time.sleep(POLL_INTERVAL)
+            st.rerun()
+        
+        done = sum(1 for request in batch['requests'] if request['status'] == 'done')
+        if done:
+            with open(batch['zip_path'], 'rb') as archive:
+                st.download_button(f"📦 Download {done} report{'s' if done != 1 else ''} (ZIP)",
+                                   data=archive, file_name=batch['zip_filename'], mime="application/zip")
+        if st.button("🔄 Process New Files", use_container_width=True):
+            batch['zip_dir'].cleanup()
+            st.session_state.batch = None
+            st.rerun()
+    
+    # Poll the session's report job until it finishes
+    pending = st.session_state.report_job
+    if pending is not None:
+        job = pending['job']
+        if not job.done():
+            if job.status == 'queued':
+                ahead = get_job_pool().queue_position(job)
+                st.info(f"⏳ Waiting for a free worker ({ahead} report{'s' if ahead != 1 else ''} ahead of yours)...")
+            else:
+                st.info(f"⚙️ Processing your file and generating report... ({job.elapsed:.0f}s)")
+            if st.button("✖️ Cancel", use_container_width=True):
+                job.cancel()
+                st.session_state.report_job = None
+                st.rerun()
+            time.sleep(POLL_INTERVAL)
+            st.rerun()
+        
+        st.session_state.report_job = None
+        try:
+            result = collect_report(pending)
+        except Exception as e:
+            show_processing_error(e)
+        else:
+            remember_report(pending, pending['manual_patient_data'])
+            store_reports(result['excel_data'], result['pdf_data'], *pending['filenames'], {
+                'stages': result['stages'],
+                'total_seconds': result['total_seconds'],
+                'profile': result['profile'],
+            })
+            st.rerun()  # Rerun to show download buttons
     
     # Show download buttons if processing is complete
     if st.session_state.processing_complete and st.session_state.excel_data:
         # st.success("✅ Reports generated successfully! Download your files below.")
         
-        # col1, col2 = st.columns(2)
-        # with col1:
-        st.download_button("📥 Download Processed Excel", 
-                         data=st.session_state.excel_data,
-                         file_name=st.session_state.excel_filename,
-                         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-        # with col2:
-        #     st.download_button("📄 Download PDF Report", 
-        #                      data=st.session_state.pdf_data,
-        #                      file_name=st.session_state.pdf_filename, 
-        #                      mime="application/pdf")
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("📥 Download Processed Excel", 
+                             data=st.session_state.excel_data,
+                             file_name=st.session_state.excel_filename,
+                             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        with col2:
+            st.download_button("📄 Download PDF Report", 
+                             data=st.session_state.pdf_data,
+                             file_name=st.session_state.pdf_filename, 
+                             mime="application/pdf")
+        
+        cache_stats = get_report_cache().stats()
+        st.caption(f"Report cache: {cache_stats['memory_hits'] + cache_stats['disk_hits']} hits, "
+                   f"{cache_stats['misses']} misses, {cache_stats['entries']} reports in memory")
+        
+        pipeline_stats = st.session_state.pipeline_stats
+        if pipeline_stats is not None:
+            with st.expander("⏱️ Processing details"):
+                if not pipeline_stats['stages']:
+                    st.write("Served from the report cache, nothing was reprocessed.")
+                else:
+                    st.write(f"Total: {pipeline_stats['total_seconds']:.2f}s")
+                    st.dataframe([{
+                        'stage': "    " * stage['depth'] + stage['name'],
+                        'seconds': round(stage['seconds'], 3),
+                        'rows': stage['rows'],
+                        'peak memory (MB)': stage['peak_memory_mb'],
+                        'max RSS (MB)': stage['max_rss_mb'],
+                    } for stage in pipeline_stats['stages']], hide_index=True)
+                if pipeline_stats['profile']:
+                    st.code(pipeline_stats['profile'])
         
         # Add a button to clear session state and start over
         if st.button("🔄 Process New File", use_container_width=True):
             st.session_state.excel_data = None
-            # st.session_state.pdf_data = None
+            st.session_state.pdf_data = None
             st.session_state.excel_filename = None
-            # st.session_state.pdf_filename = None
+            st.session_state.pdf_filename = None
+            st.session_state.pipeline_stats = None
             st.session_state.processing_complete = False
             st.rerun()
     
-    elif not st.session_state.processing_complete:
+    elif not st.session_state.processing_complete and idle:
         st.info("Please upload the raw-data excel file to get started!")
+    
+    # The page is rendered, start the report workers in the background
+    start_pipeline_warmup()
 
 if __name__ == "__main__":
     main()
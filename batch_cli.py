@@ -0,0 +1,347 @@
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+
+RAW_EXTENSIONS = ('.xlsx', '.xls', '.csv')
+
+
+def find_input_files(patterns, recursive=False):
+    """
+    Expand directories and glob patterns into a sorted list of raw workbook paths.
+
+    Generated reports (processed_*.xlsx), Excel lock files (~$*) and the VISITS files of
+    CSV exports (*_VISITS.csv, read along with their FILES_DAT CSV) are skipped.
+    """
+    from ingest import CSV_VISITS_SUFFIX
+
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            sub_pattern = os.path.join(pattern, '**', '*') if recursive else os.path.join(pattern, '*')
+            candidates = glob.glob(sub_pattern, recursive=recursive)
+        else:
+            candidates = glob.glob(pattern, recursive=recursive)
+        for path in candidates:
+            name = os.path.basename(path)
+            if (os.path.isfile(path) and name.lower().endswith(RAW_EXTENSIONS)
+                    and not name.startswith(('processed_', '~$')) and not name.endswith(CSV_VISITS_SUFFIX)):
+                paths.add(os.path.abspath(path))
+    return sorted(paths)
+
+
+def output_paths(input_path, output_dir=None, visit_label=None):
+    """Return the (excel, pdf) output paths for a raw workbook (or one visit of it), named like the app's downloads."""
+    base_name = os.path.basename(input_path).replace('.xlsx', '').replace('.xls', '').replace('.csv', '')
+    if visit_label:
+        base_name = f"{base_name}_{visit_label}"
+    target_dir = output_dir or os.path.dirname(input_path)
+    return (os.path.join(target_dir, f"processed_{base_name}.xlsx"),
+            os.path.join(target_dir, f"report_{base_name}.pdf"))
+
+
+def process_file(input_path, output_dir=None, make_pdf=False, backend="openpyxl", manual_patient_data=None,
+                 visit_store_path=None, trend=False, parse_cache_dir=None):
+    """
+    Generate the report(s) for one raw workbook. Runs inside a worker process.
+
+    With visit_store_path the visit is saved to that SQLite store, and trend adds
+    the "Trends" sheet with the patient's earlier visits from it. parse_cache_dir
+    reuses earlier parses of identical raw exports.
+
+    Returns:
+        Dictionary with the input path, written outputs, elapsed seconds and error (None on success)
+    """
+    from ingest import read_raw_workbook
+    from excel_processor import process_original_excel_data
+
+    start = time.perf_counter()
+    result = {'input': input_path, 'outputs': [], 'seconds': None, 'error': None}
+    try:
+        parse_cache = None
+        if parse_cache_dir:
+            from parsed_cache import ParsedExportCache
+            parse_cache = ParsedExportCache(parse_cache_dir)
+        df_files_dat, df_visits = read_raw_workbook(input_path, cache=parse_cache)
+        processed_df = process_original_excel_data(df_files_dat)
+        result['outputs'] = write_reports(processed_df, df_visits, input_path, output_paths(input_path, output_dir),
+                                          make_pdf, backend, manual_patient_data, visit_store_path, trend)
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def split_file(input_path, parse_cache_dir=None):
+    """
+    Parse one raw workbook and split it by visit (see visit_split.split_by_visit). Runs inside a worker process.
+
+    Returns:
+        List of dictionaries with label, processed_df and visits_df per VISITS row
+
+    Raises:
+        ValueError: the trials cannot be matched to the VISITS rows
+    """
+    from ingest import read_raw_workbook
+    from excel_processor import process_original_excel_data
+    from visit_split import split_by_visit
+
+    parse_cache = None
+    if parse_cache_dir:
+        from parsed_cache import ParsedExportCache
+        parse_cache = ParsedExportCache(parse_cache_dir)
+    df_files_dat, df_visits = read_raw_workbook(input_path, cache=parse_cache)
+    return split_by_visit(process_original_excel_data(df_files_dat), df_visits)
+
+
+def process_visit(input_path, part, output_dir=None, make_pdf=False, backend="openpyxl", manual_patient_data=None,
+                  visit_store_path=None, trend=False):
+    """
+    Generate the report(s) for one visit from split_file. Runs inside a worker process.
+
+    Returns:
+        Dictionary like process_file, its input named "<path> [<visit label>]"
+    """
+    start = time.perf_counter()
+    result = {'input': f"{input_path} [{part['label']}]", 'outputs': [], 'seconds': None, 'error': None}
+    try:
+        result['outputs'] = write_reports(part['processed_df'], part['visits_df'], input_path,
+                                          output_paths(input_path, output_dir, part['label']),
+                                          make_pdf, backend, manual_patient_data, visit_store_path, trend)
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def write_reports(processed_df, df_visits, input_path, paths, make_pdf=False, backend="openpyxl",
+                  manual_patient_data=None, visit_store_path=None, trend=False):
+    """
+    Write the workbook (and PDF) of processed trial rows to paths, an (excel, pdf) pair from output_paths.
+
+    Returns:
+        List of the written paths
+    """
+    from excel_processor import process_excel_report
+    from limb_groups import build_limb_groups
+
+    excel_path, pdf_path = paths
+    outputs = []
+    # Parse the limb/trial labels once for the metrics, the workbook and the PDF
+    limb_groups = build_limb_groups(processed_df["Data Source"])
+
+    metrics = None
+    identity = None
+    trend_visits = None
+    if visit_store_path:
+        from gait_metrics import compute_gait_metrics
+        from visit_store import VisitStore, visit_identity, visit_summary
+        identity = visit_identity(df_visits, manual_patient_data)
+        if identity is not None:
+            metrics = compute_gait_metrics(processed_df, limb_groups)
+            if trend:
+                store = VisitStore(visit_store_path)
+                try:
+                    trend_visits = (store.previous_visits(identity['patient_id'], identity['visit_date'])
+                                    + [visit_summary(identity, metrics)])
+                finally:
+                    store.close()
+
+    excel_data = process_excel_report(processed_df, None, df_visits, manual_patient_data, backend=backend,
+                                      preprocessed=True, trend_visits=trend_visits, limb_groups=limb_groups)
+    # A file whose report could not be built is not recorded as a visit
+    if identity is not None:
+        store = VisitStore(visit_store_path)
+        try:
+            store.record_visit(identity, metrics, os.path.basename(input_path))
+        finally:
+            store.close()
+    with open(excel_path, 'wb') as f:
+        f.write(excel_data)
+    outputs.append(excel_path)
+
+    if make_pdf:
+        from pdf_processor import build_pdf_report
+        if metrics is None:
+            from gait_metrics import compute_gait_metrics
+            metrics = compute_gait_metrics(processed_df, limb_groups)
+        pdf_data = build_pdf_report(processed_df, os.path.basename(input_path), metrics)
+        with open(pdf_path, 'wb') as f:
+            f.write(pdf_data)
+        outputs.append(pdf_path)
+    return outputs
+
+
+def run_batch(input_files, output_dir=None, workers=None, make_pdf=False, backend="openpyxl",
+              manual_patient_data=None, on_result=None, visit_store_path=None, trend=False, parse_cache_dir=None,
+              per_visit=False):
+    """
+    Process many raw workbooks across a process pool.
+
+    A failure in one file is recorded in its result and never stops the batch.
+    With per_visit every workbook is parsed once and split by visit, and the
+    visits' reports are submitted to the pool as soon as their split is done.
+
+    Args:
+        input_files: List of raw workbook paths
+        output_dir: Directory for the outputs, defaults to next to each input
+        workers: Number of worker processes (default: CPU count), 1 runs in this process
+        make_pdf: Also write the PDF report
+        backend: Writer backend passed to process_excel_report
+        manual_patient_data: Dictionary with manual patient data applied to every report (optional)
+        on_result: Callback invoked with each result dictionary as it completes
+        visit_store_path: SQLite visit store to save every visit to (optional)
+        trend: Add the trend sheet from visit_store_path to every report
+        parse_cache_dir: Directory of the parsed export cache (optional)
+        per_visit: Write one report per VISITS row of each workbook
+
+    Returns:
+        List of result dictionaries in completion order
+    """
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    results = []
+    if per_visit:
+        _run_per_visit(input_files, workers, (output_dir, make_pdf, backend, manual_patient_data, visit_store_path,
+                                              trend), parse_cache_dir, results, on_result)
+        return results
+
+    job_args = (output_dir, make_pdf, backend, manual_patient_data, visit_store_path, trend, parse_cache_dir)
+    if workers == 1:
+        for path in input_files:
+            result = process_file(path, *job_args)
+            results.append(result)
+            if on_result:
+                on_result(result)
+        return results
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(process_file, path, *job_args): path for path in input_files}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker process itself died (e.g. out of memory)
+                result = {'input': futures[future], 'outputs': [], 'seconds': None,
+                          'error': f"{type(e).__name__}: {e}"}
+            results.append(result)
+            if on_result:
+                on_result(result)
+    return results
+
+
+def _run_per_visit(input_files, workers, visit_args, parse_cache_dir, results, on_result):
+    """run_batch with per_visit: split jobs first, each finished split queues its visits' report jobs."""
+    def record(result):
+        results.append(result)
+        if on_result:
+            on_result(result)
+
+    def failed(name, e, start=None):
+        return {'input': name, 'outputs': [], 'error': f"{type(e).__name__}: {e}",
+                'seconds': time.perf_counter() - start if start is not None else None}
+
+    if workers == 1:
+        for path in input_files:
+            start = time.perf_counter()
+            try:
+                parts = split_file(path, parse_cache_dir)
+            except Exception as e:
+                record(failed(path, e, start))
+                continue
+            for part in parts:
+                record(process_visit(path, part, *visit_args))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        splits = {executor.submit(split_file, path, parse_cache_dir): path for path in input_files}
+        reports = {}
+        while splits or reports:
+            done, _ = wait([*splits, *reports], return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in splits:
+                    path = splits.pop(future)
+                    try:
+                        parts = future.result()
+                    except Exception as e:
+                        record(failed(path, e))
+                        continue
+                    for part in parts:
+                        report = executor.submit(process_visit, path, part, *visit_args)
+                        reports[report] = f"{path} [{part['label']}]"
+                else:
+                    name = reports.pop(future)
+                    try:
+                        record(future.result())
+                    except Exception as e:
+                        # The worker process itself died (e.g. out of memory)
+                        record(failed(name, e))
+
+
+def print_result(result):
+    name = os.path.basename(result['input'])
+    seconds = f"{result['seconds']:.2f}s" if result['seconds'] is not None else "-"
+    if result['error']:
+        print(f"FAILED {name} ({seconds}): {result['error']}", flush=True)
+    else:
+        print(f"ok     {name} ({seconds}) -> {', '.join(os.path.basename(p) for p in result['outputs'])}", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate gait lab reports for many raw pressure-platform exports.")
+    parser.add_argument("inputs", nargs="+", help="Directories or glob patterns of raw .xlsx/.xls/.csv files")
+    parser.add_argument("-o", "--output-dir", help="Write outputs here instead of next to each input")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("-r", "--recursive", action="store_true", help="Search directories recursively")
+    parser.add_argument("--pdf", action="store_true", help="Also generate the PDF report")
+    parser.add_argument("--backend", default="openpyxl", help="Excel writer backend (openpyxl or xlsxwriter)")
+    parser.add_argument("--reader-engine", choices=["calamine", "openpyxl", "xlrd", "pyarrow", "c"],
+                        help="Preferred input reader engine for the formats it reads (default: fastest installed)")
+    parser.add_argument("--parse-cache", help="Directory to cache parsed raw exports in, for faster reruns")
+    parser.add_argument("--visit-store", help="SQLite visit store to save each visit to")
+    parser.add_argument("--trend", action="store_true",
+                        help="Add a trend sheet with the patient's earlier visits from --visit-store "
+                             "(with several workers, visits of one patient in the same batch may not see each other)")
+    parser.add_argument("--per-visit", action="store_true",
+                        help="Split exports with several visits and write one report per VISITS row")
+    for field, label in [("species", "Species"), ("breed", "Breed"), ("color", "Color"),
+                         ("purdue_id", "Purdue_ID"), ("primary_dvm", "Primary DVM")]:
+        parser.add_argument(f"--{field.replace('_', '-')}", dest=field, default="", help=f"{label} for every report")
+    args = parser.parse_args(argv)
+
+    if args.trend and not args.visit_store:
+        parser.error("--trend needs --visit-store")
+
+    if args.reader_engine:
+        # Read by ingest.select_engine in every worker; files it cannot read use their fastest engine
+        os.environ["PPAR_READER_ENGINE"] = args.reader_engine
+
+    input_files = find_input_files(args.inputs, recursive=args.recursive)
+    if not input_files:
+        print("No raw .xlsx/.xls/.csv files found")
+        return 1
+
+    manual_patient_data = {
+        'species': args.species,
+        'breed': args.breed,
+        'color': args.color,
+        'purdue_id': args.purdue_id,
+        'primary_dvm': args.primary_dvm,
+    }
+
+    print(f"Processing {len(input_files)} file(s)...", flush=True)
+    start = time.perf_counter()
+    results = run_batch(input_files, args.output_dir, args.workers, args.pdf, args.backend,
+                        manual_patient_data, on_result=print_result, visit_store_path=args.visit_store,
+                        trend=args.trend, parse_cache_dir=args.parse_cache, per_visit=args.per_visit)
+    failures = [result for result in results if result['error']]
+    print(f"Done: {len(results) - len(failures)} succeeded, {len(failures)} failed "
+          f"in {time.perf_counter() - start:.2f}s")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,266 @@
+import argparse
+import io
+import json
+import platform
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import openpyxl
+import pandas as pd
+
+from excel_processor import (process_original_excel_data, process_sheet1_data, process_sheet2_data)
+from limb_groups import build_limb_groups
+from ingest import available_engines, read_raw_workbook
+from pdf_processor import build_pdf_report
+from synthetic_data import make_files_dat, make_visits, write_raw_workbook
+
+DEFAULT_SIZES = [4, 100, 1000, 10000, 100000]
+# Modules whose import cost decides how fast the app serves its first page after a restart
+STARTUP_MODULES = ['app', 'excel_processor', 'pdf_processor', 'ingest', 'gait_metrics', 'writer_backends',
+                   'report_cache', 'pipeline_stats']
+MANUAL_PATIENT_DATA = {'species': 'Canine', 'breed': 'Labrador', 'color': 'Black',
+                       'purdue_id': 'P-0001', 'primary_dvm': 'Dr. Synthetic'}
+
+
+def time_call(func, *args, **kwargs):
+    """Run func once and return (result, elapsed seconds)."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def benchmark_size(num_trials, repeat=3, include_pdf=True, seed=0):
+    """
+    Time each pipeline stage on a synthetic export of num_trials trial rows.
+
+    The sheet and PDF stages run on the processed frame, like the app, so filtering
+    is only counted in process_original_excel_data.
+
+    Returns:
+        Dictionary of stage name -> best time in seconds over repeat runs, plus output size
+    """
+    files_dat = make_files_dat(num_trials, seed=seed)
+    visits = make_visits(seed=seed)
+
+    stages = {}
+
+    def record(stage, seconds):
+        stages[stage] = min(stages.get(stage, seconds), seconds)
+
+    output_bytes = None
+    for _ in range(repeat):
+        processed_df, seconds = time_call(process_original_excel_data, files_dat)
+        record('process_original_excel_data', seconds)
+
+        wb = openpyxl.Workbook()
+        ws2 = wb.create_sheet("Sheet2")
+        ws1 = wb.active
+        ws1.title = "Sheet1"
+        limb_groups, seconds = time_call(build_limb_groups, processed_df["Data Source"])
+        record('build_limb_groups', seconds)
+        num_data_rows, seconds = time_call(process_sheet2_data, processed_df, ws2, preprocessed=True,
+                                           limb_groups=limb_groups)
+        record('process_sheet2_data', seconds)
+
+        _, seconds = time_call(process_sheet1_data, ws1, visits, num_data_rows + 6, num_data_rows + 10,
+                               MANUAL_PATIENT_DATA)
+        record('process_sheet1_data', seconds)
+
+        buffer = io.BytesIO()
+        _, seconds = time_call(wb.save, buffer)
+        record('workbook_save', seconds)
+        output_bytes = buffer.getvalue()
+
+        if include_pdf:
+            _, seconds = time_call(build_pdf_report, processed_df, "synthetic.xlsx")
+            record('build_pdf_report', seconds)
+
+    stages['total'] = sum(seconds for stage, seconds in stages.items())
+    return {'num_trials': num_trials, 'stages': stages, 'xlsx_bytes': len(output_bytes)}
+
+
+def measure_import_time(module, top=10):
+    """
+    Import module in a fresh interpreter with -X importtime.
+
+    Returns:
+        Dictionary with the module's cumulative import time in ms and its heaviest
+        direct dependencies as (name, cumulative ms) pairs
+    """
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                               capture_output=True, text=True, check=True)
+    # Lines look like "import time: self [us] | cumulative | imported package"; nesting is
+    # shown by indenting the package name by two more spaces per level
+    timings = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        timings.append((depth, name.strip(), int(cumulative) / 1000))
+
+    # Dependencies are printed before the module that imported them, one level deeper
+    module_index = next((i for i, (depth, name, _) in enumerate(timings) if depth == 0 and name == module), None)
+    if module_index is None:
+        return {'cumulative_ms': None, 'heaviest': []}
+    children = []
+    for depth, name, ms in reversed(timings[:module_index]):
+        if depth == 0:
+            break
+        if depth == 1:
+            children.append((name, ms))
+    children.sort(key=lambda item: item[1], reverse=True)
+    return {'cumulative_ms': timings[module_index][2], 'heaviest': children[:top]}
+
+
+def run_import_benchmarks(modules=STARTUP_MODULES, repeat=3):
+    """Best cumulative import time of each module over repeat fresh interpreters."""
+    results = {}
+    for module in modules:
+        best = None
+        for _ in range(repeat):
+            result = measure_import_time(module)
+            if best is None or result['cumulative_ms'] < best['cumulative_ms']:
+                best = result
+        results[module] = best
+        heaviest = ", ".join(f"{name} {ms:.0f}ms" for name, ms in best['heaviest'][:3])
+        print(f"import {module:<20} {best['cumulative_ms']:8.1f}ms  ({heaviest})", flush=True)
+    return results
+
+
+def benchmark_engines(num_trials, repeat=3, seed=0):
+    """
+    Time read_raw_workbook with every installed reader engine on one synthetic export.
+
+    The export is written once as an xlsx workbook and once as a FILES_DAT CSV; xlsx is
+    also read with the chunked openpyxl reader ("openpyxl-streamed").
+
+    Returns:
+        Dictionary of "<format>/<engine>" -> best seconds and FILES_DAT rows per second
+    """
+    files_dat = make_files_dat(num_trials, seed=seed)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        xlsx_path = os.path.join(tmp_dir, "synthetic.xlsx")
+        csv_path = os.path.join(tmp_dir, "synthetic.csv")
+        write_raw_workbook(xlsx_path, files_dat, make_visits(seed=seed))
+        files_dat.to_csv(csv_path, index=False)
+
+        readers = {f"xlsx/{engine}": (xlsx_path, engine, False) for engine in available_engines('xlsx')}
+        readers["xlsx/openpyxl-streamed"] = (xlsx_path, 'openpyxl', True)
+        readers.update({f"csv/{engine}": (csv_path, engine, None) for engine in available_engines('csv')})
+
+        results = {}
+        for name, (path, engine, streaming) in readers.items():
+            best = min(time_call(read_raw_workbook, path, streaming=streaming, engine=engine)[1]
+                       for _ in range(repeat))
+            results[name] = {'seconds': best, 'rows_per_second': len(files_dat) / best if best else None}
+    return results
+
+
+def run_engine_benchmarks(sizes, repeat=3):
+    """Run benchmark_engines for every size."""
+    results = {}
+    for num_trials in sizes:
+        results[str(num_trials)] = benchmark_engines(num_trials, repeat=repeat)
+        engines = ", ".join(f"{name} {result['seconds']:.3f}s ({result['rows_per_second']:,.0f} rows/s)"
+                            for name, result in results[str(num_trials)].items())
+        print(f"{num_trials:>7} trials read: {engines}", flush=True)
+    return results
+
+
+def run_benchmarks(sizes, repeat=3, include_pdf=True):
+    """Run benchmark_size for every size and wrap the results with environment metadata."""
+    results = []
+    for num_trials in sizes:
+        result = benchmark_size(num_trials, repeat=repeat, include_pdf=include_pdf)
+        results.append(result)
+        stages = ", ".join(f"{stage} {seconds:.3f}s" for stage, seconds in result['stages'].items())
+        print(f"{num_trials:>7} trials: {stages}", flush=True)
+
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'openpyxl': openpyxl.__version__,
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def compare_results(baseline, current):
+    """Print per-stage speedups of current over baseline for the sizes both runs contain."""
+    baseline_by_size = {result['num_trials']: result for result in baseline['results']}
+    for result in current['results']:
+        old = baseline_by_size.get(result['num_trials'])
+        if old is None:
+            continue
+        print(f"{result['num_trials']:>7} trials:")
+        for stage, seconds in result['stages'].items():
+            old_seconds = old['stages'].get(stage)
+            if old_seconds is None:
+                continue
+            ratio = old_seconds / seconds if seconds else float('inf')
+            print(f"    {stage:<30} {old_seconds:9.3f}s -> {seconds:9.3f}s  ({ratio:.2f}x)")
+
+    old_engines = baseline.get('engines', {})
+    for size, engines in current.get('engines', {}).items():
+        for name, result in engines.items():
+            old = old_engines.get(size, {}).get(name)
+            if old is None or not result['seconds']:
+                continue
+            print(f"    read {size:>7} trials {name:<24} {old['seconds']:9.3f}s -> {result['seconds']:9.3f}s  "
+                  f"({old['seconds'] / result['seconds']:.2f}x)")
+
+    old_imports = baseline.get('imports', {})
+    for module, result in current.get('imports', {}).items():
+        old = old_imports.get(module)
+        if old is None or not old['cumulative_ms'] or not result['cumulative_ms']:
+            continue
+        ratio = old['cumulative_ms'] / result['cumulative_ms']
+        print(f"    import {module:<23} {old['cumulative_ms']:8.1f}ms -> {result['cumulative_ms']:8.1f}ms  "
+              f"({ratio:.2f}x)")
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time each stage of the report pipeline on synthetic exports.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="Trial row counts to benchmark (up to 100000)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per size, the best time is kept")
+    parser.add_argument("--no-pdf", action="store_true", help="Skip the PDF stage")
+    parser.add_argument("--imports", action="store_true",
+                        help="Also measure module import times (python -X importtime) for app startup")
+    parser.add_argument("--engines", action="store_true",
+                        help="Also compare the input reader engines (xlsx and CSV) on each size")
+    parser.add_argument("-o", "--output", default="benchmark_results.json", help="Where to write the JSON results")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.sizes, repeat=args.repeat, include_pdf=not args.no_pdf)
+    if args.imports:
+        report['imports'] = run_import_benchmarks(repeat=args.repeat)
+    if args.engines:
+        report['engines'] = run_engine_benchmarks(args.sizes, repeat=args.repeat)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare_results(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,44 +1,92 @@
+import io
 import pandas as pd
 import re
 import colorsys
+from collections import namedtuple
 from datetime import datetime, date
 from openpyxl import Workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
-from openpyxl.styles import PatternFill, Alignment, Font, Border, Side
 from openpyxl.utils import get_column_letter
-from openpyxl.drawing.image import Image
-from openpyxl.drawing.spreadsheet_drawing import OneCellAnchor
-from openpyxl.utils.units import pixels_to_EMU
+from openpyxl.worksheet.formula import ArrayFormula
 
-def process_excel_report(df, excel_filename, visits_df, manual_patient_data=None):
+from ingest import COLUMN_MAPPING
+from limb_groups import LIMBS, build_limb_groups
+from pipeline_stats import NULL_STATS
+from report_assets import make_dog_image
+from report_styles import NAMED_STYLES, apply_style
+from writer_backends import REPORT_SHEETS, SheetRecorder, get_writer_backend
+
+# Sheet1 layout: first patient information row and the row of the DogTopView image
+SHEET1_PATIENT_INFO_ROW = 3
+SHEET1_DOG_IMAGE_ROW = SHEET1_PATIENT_INFO_ROW + 9
+
+# Formula cell of the Sheet1 template pointing at Sheet2: column, base row ('summary' or
+# 'forelimb', see summary_rows) and offset from it
+Sheet2Ref = namedtuple('Sheet2Ref', ['column', 'base', 'offset'])
+Sheet1Template = namedtuple('Sheet1Template', ['cells', 'merged_ranges', 'row_heights', 'column_widths'])
+_sheet1_template = None
+
+TREND_SHEET = "Trends"
+# Trend sheet metric groups: (header, visit summary field), one column per limb each
+TREND_METRICS = [("%BW", "max_force"), ("VI [%BW*s]", "impulse"),
+                 ("Contact time [ms]", "contact_time"), ("Weight bearing [%]", "weight_bearing")]
+TREND_LIMBS = [("LF", "CCCCFF"), ("LH", "CCFFCC"), ("RF", "FFCCCC"), ("RH", "FFD699")]
+
+# Sheet2 helper column holding each data row's limb (LF, LH, RF, RH), the key of the summary formulas
+LIMB_KEY_COLUMN = 8  # Column H, hidden
+
+
+def process_excel_report(df, excel_filename, visits_df, manual_patient_data=None, backend="openpyxl", stats=None,
+                         preprocessed=False, trend_visits=None, limb_groups=None):
     """
     Main function that creates the Excel file with both sheets.
     This is the ONLY function accessible to main in app.py.
     
     Args:
-        df: DataFrame with the data from FILES_DAT sheet
-        excel_filename: Output Excel filename
+        df: DataFrame with the data from FILES_DAT sheet, or the output of
+            process_original_excel_data when preprocessed is True
+        excel_filename: Output Excel filename or writable binary file object,
+            None to get the workbook back as bytes
         visits_df: DataFrame with patient data from VISITS sheet
         manual_patient_data: Dictionary with manual patient data (optional)
+        backend: Writer backend name, "openpyxl" (default) or "xlsxwriter" for faster output
+        stats: PipelineStats that collects per-stage timings (optional)
+        preprocessed: df was already filtered and renamed by process_original_excel_data,
+            so the same frame can also feed the PDF report
+        trend_visits: Visit summaries (visit_store.visit_summary), oldest first with this
+            visit last; adds a "Trends" sheet comparing them (optional)
+        limb_groups: LimbGroups of the preprocessed df (GaitMetrics.limb_groups), so the
+            labels are not parsed again (optional)
+
+    Returns:
+        The workbook bytes when excel_filename is None, otherwise None
     """
+    target = io.BytesIO() if excel_filename is None else excel_filename
+    stats = stats if stats is not None else NULL_STATS
     try:
-        wb = Workbook()
-        
-        # Create Sheet2 first and process it with all data
-        ws2 = wb.create_sheet("Sheet2")
-        num_data_rows = process_sheet2_data(df, ws2)
-        
-        # Calculate the row numbers for summary tables in Sheet2
-        summary_start_row = num_data_rows + 6  # Main data + gap + summary table start
-        forelimb_start_row = num_data_rows + 10  # SI values are always at rows 16 and 17 in Sheet2
-        
-        # Create Sheet1 and process it with formulas referencing Sheet2
-        ws1 = wb.active
-        ws1.title = "Sheet1"
-        process_sheet1_data(ws1, visits_df, summary_start_row, forelimb_start_row, manual_patient_data)
-        
-        # Save the workbook
-        wb.save(excel_filename)
+        save_workbook = get_writer_backend(backend)
+        sheet_names = REPORT_SHEETS + (TREND_SHEET,) if trend_visits is not None else REPORT_SHEETS
+
+        def build_sheets(ws1, ws2, ws3=None):
+            # Create Sheet2 first and process it with all data
+            with stats.stage('sheet2') as record:
+                num_data_rows = process_sheet2_data(df, ws2, stats, preprocessed, limb_groups)
+                record.rows = num_data_rows
+
+            # Calculate the row numbers for summary tables in Sheet2
+            summary_start_row, forelimb_start_row = summary_rows(num_data_rows)
+
+            # Process Sheet1 with formulas referencing Sheet2
+            with stats.stage('sheet1'):
+                process_sheet1_data(ws1, visits_df, summary_start_row, forelimb_start_row, manual_patient_data, stats)
+
+            if ws3 is not None:
+                with stats.stage('trends', rows=len(trend_visits)):
+                    add_trend_sheet(ws3, trend_visits)
+
+        # Build both sheets and save the workbook
+        save_workbook(target, build_sheets, stats, sheet_names)
+        if excel_filename is None:
+            return target.getvalue()
         
     except Exception as e:
         print(f"Error in process_excel_report: {e}")
@@ -48,14 +96,24 @@ def process_excel_report(df, excel_filename, visits_df, manual_patient_data=None
             ws = wb.active
             ws.title = "Error"
             ws.cell(row=1, column=1, value=f"Error processing file: {str(e)}")
-            wb.save(excel_filename)
+            if hasattr(target, 'seek'):
+                target.seek(0)
+                target.truncate()
+            wb.save(target)
         except:
-            # If even saving fails, create a simple text file
-            with open(excel_filename.replace('.xlsx', '_error.txt'), 'w') as f:
-                f.write(f"Error processing file: {str(e)}")
+            # If even saving fails, create a simple text file next to the output path
+            if isinstance(target, str):
+                with open(target.replace('.xlsx', '_error.txt'), 'w') as f:
+                    f.write(f"Error processing file: {str(e)}")
         raise e
 
-def process_sheet1_data(ws1, visits_df, summary_start_row, forelimb_start_row, manual_patient_data=None):
+def summary_rows(num_data_rows):
+    """Sheet2 rows of the summary table and the forelimb/hindlimb SI table that Sheet1 refers to."""
+    summary_start_row = num_data_rows + 6  # Main data + gap + summary table start
+    forelimb_start_row = num_data_rows + 10  # SI values are always at rows 16 and 17 in Sheet2
+    return summary_start_row, forelimb_start_row
+
+def process_sheet1_data(ws1, visits_df, summary_start_row, forelimb_start_row, manual_patient_data=None, stats=NULL_STATS):
     """
     Process Sheet1 - populate patient data from VISITS sheet and manual inputs, add summary averages table from Sheet2.
     
@@ -63,23 +121,15 @@ def process_sheet1_data(ws1, visits_df, summary_start_row, forelimb_start_row, m
         ws1: Worksheet object for Sheet1
         visits_df: DataFrame with patient data from VISITS sheet
         manual_patient_data: Dictionary with manual patient data (optional)
+        stats: PipelineStats that collects per-stage timings (optional)
     """
-    # Set up the dashboard layout
-    ws1.row_dimensions[1].height = 30  # Set title row height
-    
-    # Add main title
-    ws1.merge_cells(f'B1:C1')
-    title_cell = ws1.cell(row=1, column=2, value="PVH gait lab report")
-    title_cell.font = Font(bold=True, size=16)
-    title_cell.alignment = Alignment(horizontal="center", vertical="center")
+    # Set up the dashboard layout: everything that is the same in every report
+    # comes from the template, only the cells below are written per report
+    render_sheet1_template(ws1, summary_start_row, forelimb_start_row)
     
     # Add current date beside the title (small format)
     current_date = datetime.now().strftime("%d/%m/%Y")
-    date_cell = ws1.cell(row=1, column=4, value=current_date)
-    date_cell.font = Font(size=10)
-    date_cell.alignment = Alignment(horizontal="center", vertical="center")
-    
-    patient_info_row = 3
+    apply_style(ws1.cell(row=1, column=4, value=current_date), 'date')
     
     # Extract patient data from VISITS sheet (first row, excluding N3, N2, N1 columns)
     if not visits_df.empty:
@@ -170,152 +220,123 @@ def process_sheet1_data(ws1, visits_df, summary_start_row, forelimb_start_row, m
     # Convert signalment list to string
     signalment = ", ".join(signalment) if signalment else ""
     
-    # Add patient information labels in column 1 and values in column 3
-    patient_labels = ["Name:", "Signalment:", "MR-ID:", "VisitDate:", "BW:", "PrimaryDVM:", "Purdue-ID:"]
+    # Add patient values in column 2, next to the template's labels
     patient_values = [full_name, signalment, visits_id, visit_date, body_weight, primary_dvm, manual_id]
-    ws1.merge_cells(f'B{patient_info_row+1}:H{patient_info_row+1}')
-    
-    for row_idx, (label, value) in enumerate(zip(patient_labels, patient_values), patient_info_row):
-        # Add label in column 1
-        label_cell = ws1.cell(row=row_idx, column=1, value=label)
-        label_cell.font = Font(bold=True, size=12)
-        label_cell.alignment = Alignment(horizontal="left", vertical="center")
-        
-        # Add value in column 2
-        value_cell = ws1.cell(row=row_idx, column=2, value=value)
-        value_cell.font = Font(size=12)
-        value_cell.alignment = Alignment(horizontal="left", vertical="center")
-    
-    # No image insertion - leave the area empty or add a placeholder
+    for row_idx, value in enumerate(patient_values, SHEET1_PATIENT_INFO_ROW):
+        apply_style(ws1.cell(row=row_idx, column=2, value=value), 'value')
     
     # Insert the fixed DogTopView.png above the summary table
-    try:
-        # Try to insert DogTopView.png
-        dog_img = Image('DogTopView.png')
-        
-        # Size the image to fit above the summary table
-        dog_img.width = 130  # 1.5 columns wide
-        dog_img.height = 400  # Maintain aspect ratio
-        dog_image_row = patient_info_row + 9
-        # Position above the summary table
-        ws1.add_image(dog_img, f'B{dog_image_row}')
-        
-    except Exception as e:
-        # If DogTopView.png is not found, add a placeholder
-        placeholder_cell = ws1.cell(row=dog_image_row, column=2, value="[DogTopView.png not found]")
+    dog_image_row = SHEET1_DOG_IMAGE_ROW
+    with stats.stage('embed_image'):
+        # Loaded and scaled to 130x400 (1.5 columns wide) once per process
+        dog_img = make_dog_image()
+        if dog_img is not None:
+            # Position above the summary table
+            ws1.add_image(dog_img, f'B{dog_image_row}')
+        else:
+            # If DogTopView.png is not found, add a placeholder
+            ws1.cell(row=dog_image_row, column=2, value="[DogTopView.png not found]")
+
+def get_sheet1_template():
+    """Static Sheet1 layout, compiled once per process by build_sheet1_template."""
+    global _sheet1_template
+    if _sheet1_template is None:
+        _sheet1_template = build_sheet1_template()
+    return _sheet1_template
+
+def render_sheet1_template(ws1, summary_start_row, forelimb_start_row):
+    """Replay the static Sheet1 layout onto a worksheet, resolving its references to the Sheet2 summary rows."""
+    template = get_sheet1_template()
+    base_rows = {'summary': summary_start_row, 'forelimb': forelimb_start_row}
+    for row, height in template.row_heights:
+        ws1.row_dimensions[row].height = height
+    for range_string in template.merged_ranges:
+        ws1.merge_cells(range_string)
+    for row, column, value, style, fill in template.cells:
+        if isinstance(value, Sheet2Ref):
+            value = f"=Sheet2!{value.column}{base_rows[value.base] + value.offset}"
+        cell = ws1.cell(row=row, column=column, value=value)
+        if style is not None:
+            apply_style(cell, style, fill)
+    for col_letter, width in template.column_widths:
+        ws1.column_dimensions[col_letter].width = width
 
-    cell_lf = ws1.cell(row=dog_image_row+5, column=1)
-    cell_lf.fill = PatternFill(start_color='CCCCFF', end_color='CCCCFF', fill_type='solid')
-    cell_lf.value = f"=Sheet2!E{summary_start_row + 1}"
+def build_sheet1_template():
+    """
+    Build the parts of Sheet1 that do not depend on the patient as a list of cell operations.
+
+    Returns:
+        Sheet1Template; cells are (row, column, value, style name, fill color) with
+        Sheet2Ref values for the formulas that follow the Sheet2 summary rows
+    """
+    cells = []
+    merged_ranges = []
     
+    # Set title row height
+    row_heights = [(1, 30)]
     
-    # C13 - Rt. Forelimb color (light red)
-    cell_rf = ws1.cell(row=dog_image_row+5, column=3)
-    cell_rf.fill = PatternFill(start_color='FFCCCC', end_color='FFCCCC', fill_type='solid')
-    cell_rf.value = f"=Sheet2!E{summary_start_row + 3}"
+    # Add main title
+    merged_ranges.append('B1:C1')
+    cells.append((1, 2, "PVH gait lab report", 'title', None))
     
-    # A23 - Lt. Hindlimb color (light green)
-    cell_lh = ws1.cell(row=dog_image_row+13, column=1)
-    cell_lh.fill = PatternFill(start_color='CCFFCC', end_color='CCFFCC', fill_type='solid')
-    cell_lh.value = f"=Sheet2!E{summary_start_row + 2}"
+    # Add patient information labels in column 1, the values go in column 2
+    patient_info_row = SHEET1_PATIENT_INFO_ROW
+    patient_labels = ["Name:", "Signalment:", "MR-ID:", "VisitDate:", "BW:", "PrimaryDVM:", "Purdue-ID:"]
+    merged_ranges.append(f'B{patient_info_row+1}:H{patient_info_row+1}')
+    for row_idx, label in enumerate(patient_labels, patient_info_row):
+        cells.append((row_idx, 1, label, 'label', None))
+    
+    # Limb colours around the DogTopView image, showing the weight bearing of each limb
+    dog_image_row = SHEET1_DOG_IMAGE_ROW
+    # A17 - Lt. Forelimb color (light blue)
+    cells.append((dog_image_row+5, 1, Sheet2Ref("E", 'summary', 1), 'plain', 'CCCCFF'))
+    # C17 - Rt. Forelimb color (light red)
+    cells.append((dog_image_row+5, 3, Sheet2Ref("E", 'summary', 3), 'plain', 'FFCCCC'))
+    # A25 - Lt. Hindlimb color (light green)
+    cells.append((dog_image_row+13, 1, Sheet2Ref("E", 'summary', 2), 'plain', 'CCFFCC'))
+    # C25 - Rt. Hindlimb color (light orange)
+    cells.append((dog_image_row+13, 3, Sheet2Ref("E", 'summary', 4), 'plain', 'FFD699'))
     
-    # B23 - Rt. Hindlimb color (light orange)
-    cell_rh = ws1.cell(row=dog_image_row+13, column=3)
-    cell_rh.fill = PatternFill(start_color='FFD699', end_color='FFD699', fill_type='solid')
-    cell_rh.value = f"=Sheet2!E{summary_start_row + 4}"
     # Add summary averages table from Sheet2 below the DogTopView image
-    # Start from row 14 to give space for the DogTopView image above
     start_row = dog_image_row + 20
-        
+    
     # Create summary table headers
     summary_headers = ["", "%BW", "VI [%BW*s]", "Contact time [ms]", "Weight bearing"]
     for col_idx, header in enumerate(summary_headers):
-        header_cell = ws1.cell(row=start_row + 1, column=col_idx + 1, value=header)
-        header_cell.font = Font(bold=True)
-        header_cell.alignment = Alignment(horizontal="center", vertical="center")
         # Add grey fill to the metric headers (skip the first empty column)
-        if col_idx > 0:  # Skip the first empty column
-            header_cell.fill = PatternFill(start_color='D3D3D3', end_color='D3D3D3', fill_type='solid')
-    
-    # Add summary data with formulas referencing Sheet2 summary table
-    # Use the passed row numbers for simple cell references
-    
-    # LF Summary - use simple cell references
-    ws1.cell(row=start_row + 2, column=1, value="Lt. Forelimb").font = Font(bold=True)
-    # Add blue fill to Lt. Forelimb
-    lt_forelimb_cell = ws1.cell(row=start_row + 2, column=1)
-    lt_forelimb_cell.fill = PatternFill(start_color='CCCCFF', end_color='CCCCFF', fill_type='solid')
-    ws1.cell(row=start_row + 2, column=2, value=f"=Sheet2!B{summary_start_row + 1}")
-    ws1.cell(row=start_row + 2, column=3, value=f"=Sheet2!C{summary_start_row + 1}")
-    ws1.cell(row=start_row + 2, column=4, value=f"=Sheet2!D{summary_start_row + 1}")
-    ws1.cell(row=start_row + 2, column=5, value=f"=Sheet2!E{summary_start_row + 1}")
-    
-    # RF Summary - use simple cell references
-    ws1.cell(row=start_row + 3, column=1, value="Rt. Forelimb").font = Font(bold=True)
-    # Add red fill to Rt. Forelimb
-    rt_forelimb_cell = ws1.cell(row=start_row + 3, column=1)
-    rt_forelimb_cell.fill = PatternFill(start_color='FFCCCC', end_color='FFCCCC', fill_type='solid')
-    ws1.cell(row=start_row + 3, column=2, value=f"=Sheet2!B{summary_start_row + 3}")
-    ws1.cell(row=start_row + 3, column=3, value=f"=Sheet2!C{summary_start_row + 3}")
-    ws1.cell(row=start_row + 3, column=4, value=f"=Sheet2!D{summary_start_row + 3}")
-    ws1.cell(row=start_row + 3, column=5, value=f"=Sheet2!E{summary_start_row + 3}")
-
-    # LH Summary - use simple cell references
-    ws1.cell(row=start_row + 4, column=1, value="Lt. Hindlimb").font = Font(bold=True)
-    # Add green fill to Lt. Hindlimb
-    lt_hindlimb_cell = ws1.cell(row=start_row + 4, column=1)
-    lt_hindlimb_cell.fill = PatternFill(start_color='CCFFCC', end_color='CCFFCC', fill_type='solid')
-    ws1.cell(row=start_row + 4, column=2, value=f"=Sheet2!B{summary_start_row + 2}")
-    ws1.cell(row=start_row + 4, column=3, value=f"=Sheet2!C{summary_start_row + 2}")
-    ws1.cell(row=start_row + 4, column=4, value=f"=Sheet2!D{summary_start_row + 2}")
-    ws1.cell(row=start_row + 4, column=5, value=f"=Sheet2!E{summary_start_row + 2}")
-    
-    
-    # RH Summary - use simple cell references
-    ws1.cell(row=start_row + 5, column=1, value="Rt. Hindlimb").font = Font(bold=True)
-    # Add orange fill to Rt. Hindlimb
-    rt_hindlimb_cell = ws1.cell(row=start_row + 5, column=1)
-    rt_hindlimb_cell.fill = PatternFill(start_color='FFD699', end_color='FFD699', fill_type='solid')
-    ws1.cell(row=start_row + 5, column=2, value=f"=Sheet2!B{summary_start_row + 4}")
-    ws1.cell(row=start_row + 5, column=3, value=f"=Sheet2!C{summary_start_row + 4}")
-    ws1.cell(row=start_row + 5, column=4, value=f"=Sheet2!D{summary_start_row + 4}")
-    ws1.cell(row=start_row + 5, column=5, value=f"=Sheet2!E{summary_start_row + 4}")
+        header_fill = 'D3D3D3' if col_idx > 0 else None
+        cells.append((start_row + 1, col_idx + 1, header, 'header', header_fill))
+    
+    # Add summary data with formulas referencing Sheet2 summary table rows
+    # (LF, LH, RF, RH order there, Lt./Rt. Forelimb then Lt./Rt. Hindlimb here)
+    for row_offset, (label, fill, summary_offset) in enumerate([("Lt. Forelimb", 'CCCCFF', 1),
+                                                                 ("Rt. Forelimb", 'FFCCCC', 3),
+                                                                 ("Lt. Hindlimb", 'CCFFCC', 2),
+                                                                 ("Rt. Hindlimb", 'FFD699', 4)], 2):
+        cells.append((start_row + row_offset, 1, label, 'bold', fill))
+        for column, col_letter in enumerate("BCDE", 2):
+            cells.append((start_row + row_offset, column, Sheet2Ref(col_letter, 'summary', summary_offset), None, None))
     
     abbreviations_row = start_row+6
-    ws1.merge_cells(f'D{abbreviations_row}:E{abbreviations_row}')
-    abbreviations_cell = ws1.cell(row=abbreviations_row, column=4, value="*BW: body weight, VI: vertical impulse")
-    abbreviations_cell.font = Font(italic=True, size=10, underline='single')
-    abbreviations_cell.alignment = Alignment(horizontal="center", vertical="center")
-    
-    # Color the 4 specified cells with the same colors as limb labels
-    # A13 - Lt. Forelimb color (light blue)
+    merged_ranges.append(f'D{abbreviations_row}:E{abbreviations_row}')
+    cells.append((abbreviations_row, 4, "*BW: body weight, VI: vertical impulse", 'footnote', None))
     
-
     # Add Forelimb/Hindlimb summary below the main summary table
     forelimb_start_row_sheet1 = dog_image_row + 7
-    ws1.merge_cells(f'C{forelimb_start_row_sheet1}:D{forelimb_start_row_sheet1}')
-    forelimb_cell = ws1.cell(row=forelimb_start_row_sheet1, column=3, value="Symmetry Index (SI)")
-    forelimb_cell.font = Font(bold=True, size=14)
-    forelimb_cell.alignment = Alignment(horizontal="right", vertical="center")
+    merged_ranges.append(f'C{forelimb_start_row_sheet1}:D{forelimb_start_row_sheet1}')
+    cells.append((forelimb_start_row_sheet1, 3, "Symmetry Index (SI)", 'heading_right', None))
     
     # Add forelimb/hindlimb data with original formulae
-    forelimb_label = ws1.cell(row=forelimb_start_row_sheet1 + 1, column=3, value="Forelimb")
-    forelimb_label.font = Font(bold=True)
-    forelimb_label.alignment = Alignment(horizontal="right", vertical="center")
-    ws1.cell(row=forelimb_start_row_sheet1 + 1, column=4, value=f"=Sheet2!B{forelimb_start_row + 2}")
-    
-    hindlimb_label = ws1.cell(row=forelimb_start_row_sheet1 + 2, column=3, value="Hindlimb")
-    hindlimb_label.font = Font(bold=True)
-    hindlimb_label.alignment = Alignment(horizontal="right", vertical="center")
-    ws1.cell(row=forelimb_start_row_sheet1 + 2, column=4, value=f"=Sheet2!B{forelimb_start_row + 3}")
+    cells.append((forelimb_start_row_sheet1 + 1, 3, "Forelimb", 'bold_right', None))
+    cells.append((forelimb_start_row_sheet1 + 1, 4, Sheet2Ref("B", 'forelimb', 2), None, None))
+    cells.append((forelimb_start_row_sheet1 + 2, 3, "Hindlimb", 'bold_right', None))
+    cells.append((forelimb_start_row_sheet1 + 2, 4, Sheet2Ref("B", 'forelimb', 3), None, None))
     
     abbreviations2_row = forelimb_start_row_sheet1+3
-    ws1.merge_cells(f'C{abbreviations2_row}:D{abbreviations2_row}')
-    abbreviations_cell2 = ws1.cell(row=abbreviations2_row, column=3, value="*lower SI means more symmetric")
-    abbreviations_cell2.font = Font(italic=True, size=10, underline='single')
-    abbreviations_cell2.alignment = Alignment(horizontal="right", vertical="center")
-    # Set column widths dynamically based on header and content lengths
-    # Get the maximum width needed for each column
+    merged_ranges.append(f'C{abbreviations2_row}:D{abbreviations2_row}')
+    cells.append((abbreviations2_row, 3, "*lower SI means more symmetric", 'footnote_right', None))
+    
+    # Set column widths based on header lengths
     column_widths = {}
     # Apply -10 adjustment to all columns
     column_widths['A'] = 11  # 15
@@ -327,69 +348,88 @@ def process_sheet1_data(ws1, visits_df, summary_start_row, forelimb_start_row, m
             header_length = len(str(header))
             # Subtract 10 from the calculated width
             column_widths[col_letter] = max(header_length - 10, 15)  # Minimum width of 8
-    for col_letter, width in column_widths.items():
-        ws1.column_dimensions[col_letter].width = width
+    
+    return Sheet1Template(tuple(cells), tuple(merged_ranges), tuple(row_heights), tuple(column_widths.items()))
 
-def process_sheet2_data(df, ws2):
+def process_sheet2_data(df, ws2, stats=NULL_STATS, preprocessed=False, limb_groups=None):
     """
     Process and format Sheet2 with data processing, coloring, and additional columns.
+
+    Formulas, colours and summaries follow the limb/trial labels in "Data Source"
+    (see limb_groups.build_limb_groups), not the row order.
     """
-    processed_df = process_original_excel_data(df)
+    if preprocessed:
+        processed_df = df
+    else:
+        with stats.stage('filter', rows=len(df)) as record:
+            processed_df = process_original_excel_data(df)
+            record.rows = len(processed_df)
+            limb_groups = None
     num_data_rows = len(processed_df)
+    if limb_groups is None:
+        limb_groups = build_limb_groups(processed_df["Data Source"])
 
-    # Write DataFrame to Sheet2 with proper formatting
-    # Write headers first with bold formatting
-    for col_idx, col_name in enumerate(processed_df.columns):
-        header_cell = ws2.cell(row=1, column=col_idx + 1, value=col_name)
-        header_cell.font = Font(bold=True)
-        header_cell.alignment = Alignment(horizontal="center", vertical="center")
-    
-    # Write data rows with center alignment
-    for row_idx, (_, row_data) in enumerate(processed_df.iterrows(), 2): # Start from row 2 for data
-        for col_idx, value in enumerate(row_data):
-            data_cell = ws2.cell(row=row_idx, column=col_idx + 1, value=value)
-            data_cell.alignment = Alignment(horizontal="center", vertical="center")
-    
-    # Add additional columns to the right
-    add_additional_columns_to_sheet2(ws2, num_data_rows)
-    
-    # Calculate and populate weight bearing percentages
-    write_weight_bearing_formulae(ws2, num_data_rows)
-    
-    # Write asymmetry index formulae
-    write_asymmetry_formulae(ws2, num_data_rows)
-    
-    # Apply coloring to Data Source and Weight bearing columns
-    apply_coloring(ws2, num_data_rows)
+    with stats.stage('write_cells', rows=num_data_rows):
+        # Write DataFrame to Sheet2 with proper formatting
+        # Write headers first with bold formatting
+        for col_idx, col_name in enumerate(processed_df.columns):
+            apply_style(ws2.cell(row=1, column=col_idx + 1, value=col_name), 'header')
+        
+        # Write data rows with center alignment
+        write_data_rows(ws2, processed_df, 2) # Start from row 2 for data
+        
+        # Add additional columns to the right
+        add_additional_columns_to_sheet2(ws2, num_data_rows)
+        
+        # Hidden limb key column that the summary formulas select rows by
+        write_limb_key_column(ws2, limb_groups)
     
-    # Add summary table with averages
-    add_summary_averages_table(ws2, num_data_rows)
+    with stats.stage('formulas', rows=num_data_rows):
+        # Calculate and populate weight bearing percentages
+        write_weight_bearing_formulae(ws2, num_data_rows, limb_groups)
+        
+        # Write asymmetry index formulae
+        write_asymmetry_formulae(ws2, num_data_rows, limb_groups)
     
-    # Add forelimb/hindlimb asymmetry summary table
-    add_forelimb_hindlimb_summary(ws2, num_data_rows)
+    with stats.stage('coloring', rows=num_data_rows):
+        # Apply coloring to Data Source and Weight bearing columns
+        apply_coloring(ws2, num_data_rows, limb_groups)
     
-    # Set column widths based on content
-    set_column_widths(ws2, processed_df)
+    with stats.stage('summary_tables', rows=num_data_rows):
+        # Add summary table with averages
+        add_summary_averages_table(ws2, num_data_rows, limb_groups)
+        
+        # Add forelimb/hindlimb asymmetry summary table
+        add_forelimb_hindlimb_summary(ws2, num_data_rows, limb_groups)
+        
+        # Set column widths based on content
+        set_column_widths(ws2, processed_df)
 
     return num_data_rows
 
+def write_data_rows(ws2, processed_df, start_row):
+    """Write the processed DataFrame values below the header, all sharing one center alignment."""
+    if isinstance(ws2, SheetRecorder):
+        ws2.write_block(start_row, 1, processed_df, alignment=NAMED_STYLES['center'][1])
+        return
+
+    for row_idx, row_data in enumerate(processed_df.itertuples(index=False, name=None), start_row):
+        for col_idx, value in enumerate(row_data, 1):
+            apply_style(ws2.cell(row=row_idx, column=col_idx, value=value), 'center')
+
 def process_original_excel_data(df):
     """Process and filter the original Excel data with robust error handling."""
     try:
-        processed_df = df.copy()
+        # Filtering and the column selection below copy, so df itself is never modified
+        processed_df = df
 
         # Filter out rows with '.dat' in "File short name"
         if "File short name" in processed_df.columns:
             processed_df = processed_df[~processed_df["File short name"].str.endswith(".dat", na=False)]
 
         # Select and rename required columns with error handling
-        column_mapping = {
-            "File comment": "Data Source",
-            "Maximum force (normalized to BW) /Total object/ [%BW]": "Maximum force [%BW]",
-            "Force-time integral (normalized to BW) /Total object/ [%BW*s]": "Force-time integral [%BW*s]",
-            "Contact time/TO [ms]": "Contact time/TO [ms]",
-        }
-        
+        column_mapping = COLUMN_MAPPING
+
         # Check which columns exist and only use available ones
         available_columns = []
         for original_col, new_col in column_mapping.items():
@@ -407,10 +447,20 @@ def process_original_excel_data(df):
         for col in processed_df.columns:
             if col != "Data Source":  # Don't fill text columns
                 # Fill numeric columns with 0 for missing values
-                processed_df[col] = pd.to_numeric(processed_df[col], errors='coerce').fillna(0)
+                values = pd.to_numeric(processed_df[col], errors='coerce')
+                if values.dtype == 'float32':
+                    # Compact metrics from the chunked read: widen through the shortest decimal
+                    # repr so e.g. 23.45 stays 23.45 instead of 23.450000762939453
+                    values = pd.Series(values.to_numpy().astype(str).astype('float64'), index=values.index)
+                processed_df[col] = values.fillna(0)
 
         # Convert LF1 -> LF_1, LH2 -> LH_2, etc. with error handling
-        if "Data Source" in processed_df.columns:
+        if "Data Source" in processed_df.columns and isinstance(processed_df["Data Source"].dtype, pd.CategoricalDtype):
+            # Categorical labels from the chunked read: convert each distinct label once
+            labels = {label: re.sub(r'([A-Z]+)(\d+)', r'\1_\2', str(label))
+                      for label in processed_df["Data Source"].cat.categories}
+            processed_df["Data Source"] = processed_df["Data Source"].map(labels).astype(object).fillna("Unknown").astype(str)
+        elif "Data Source" in processed_df.columns:
             processed_df["Data Source"] = processed_df["Data Source"].apply(
                 lambda x: re.sub(r'([A-Z]+)(\d+)', r'\1_\2', str(x)) if pd.notna(x) else "Unknown"
             )
@@ -458,117 +508,82 @@ def add_additional_columns_to_sheet2(ws2, num_data_rows):
     # Add empty column E with arrow in center
     if num_data_rows > 0:
         arrow_row_idx = (num_data_rows // 2) + 2 # +2 because Excel is 1-indexed
-        arrow_cell = ws2.cell(row=arrow_row_idx, column=5, value="→")  # Column E
-        arrow_cell.font = Font(size=14)
-        arrow_cell.alignment = Alignment(horizontal="center", vertical="center")
+        apply_style(ws2.cell(row=arrow_row_idx, column=5, value="→"), 'arrow')  # Column E
         
         # Also add a header for column E to make it clear
-        arrow_header = ws2.cell(row=1, column=5, value="→")
-        arrow_header.font = Font(size=12)
-        arrow_header.alignment = Alignment(horizontal="center", vertical="center")
+        apply_style(ws2.cell(row=1, column=5, value="→"), 'arrow_header')
 
     # Add two more columns with headings
     # Column F: Weight bearing [%]
-    weight_header = ws2.cell(row=1, column=6, value="Weight bearing [%]")
-    weight_header.font = Font(bold=True)
-    weight_header.alignment = Alignment(horizontal="center", vertical="center")
+    apply_style(ws2.cell(row=1, column=6, value="Weight bearing [%]"), 'header')
     
     # Column G: Asymmetry Index
-    asym_header = ws2.cell(row=1, column=7, value="Asymmetery Index (L to R: SI)")
-    asym_header.font = Font(bold=True)
-    asym_header.alignment = Alignment(horizontal="center", vertical="center")
-    
-    # Center-align all data cells in the new columns
-    for row_idx in range(2, num_data_rows + 2): # Start from row 2 for data
-        # Column E (arrow column) - leave empty except for arrow
-        if row_idx != arrow_row_idx:
-            ws2.cell(row=row_idx, column=5, value="").alignment = Alignment(horizontal="center", vertical="center")
-        # Column F (weight bearing)
-        ws2.cell(row=row_idx, column=6, value="").alignment = Alignment(horizontal="center", vertical="center")
-        # Column G (asymmetry index)
-        ws2.cell(row=row_idx, column=7, value="").alignment = Alignment(horizontal="center", vertical="center")
-
-def write_weight_bearing_formulae(ws2, num_data_rows):
-    """Write weight bearing formulae for all rows with error handling."""
+    apply_style(ws2.cell(row=1, column=7, value="Asymmetery Index (L to R: SI)"), 'header')
+
+    # Data cells in E, F and G are only created when a formula or fill is written to them
+
+def write_limb_key_column(ws2, limb_groups):
+    """Write each data row's limb label to the hidden LIMB_KEY_COLUMN; rows without a limb label stay blank."""
+    apply_style(ws2.cell(row=1, column=LIMB_KEY_COLUMN, value="Limb"), 'header')
+    for row_idx, limb_idx in enumerate(limb_groups.row_limb.tolist(), 2):
+        if limb_idx >= 0:
+            ws2.cell(row=row_idx, column=LIMB_KEY_COLUMN, value=LIMBS[limb_idx])
+    ws2.column_dimensions[get_column_letter(LIMB_KEY_COLUMN)].hidden = True
+
+def limb_summary_formula(ws2, row, column, value_col, limb, num_data_rows):
+    """
+    Write the "mean±SD" summary of one limb's values in value_col to a cell.
+
+    The rows are selected by the limb key column, so the formula has the same length
+    for any number of trials: AVERAGEIF for the mean, STDEV(IF(...)) for the SD, entered
+    as an array formula. An array IF turns blank cells into 0, so blanks (e.g. the weight
+    bearing of an incomplete trial) are excluded explicitly to be ignored like in AVERAGEIF.
+    """
+    last_row = num_data_rows + 1
+    key_range = f"${get_column_letter(LIMB_KEY_COLUMN)}$2:${get_column_letter(LIMB_KEY_COLUMN)}${last_row}"
+    value_range = f"{value_col}$2:{value_col}${last_row}"
+    formula = (f'=ROUNDDOWN(AVERAGEIF({key_range},"{limb}",{value_range}),2)&"±"&'
+               f'ROUNDDOWN(STDEV(IF(({key_range}="{limb}")*({value_range}<>""),{value_range})),2)')
+    cell_ref = f"{get_column_letter(column)}{row}"
+    return ws2.cell(row=row, column=column, value=ArrayFormula(cell_ref, formula))
+
+def write_weight_bearing_formulae(ws2, num_data_rows, limb_groups):
+    """Write weight bearing formulae for the rows of every trial that has all four limbs, with error handling."""
     try:
-        # Weight bearing formula: IFERROR(ROUND((current_cell/SUM(range))*100, 0), "")
-        # We need to group rows by 4 (LF, LH, RF, RH)
-        
-        for group_start in range(2, num_data_rows + 2, 4):  # Start from row 2, increment by 4
-            if group_start + 3 <= num_data_rows + 1:  # Make sure we have 4 rows
-                # Get the range for this group (4 rows)
-                range_start = f"B{group_start}"
-                range_end = f"B{group_start + 3}"
-                range_reference = f"{range_start}:{range_end}"
-                
-                # Write formula for each row in the group
-                for row_offset in range(4):
-                    current_row = group_start + row_offset
-                    if current_row <= num_data_rows + 1:
-                        current_cell = f"B{current_row}"
-                        # Enhanced formula with better error handling
-                        weight_bearing_formula = f'=IFERROR(IF(SUM({range_reference})=0, 0, ROUND(({current_cell}/SUM({range_reference}))*100, 0)), "")'
-                        cell = ws2.cell(row=current_row, column=6, value=weight_bearing_formula)  # Column F
-                        cell.data_type = 'f'  # Explicitly set as formula
+        # Weight bearing formula: IFERROR(ROUND((current_cell/SUM(trial's LF, LH, RF, RH cells))*100, 0), "")
+        # Trials missing a limb are left blank rather than summed over the wrong rows
+        for group_rows in limb_groups.complete_groups():
+            sheet_rows = sorted(int(row) + 2 for row in group_rows)
+            range_reference = cell_references("B", sheet_rows)
+            
+            # Write formula for each row in the trial
+            for current_row in sheet_rows:
+                current_cell = f"B{current_row}"
+                # Enhanced formula with better error handling
+                weight_bearing_formula = f'=IFERROR(IF(SUM({range_reference})=0, 0, ROUND(({current_cell}/SUM({range_reference}))*100, 0)), "")'
+                cell = ws2.cell(row=current_row, column=6, value=weight_bearing_formula)  # Column F
+                cell.data_type = 'f'  # Explicitly set as formula
+                apply_style(cell, 'center')
     except Exception as e:
         print(f"Error writing weight bearing formulae: {e}")
         # Fill with default values if formula writing fails
         for row in range(2, num_data_rows + 2):
             ws2.cell(row=row, column=6, value="0")
 
-def write_asymmetry_formulae(ws2, num_data_rows):
+def write_asymmetry_formulae(ws2, num_data_rows, limb_groups):
     """Write asymmetry index formulae for LF and LH rows only with error handling."""
     try:
         # Asymmetry Index formula: IFERROR(ABS((x1-x3))/(AVERAGE(x1,x3)), "")
-        # Only for LF and LH rows (first and second row in each group)
-        
-        # Calculate how many complete groups we have
-        complete_groups = num_data_rows // 4
-        remaining_rows = num_data_rows % 4
-        
-        # Write formulas for complete groups
-        for group in range(complete_groups):
-            group_start = 2 + (group * 4)
-            
-            # LF row (first row in group): abs(x1-x3)/mean(x1, x3) where x1=LF, x3=RF
-            lf_row = group_start
-            rf_row = group_start + 2
-            if rf_row <= num_data_rows + 1:  # Make sure RF row exists
+        # LF rows: abs(LF-RF)/mean(LF, RF), LH rows: abs(LH-RH)/mean(LH, RH),
+        # each paired with the right limb of the same trial
+        for left, right in (('LF', 'RF'), ('LH', 'RH')):
+            left_rows, right_rows = limb_groups.pairs(left, right)
+            for left_row, right_row in zip(left_rows + 2, right_rows + 2):
                 # Enhanced formula with better error handling for division by zero
-                lf_formula = f'=IFERROR(IF(AVERAGE(B{lf_row},B{rf_row})=0, 0, ABS((B{lf_row}-B{rf_row}))/AVERAGE(B{lf_row},B{rf_row})), "")'
-                cell = ws2.cell(row=lf_row, column=7, value=lf_formula)  # Column G
+                formula = f'=IFERROR(IF(AVERAGE(B{left_row},B{right_row})=0, 0, ABS((B{left_row}-B{right_row}))/AVERAGE(B{left_row},B{right_row})), "")'
+                cell = ws2.cell(row=int(left_row), column=7, value=formula)  # Column G
                 cell.data_type = 'f'  # Explicitly set as formula
-            
-            # LH row (second row in group): abs(x2-x4)/mean(x2, x4) where x2=LH, x4=RH
-            lh_row = group_start + 1
-            rh_row = group_start + 3
-            if rh_row <= num_data_rows + 1:  # Make sure RH row exists
-                # Enhanced formula with better error handling for division by zero
-                lh_formula = f'=IFERROR(IF(AVERAGE(B{lh_row},B{rh_row})=0, 0, ABS((B{lh_row}-B{rh_row}))/AVERAGE(B{lh_row},B{rh_row})), "")'
-                cell = ws2.cell(row=lh_row, column=7, value=lh_formula)  # Column G
-                cell.data_type = 'f'  # Explicitly set as formula
-        
-        # Handle remaining rows if we don't have complete groups
-        if remaining_rows > 0:
-            group_start = 2 + (complete_groups * 4)
-            
-            # If we have at least 2 rows, we can calculate LF asymmetry
-            if remaining_rows >= 2:
-                lf_row = group_start
-                rf_row = group_start + 2
-                if rf_row <= num_data_rows + 1:
-                    lf_formula = f'=IFERROR(IF(AVERAGE(B{lf_row},B{rf_row})=0, 0, ABS((B{lf_row}-B{rf_row}))/AVERAGE(B{lf_row},B{rf_row})), "")'
-                    cell = ws2.cell(row=lf_row, column=7, value=lf_formula)  # Column G
-                    cell.data_type = 'f'  # Explicitly set as formula
-            
-            # If we have at least 3 rows, we can calculate LH asymmetry
-            if remaining_rows >= 3:
-                lh_row = group_start + 1
-                rh_row = group_start + 3
-                if rh_row <= num_data_rows + 1:
-                    lh_formula = f'=IFERROR(IF(AVERAGE(B{lh_row},B{rh_row})=0, 0, ABS((B{lh_row}-B{rh_row}))/AVERAGE(B{lh_row},B{rh_row})), "")'
-                    cell = ws2.cell(row=lh_row, column=7, value=lh_formula)  # Column G
-                    cell.data_type = 'f'  # Explicitly set as formula
+                apply_style(cell, 'center')
                     
     except Exception as e:
         print(f"Error writing asymmetry formulae: {e}")
@@ -576,15 +591,24 @@ def write_asymmetry_formulae(ws2, num_data_rows):
         for row in range(2, num_data_rows + 2):
             ws2.cell(row=row, column=7, value="0")
 
-def apply_coloring(ws2, num_data_rows):
+def cell_references(col_letter, rows):
+    """Excel reference to cells of one column: "B2:B5" when the rows are consecutive, else "B2,B7,B4"."""
+    if len(rows) > 1 and rows[-1] - rows[0] == len(rows) - 1 and list(rows) == sorted(rows):
+        return f"{col_letter}{rows[0]}:{col_letter}{rows[-1]}"
+    return ",".join(f"{col_letter}{row}" for row in rows)
+
+def apply_coloring(ws2, num_data_rows, limb_groups):
     """Apply coloring to Data Source (column A) and Weight bearing columns (column F)."""
     # Color cache for consistent coloring
     color_cache = {}
     
     # Apply coloring to Data Source (column A) and Weight bearing columns (column F)
-    for row_idx in range(2, num_data_rows + 2): # Start from row 2 for data
-        # Determine group number based on row index - group by 4 rows (LF, LH, RF, RH)
-        group_num = ((row_idx - 2) // 4) + 1  # Group 1: rows 2-5, Group 2: rows 6-9, etc.
+    for row_idx, group_idx in enumerate(limb_groups.row_group.tolist(), 2): # Start from row 2 for data
+        # One colour per trial (LF, LH, RF, RH of the same trial number); unlabelled rows stay plain
+        if group_idx < 0:
+            apply_style(ws2.cell(row=row_idx, column=1), 'center')
+            continue
+        group_num = group_idx + 1
         
         if group_num not in color_cache:
             color_cache[group_num] = {
@@ -593,26 +617,18 @@ def apply_coloring(ws2, num_data_rows):
             }
         
         # Apply bright color to Data Source column (column A)
-        data_source_cell = ws2.cell(row=row_idx, column=1)
-        data_source_cell.fill = PatternFill(start_color=color_cache[group_num]['bright'], 
-                                           end_color=color_cache[group_num]['bright'], 
-                                           fill_type='solid')
+        apply_style(ws2.cell(row=row_idx, column=1), 'center', color_cache[group_num]['bright'])
         
         # Apply dim color to Weight bearing column (column F)
-        weight_bearing_cell = ws2.cell(row=row_idx, column=6)
-        weight_bearing_cell.fill = PatternFill(start_color=color_cache[group_num]['dim'], 
-                                              end_color=color_cache[group_num]['dim'], 
-                                              fill_type='solid')
+        apply_style(ws2.cell(row=row_idx, column=6), 'center', color_cache[group_num]['dim'])
 
-def add_summary_averages_table(ws2, num_data_rows):
+def add_summary_averages_table(ws2, num_data_rows, limb_groups):
     """Add a summary table with averages for LF, LH, RF, RH groups below the main data."""
     # Add 3-4 rows gap after the main data
     gap_start_row = num_data_rows + 4  # Main data + gap
     
     # Add heading "Summary"
-    heading_cell = ws2.cell(row=gap_start_row, column=1, value="Summary")
-    heading_cell.font = Font(bold=True, size=14)
-    heading_cell.alignment = Alignment(horizontal="center", vertical="center")
+    apply_style(ws2.cell(row=gap_start_row, column=1, value="Summary"), 'heading')
     
     # Create summary table
     table_start_row = gap_start_row + 2
@@ -622,77 +638,19 @@ def add_summary_averages_table(ws2, num_data_rows):
     
     # Write headers
     for col_idx, header in enumerate(summary_headers):
-        header_cell = ws2.cell(row=table_start_row, column=col_idx + 1, value=header)
-        header_cell.font = Font(bold=True)
-        header_cell.alignment = Alignment(horizontal="center", vertical="center")
+        apply_style(ws2.cell(row=table_start_row, column=col_idx + 1, value=header), 'header')
     
-    # Write data rows for each group (LF, LH, RF, RH)
+    # Write data rows for each limb (LF, LH, RF, RH)
     row_idx = table_start_row + 1
-    for group_idx, prefix in enumerate(['LF', 'LH', 'RF', 'RH']):
+    for prefix in LIMBS:
         # Group name - make it bold and center-aligned
-        group_cell = ws2.cell(row=row_idx, column=1, value=prefix)
-        group_cell.font = Font(bold=True)
-        group_cell.alignment = Alignment(horizontal="center", vertical="center")
-        
-        # Calculate the starting row for this group in the data
-        # Group 0 (LF): rows 2, 6, 10, 14, 18... (every 4th row starting from 2)
-        # Group 1 (LH): rows 3, 7, 11, 15, 19... (every 4th row starting from 3)
-        # Group 2 (RF): rows 4, 8, 12, 16, 20... (every 4th row starting from 4)
-        # Group 3 (RH): rows 5, 9, 13, 17, 21... (every 4th row starting from 5)
-        group_start_row = 2 + group_idx  # Starting row for this group
-        
-        # Create formulas for each metric - only for rows belonging to this group
-        # Maximum force average formula (Column B)
-        formula_range = []
-        for data_row in range(group_start_row, num_data_rows + 2, 4):  # Every 4th row starting from group_start_row
-            if data_row <= num_data_rows + 1:  # Make sure we don't exceed data rows
-                col_letter = "B"  # Column B for Maximum force
-                cell_ref = f"{col_letter}{data_row}"
-                formula_range.append(cell_ref)
-        
-        if formula_range:
-            avg_formula = f'=ROUNDDOWN(AVERAGE({",".join(formula_range)}),2)&"±"&ROUNDDOWN(STDEV({",".join(formula_range)}),2)'
-            formula_cell = ws2.cell(row=row_idx, column=2, value=avg_formula)
-            formula_cell.alignment = Alignment(horizontal="center", vertical="center")
-        
-        # Force-time integral average formula (Column C)
-        formula_range = []
-        for data_row in range(group_start_row, num_data_rows + 2, 4):  # Every 4th row starting from group_start_row
-            if data_row <= num_data_rows + 1:  # Make sure we don't exceed data rows
-                col_letter = "C"  # Column C for Force-time integral
-                cell_ref = f"{col_letter}{data_row}"
-                formula_range.append(cell_ref)
-        
-        if formula_range:
-            avg_formula = f'=ROUNDDOWN(AVERAGE({",".join(formula_range)}),2)&"±"&ROUNDDOWN(STDEV({",".join(formula_range)}),2)'
-            formula_cell = ws2.cell(row=row_idx, column=3, value=avg_formula)
-            formula_cell.alignment = Alignment(horizontal="center", vertical="center")
-        
-        # Contact time average formula (Column D)
-        formula_range = []
-        for data_row in range(group_start_row, num_data_rows + 2, 4):  # Every 4th row starting from group_start_row
-            if data_row <= num_data_rows + 1:  # Make sure we don't exceed data rows
-                col_letter = "D"  # Column D for Contact time
-                cell_ref = f"{col_letter}{data_row}"
-                formula_range.append(cell_ref)
+        apply_style(ws2.cell(row=row_idx, column=1, value=prefix), 'header')
         
-        if formula_range:
-            avg_formula = f'=ROUNDDOWN(AVERAGE({",".join(formula_range)}),2)&"±"&ROUNDDOWN(STDEV({",".join(formula_range)}),2)'
-            formula_cell = ws2.cell(row=row_idx, column=4, value=avg_formula)
-            formula_cell.alignment = Alignment(horizontal="center", vertical="center")
-        
-        # Weight bearing average formula (Column F)
-        formula_range = []
-        for data_row in range(group_start_row, num_data_rows + 2, 4):  # Every 4th row starting from group_start_row
-            if data_row <= num_data_rows + 1:  # Make sure we don't exceed data rows
-                col_letter = "F"  # Column F for Weight bearing
-                cell_ref = f"{col_letter}{data_row}"
-                formula_range.append(cell_ref)
-        
-        if formula_range:
-            avg_formula = f'=ROUNDDOWN(AVERAGE({",".join(formula_range)}),2)&"±"&ROUNDDOWN(STDEV({",".join(formula_range)}),2)'
-            formula_cell = ws2.cell(row=row_idx, column=5, value=avg_formula)
-            formula_cell.alignment = Alignment(horizontal="center", vertical="center")
+        # Maximum force (B), force-time integral (C), contact time (D) and weight bearing (F)
+        # of this limb's trials, selected by the limb key column
+        if len(limb_groups.limb_rows(prefix)):
+            for col_idx, col_letter in ((2, "B"), (3, "C"), (4, "D"), (5, "F")):
+                apply_style(limb_summary_formula(ws2, row_idx, col_idx, col_letter, prefix, num_data_rows), 'center')
         
         row_idx += 1
     
@@ -704,7 +662,7 @@ def add_summary_averages_table(ws2, num_data_rows):
             adjusted_width = min(max(header_length, 10), 50)
             ws2.column_dimensions[get_column_letter(col + 1)].width = adjusted_width
 
-def add_forelimb_hindlimb_summary(ws2, num_data_rows):
+def add_forelimb_hindlimb_summary(ws2, num_data_rows, limb_groups):
     """Add a summary table for forelimb/hindlimb asymmetry index averages below the main calculations table."""
     # Add 1-2 rows gap after the main calculations table
     gap_start_row = num_data_rows + 4 + 2 + 4  # Main data + gap + summary table + gap
@@ -713,53 +671,27 @@ def add_forelimb_hindlimb_summary(ws2, num_data_rows):
     table_start_row = gap_start_row + 1
     
     # Write headers
-    header_cell1 = ws2.cell(row=table_start_row, column=1, value="")
-    header_cell1.font = Font(bold=True)
-    header_cell1.alignment = Alignment(horizontal="center", vertical="center")
-    
-    header_cell2 = ws2.cell(row=table_start_row, column=2, value="Asym Index(L to R: SI)")
-    header_cell2.font = Font(bold=True)
-    header_cell2.alignment = Alignment(horizontal="center", vertical="center")
+    apply_style(ws2.cell(row=table_start_row, column=2, value="Asym Index(L to R: SI)"), 'header')
     
     # Forelimb row (LF + LH asymmetry averages)
     forelimb_row = table_start_row + 1
-    forelimb_cell = ws2.cell(row=forelimb_row, column=1, value="Forelimb")
-    forelimb_cell.font = Font(bold=True)
-    forelimb_cell.alignment = Alignment(horizontal="center", vertical="center")
-    
-    # Create dynamic formula for forelimb - only LF rows have asymmetry index values
-    forelimb_range = []
-    for row in range(2, num_data_rows + 2, 4):  # Every 4th row starting from 2 (LF rows)
-        if row <= num_data_rows + 1:
-            forelimb_range.append(f"G{row}")
-    
-    if forelimb_range:
-        forelimb_formula = f'=ROUNDDOWN(AVERAGE({",".join(forelimb_range)}),2)&"±"&ROUNDDOWN(STDEV({",".join(forelimb_range)}),2)'
-    else:
-        forelimb_formula = '""'
+    apply_style(ws2.cell(row=forelimb_row, column=1, value="Forelimb"), 'header')
     
-    forelimb_cell = ws2.cell(row=forelimb_row, column=2, value=forelimb_formula)
-    forelimb_cell.alignment = Alignment(horizontal="center", vertical="center")
+    # Forelimb SI is the average of the LF rows' asymmetry index values
+    if len(limb_groups.limb_rows('LF')):
+        apply_style(limb_summary_formula(ws2, forelimb_row, 2, "G", 'LF', num_data_rows), 'center')
+    else:
+        apply_style(ws2.cell(row=forelimb_row, column=2, value='""'), 'center')
     
     # Hindlimb row (RF + RH asymmetry averages)
     hindlimb_row = table_start_row + 2
-    hindlimb_cell = ws2.cell(row=hindlimb_row, column=1, value="Hindlimb")
-    hindlimb_cell.font = Font(bold=True)
-    hindlimb_cell.alignment = Alignment(horizontal="center", vertical="center")
-    
-    # Create dynamic formula for hindlimb - only LH rows have asymmetry index values
-    hindlimb_range = []
-    for row in range(3, num_data_rows + 2, 4):  # Every 4th row starting from 3 (LH rows)
-        if row <= num_data_rows + 1:
-            hindlimb_range.append(f"G{row}")
-    
-    if hindlimb_range:
-        hindlimb_formula = f'=ROUNDDOWN(AVERAGE({",".join(hindlimb_range)}),2)&"±"&ROUNDDOWN(STDEV({",".join(hindlimb_range)}),2)'
-    else:
-        hindlimb_formula = '""'
+    apply_style(ws2.cell(row=hindlimb_row, column=1, value="Hindlimb"), 'header')
     
-    hindlimb_cell = ws2.cell(row=hindlimb_row, column=2, value=hindlimb_formula)
-    hindlimb_cell.alignment = Alignment(horizontal="center", vertical="center")
+    # Hindlimb SI is the average of the LH rows' asymmetry index values
+    if len(limb_groups.limb_rows('LH')):
+        apply_style(limb_summary_formula(ws2, hindlimb_row, 2, "G", 'LH', num_data_rows), 'center')
+    else:
+        apply_style(ws2.cell(row=hindlimb_row, column=2, value='""'), 'center')
     
     # Auto-adjust column widths
     ws2.column_dimensions['A'].width = 15
@@ -781,6 +713,62 @@ def set_column_widths(ws2, df):
     ws2.column_dimensions['F'].width = 20 # Weight bearing column
     ws2.column_dimensions['G'].width = 35 # Asymmetry index column
 
+def add_trend_sheet(ws3, trend_visits):
+    """
+    Write the "Trends" sheet: one row per visit with the per-limb means and SI.
+    
+    Args:
+        ws3: Worksheet object for the trend sheet
+        trend_visits: Visit summaries oldest first, the last one is this visit
+    """
+    apply_style(ws3.cell(row=1, column=1, value="Visit trends"), 'title')
+    ws3.merge_cells('A1:E1')
+    ws3.row_dimensions[1].height = 30
+    
+    # Group headers over the four limb columns of each metric
+    header_row = 3
+    apply_style(ws3.cell(row=header_row, column=1, value="Visit date"), 'header')
+    ws3.merge_cells(f'A{header_row}:A{header_row + 1}')
+    for group_idx, (header, _) in enumerate(TREND_METRICS):
+        first_col = 2 + group_idx * len(TREND_LIMBS)
+        apply_style(ws3.cell(row=header_row, column=first_col, value=header), 'header', 'D3D3D3')
+        ws3.merge_cells(f'{get_column_letter(first_col)}{header_row}:'
+                        f'{get_column_letter(first_col + len(TREND_LIMBS) - 1)}{header_row}')
+        for limb_idx, (limb, color) in enumerate(TREND_LIMBS):
+            apply_style(ws3.cell(row=header_row + 1, column=first_col + limb_idx, value=limb), 'header', color)
+    si_col = 2 + len(TREND_METRICS) * len(TREND_LIMBS)
+    for offset, header in enumerate(["Forelimb SI", "Hindlimb SI"]):
+        apply_style(ws3.cell(row=header_row, column=si_col + offset, value=header), 'header', 'D3D3D3')
+        ws3.merge_cells(f'{get_column_letter(si_col + offset)}{header_row}:'
+                        f'{get_column_letter(si_col + offset)}{header_row + 1}')
+    
+    for row_idx, visit in enumerate(trend_visits, header_row + 2):
+        # The current visit (last row) is bold
+        style = 'header' if row_idx == header_row + 1 + len(trend_visits) else 'center'
+        visit_date = datetime.strptime(visit['visit_date'], "%Y-%m-%d").strftime("%m/%d/%Y")
+        apply_style(ws3.cell(row=row_idx, column=1, value=visit_date), style)
+        for group_idx, (_, field) in enumerate(TREND_METRICS):
+            for limb_idx, (limb, _) in enumerate(TREND_LIMBS):
+                value = visit['limbs'].get(limb, {}).get(field)
+                cell = ws3.cell(row=row_idx, column=2 + group_idx * len(TREND_LIMBS) + limb_idx,
+                                value=round(value, 2) if value is not None else None)
+                apply_style(cell, style)
+        for offset, field in enumerate(['forelimb_si', 'hindlimb_si']):
+            value = visit[field]
+            cell = ws3.cell(row=row_idx, column=si_col + offset, value=round(value, 2) if value is not None else None)
+            apply_style(cell, style)
+    
+    footnote_row = header_row + 2 + len(trend_visits)
+    ws3.merge_cells(f'A{footnote_row}:H{footnote_row}')
+    apply_style(ws3.cell(row=footnote_row, column=1,
+                         value="*Means per visit, the last (bold) row is this visit. VI: vertical impulse"), 'footnote')
+    
+    ws3.column_dimensions['A'].width = 14
+    for col in range(2, si_col):
+        ws3.column_dimensions[get_column_letter(col)].width = 9
+    ws3.column_dimensions[get_column_letter(si_col)].width = 16
+    ws3.column_dimensions[get_column_letter(si_col + 1)].width = 16
+
 def get_color_for_number(n):
     """Generate a unique pastel-like color for each number using HSL."""
     hue = (n * 137) % 360 / 360.0  # golden angle for good distribution
@@ -0,0 +1,170 @@
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from ingest import COLUMN_MAPPING
+from limb_groups import LIMBS, LimbGroups, build_limb_groups
+
+# Processed (Sheet2) column names of the measured metrics, in sheet order (B, C, D)
+MAX_FORCE_COLUMN = COLUMN_MAPPING["Maximum force (normalized to BW) /Total object/ [%BW]"]
+IMPULSE_COLUMN = COLUMN_MAPPING["Force-time integral (normalized to BW) /Total object/ [%BW*s]"]
+CONTACT_TIME_COLUMN = COLUMN_MAPPING["Contact time/TO [ms]"]
+WEIGHT_BEARING_COLUMN = "Weight bearing [%]"
+SUMMARY_COLUMNS = [MAX_FORCE_COLUMN, IMPULSE_COLUMN, CONTACT_TIME_COLUMN, WEIGHT_BEARING_COLUMN]
+
+
+@dataclass
+class MeanSD:
+    """Mean, sample standard deviation and number of values behind them."""
+    mean: float
+    std: float
+    count: int
+
+    def as_text(self):
+        """Format as the "mean±SD" text the Sheet2 summary formulas produce."""
+        if np.isnan(self.mean) or np.isnan(self.std):
+            return "#DIV/0!"
+        return f"{format_excel_number(rounddown(self.mean))}±{format_excel_number(rounddown(self.std))}"
+
+
+@dataclass
+class GaitMetrics:
+    """
+    Weight bearing, asymmetry index and limb summaries for one processed trial table.
+
+    weight_bearing and asymmetry_index have one entry per processed row and hold NaN
+    wherever Sheet2 leaves the cell blank. limb_summary maps each limb (LF, LH, RF, RH)
+    to a MeanSD per summary column, matching the Sheet2 "Summary" table. limb_groups is
+    the trial grouping behind all of them; pass it on to process_excel_report.
+    """
+    weight_bearing: np.ndarray
+    asymmetry_index: np.ndarray
+    limb_summary: dict = field(default_factory=dict)
+    forelimb_si: MeanSD = None
+    hindlimb_si: MeanSD = None
+    limb_groups: LimbGroups = None
+
+
+def compute_gait_metrics(processed_df, limb_groups=None):
+    """
+    Compute the values behind the Sheet2 formulas in one vectorized pass.
+
+    Rows are grouped the same way the Sheet2 formulas group them: by the limb and
+    trial number in their "Data Source" labels (see limb_groups.build_limb_groups).
+
+    Args:
+        processed_df: DataFrame returned by process_original_excel_data
+        limb_groups: LimbGroups of processed_df, built from its labels when omitted
+
+    Returns:
+        GaitMetrics with per-row arrays and per-limb summaries
+    """
+    if limb_groups is None:
+        limb_groups = build_limb_groups(processed_df["Data Source"])
+    num_rows = len(processed_df)
+    metrics = np.full((num_rows, 4), np.nan)
+    for col_idx, col_name in enumerate(SUMMARY_COLUMNS[:3]):
+        if col_name in processed_df.columns:
+            metrics[:, col_idx] = processed_df[col_name].to_numpy(dtype=float)
+    max_force = metrics[:, 0]
+
+    weight_bearing = compute_weight_bearing(max_force, limb_groups)
+    asymmetry_index = compute_asymmetry_index(max_force, limb_groups)
+    metrics[:, 3] = weight_bearing
+
+    # One slice per limb of a trial x limb x metric array; missing limbs stay NaN
+    table = limb_groups.table
+    by_limb = np.full(table.shape + (4,), np.nan)
+    present = table >= 0
+    by_limb[present] = metrics[table[present]]
+    means, stds, counts = _nan_mean_sd(by_limb, axis=0)
+
+    limb_summary = {
+        limb: {
+            col_name: MeanSD(means[limb_idx, col_idx], stds[limb_idx, col_idx], int(counts[limb_idx, col_idx]))
+            for col_idx, col_name in enumerate(SUMMARY_COLUMNS)
+        }
+        for limb_idx, limb in enumerate(LIMBS)
+    }
+
+    # Forelimb SI sits on the LF rows, hindlimb SI on the LH rows
+    si_by_limb = np.full((len(table), 2), np.nan)
+    si_present = present[:, :2]
+    si_by_limb[si_present] = asymmetry_index[table[:, :2][si_present]]
+    si_means, si_stds, si_counts = _nan_mean_sd(si_by_limb, axis=0)
+
+    return GaitMetrics(
+        weight_bearing=weight_bearing,
+        asymmetry_index=asymmetry_index,
+        limb_summary=limb_summary,
+        forelimb_si=MeanSD(si_means[0], si_stds[0], int(si_counts[0])),
+        hindlimb_si=MeanSD(si_means[1], si_stds[1], int(si_counts[1])),
+        limb_groups=limb_groups,
+    )
+
+
+def compute_weight_bearing(max_force, limb_groups):
+    """
+    Weight bearing [%] per row: each row's share of its trial's summed maximum force.
+
+    Mirrors write_weight_bearing_formulae: rows of trials missing a limb are NaN
+    and a trial whose forces sum to zero gets 0.
+    """
+    max_force = np.asarray(max_force, dtype=float)
+    weight_bearing = np.full(len(max_force), np.nan)
+    groups = limb_groups.complete_groups()
+    forces = max_force[groups]
+    sums = forces.sum(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shares = np.where(sums == 0, 0.0, excel_round(forces / sums * 100))
+    weight_bearing[groups] = shares
+    return weight_bearing
+
+
+def compute_asymmetry_index(max_force, limb_groups):
+    """
+    L-to-R asymmetry index per row, ABS(L - R) / AVERAGE(L, R).
+
+    Mirrors write_asymmetry_formulae: LF rows are paired with the RF row of the same
+    trial, LH rows with the RH row, every other row is NaN.
+    """
+    max_force = np.asarray(max_force, dtype=float)
+    asymmetry_index = np.full(len(max_force), np.nan)
+    for left, right in (('LF', 'RF'), ('LH', 'RH')):
+        left_rows, right_rows = limb_groups.pairs(left, right)
+        left_values = max_force[left_rows]
+        right_values = max_force[right_rows]
+        average = (left_values + right_values) / 2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            asymmetry_index[left_rows] = np.where(average == 0, 0.0, np.abs(left_values - right_values) / average)
+    return asymmetry_index
+
+
+def _nan_mean_sd(values, axis):
+    """Mean and sample SD ignoring NaN, like Excel AVERAGE/STDEV ignoring blank cells."""
+    counts = np.sum(~np.isnan(values), axis=axis)
+    totals = np.nansum(values, axis=axis)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = np.where(counts > 0, totals / counts, np.nan)
+        deviations = np.where(np.isnan(values), 0.0, values - np.expand_dims(means, axis))
+        stds = np.where(counts > 1, np.sqrt(np.sum(deviations ** 2, axis=axis) / (counts - 1)), np.nan)
+    return means, stds, counts
+
+
+def excel_round(values, digits=0):
+    """Round half away from zero like Excel ROUND (NumPy rounds half to even)."""
+    scale = 10.0 ** digits
+    values = np.asarray(values, dtype=float)
+    return np.sign(values) * np.floor(np.abs(values) * scale + 0.5) / scale
+
+
+def rounddown(value, digits=2):
+    """Truncate towards zero like Excel ROUNDDOWN."""
+    scale = 10.0 ** digits
+    return np.trunc(np.round(value * scale, 9)) / scale
+
+
+def format_excel_number(value):
+    """Format a number the way Excel converts it to text when concatenating."""
+    text = f"{value:.10f}".rstrip('0').rstrip('.')
+    return "0" if text in ("", "-0") else text
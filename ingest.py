@@ -0,0 +1,479 @@
+import csv
+import importlib.util
+import io
+import os
+import re
+import time
+import tracemalloc
+import zipfile
+from operator import itemgetter
+
+import openpyxl
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from xlsx_package import sheet_part
+
+FILES_DAT_SHEET = "FILES_DAT"
+VISITS_SHEET = "VISITS"
+
+# Raw FILES_DAT columns used by the report and their display names in Sheet2
+COLUMN_MAPPING = {
+    "File comment": "Data Source",
+    "Maximum force (normalized to BW) /Total object/ [%BW]": "Maximum force [%BW]",
+    "Force-time integral (normalized to BW) /Total object/ [%BW*s]": "Force-time integral [%BW*s]",
+    "Contact time/TO [ms]": "Contact time/TO [ms]",
+}
+
+# Only the columns the report actually reads are parsed into the DataFrames
+FILES_DAT_COLUMNS = ["File short name"] + list(COLUMN_MAPPING)
+VISITS_COLUMNS = ["First name", "Last name", "Gender", "ID", "Date of birth", "Date of visit", "Body mass [kg]"]
+
+# Text columns are read as strings, metric columns are coerced to float64 after parsing
+FILES_DAT_DTYPES = {"File short name": str, "File comment": str}
+METRIC_COLUMNS = [col for col in COLUMN_MAPPING if col != "File comment"]
+
+# FILES_DAT sheets with more rows than this are streamed in chunks with compact dtypes
+STREAMING_MIN_ROWS = int(os.environ.get("PPAR_STREAMING_MIN_ROWS", "50000"))
+STREAMING_CHUNK_ROWS = 20000
+# The chunked read walks the sheet row by row with this engine's read-only mode
+STREAMING_ENGINE = 'openpyxl'
+
+# Reader engines per input format, fastest first; the first installed one is used unless
+# PPAR_READER_ENGINE (or the engine argument) names another. "c" is pandas' own CSV parser
+READER_ENGINES = {
+    'xlsx': ['calamine', 'openpyxl'],
+    'xls': ['calamine', 'xlrd'],
+    'csv': ['pyarrow', 'c'],
+}
+ENGINE_MODULES = {'calamine': 'python_calamine', 'openpyxl': 'openpyxl', 'xlrd': 'xlrd', 'pyarrow': 'pyarrow', 'c': None}
+# VISITS of a CSV export are read from "<name>_VISITS.csv" next to it, when there is one
+CSV_VISITS_SUFFIX = "_VISITS.csv"
+# detect_format looks for the CSV header line within the first bytes of a file
+CSV_HEADER_MAX_BYTES = 1024 * 1024
+
+
+def detect_format(source):
+    """
+    'xlsx', 'xls' or 'csv' for a path or file-like object, from its content rather than its name.
+
+    Workbooks are recognised by their signature, a CSV export by a header line that holds
+    "File comment" and at least one metric column of FILES_DAT.
+
+    Raises:
+        ValueError: the content is neither a workbook nor a FILES_DAT CSV export
+    """
+    if hasattr(source, 'read'):
+        position = source.tell()
+        head = source.read(CSV_HEADER_MAX_BYTES)
+        source.seek(position)
+    else:
+        with open(source, 'rb') as f:
+            head = f.read(CSV_HEADER_MAX_BYTES)
+    if head[:4] == b'PK\x03\x04':
+        return 'xlsx'
+    if head[:4] == b'\xd0\xcf\x11\xe0':
+        return 'xls'
+    header_line = head.split(b'\n', 1)[0]
+    try:
+        header_line = header_line.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        header_line = header_line.decode('latin-1')
+    header = set(_csv_header(header_line.rstrip('\r'))[1])
+    if "File comment" in header and header.intersection(METRIC_COLUMNS):
+        return 'csv'
+    raise ValueError("Unrecognised file: expected an xlsx/xls workbook or a FILES_DAT table exported as CSV "
+                     "with its \"File comment\" and metric columns")
+
+
+def available_engines(input_format):
+    """Installed reader engines for an input format, fastest first."""
+    return [engine for engine in READER_ENGINES[input_format]
+            if ENGINE_MODULES[engine] is None or importlib.util.find_spec(ENGINE_MODULES[engine]) is not None]
+
+
+def select_engine(input_format, engine=None):
+    """
+    Reader engine for an input format: engine or PPAR_READER_ENGINE when it can read
+    the format, otherwise the fastest installed one.
+
+    Raises:
+        ValueError: engine was given explicitly but cannot read the format or is not installed
+    """
+    installed = available_engines(input_format)
+    if engine is not None:
+        if engine not in installed:
+            raise ValueError(f"Reader engine '{engine}' cannot read {input_format} files here "
+                             f"(available: {', '.join(installed)})")
+        return engine
+    preferred = os.environ.get("PPAR_READER_ENGINE")
+    return preferred if preferred in installed else installed[0]
+
+
+def read_raw_workbook(source, cache=None, streaming=None, engine=None):
+    """
+    Open the raw pressure platform export once and read both tables from it.
+
+    The format is detected from the content: xlsx and xls workbooks with FILES_DAT and
+    VISITS sheets, or a FILES_DAT table exported as CSV (see read_csv_export). Each is
+    read with the fastest installed engine (see select_engine); every engine returns
+    the same frames.
+
+    Very long FILES_DAT sheets (more than STREAMING_MIN_ROWS rows, set with
+    PPAR_STREAMING_MIN_ROWS) are streamed with read_files_dat_chunks instead, so
+    their "File comment" column comes back categorical and the metrics as float32.
+    The chunked read always uses openpyxl's read-only reader, whatever PPAR_READER_ENGINE
+    prefers. An explicit engine other than openpyxl turns the automatic switch off, and
+    asking for it together with streaming=True is an error.
+
+    Args:
+        source: Path or file-like object with the uploaded export
+        cache: ParsedExportCache to load earlier parses of the same bytes from (optional)
+        streaming: True/False to force or disable the chunked FILES_DAT read, None to decide
+            by the sheet's length (only xlsx workbooks are streamed)
+        engine: Reader engine to use instead of the fastest installed one (optional)
+
+    Returns:
+        Tuple of (files_dat_df, visits_df) projected down to the columns the report uses
+
+    Raises:
+        ValueError: the content is not a recognised export (see detect_format), FILES_DAT has
+            none of the report columns, streaming=True with an engine other than openpyxl, or
+            an engine that cannot read the format
+    """
+    start = time.perf_counter()
+    if cache is not None:
+        data = _read_source_bytes(source)
+        # Keep paths as paths, a CSV export may have its VISITS file next to it
+        if hasattr(source, 'read'):
+            source = io.BytesIO(data)
+
+    input_format = detect_format(source)
+    if input_format != 'xlsx':
+        streaming = False
+    elif streaming and engine not in (None, STREAMING_ENGINE):
+        raise ValueError(f"The chunked FILES_DAT read uses {STREAMING_ENGINE}, not '{engine}'; "
+                         f"pass streaming=False to read with {engine}")
+    elif streaming is None:
+        streaming = (engine in (None, STREAMING_ENGINE)
+                     and (_xlsx_sheet_rows(source, FILES_DAT_SHEET) or 0) > STREAMING_MIN_ROWS)
+    engine = STREAMING_ENGINE if streaming else select_engine(input_format, engine)
+
+    if cache is not None:
+        # Streamed frames have other dtypes than regular reads, so each read is its own entry
+        cache_key = cache.make_key(data, 'streaming' if streaming else engine)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            print(f"Loaded parsed raw workbook from cache in {time.perf_counter() - start:.3f}s "
+                  f"({len(cached[0])} FILES_DAT rows)")
+            return cached
+
+    if input_format == 'csv':
+        df_files_dat, df_visits = read_csv_export(source, engine)
+    elif streaming:
+        book = openpyxl.load_workbook(source, read_only=True, data_only=True, keep_links=False)
+        with pd.ExcelFile(book, engine='openpyxl') as xls:
+            if FILES_DAT_SHEET not in book.sheetnames:
+                raise ValueError(f"Worksheet named '{FILES_DAT_SHEET}' not found")
+            df_files_dat = read_files_dat_chunks(book[FILES_DAT_SHEET])
+            df_visits = xls.parse(VISITS_SHEET, usecols=lambda col: col in VISITS_COLUMNS)
+    else:
+        with pd.ExcelFile(source, engine=engine) as xls:
+            df_files_dat = xls.parse(
+                FILES_DAT_SHEET,
+                usecols=lambda col: col in FILES_DAT_COLUMNS,
+                dtype=FILES_DAT_DTYPES,
+            )
+            df_visits = xls.parse(VISITS_SHEET, usecols=lambda col: col in VISITS_COLUMNS)
+
+    if not streaming:
+        for col in METRIC_COLUMNS:
+            if col in df_files_dat.columns:
+                df_files_dat[col] = pd.to_numeric(df_files_dat[col], errors='coerce').astype('float64')
+    # Without any report column process_original_excel_data would fall back to an all-zero report
+    if not any(col in df_files_dat.columns for col in COLUMN_MAPPING):
+        raise ValueError(f"No required columns found in {FILES_DAT_SHEET}: expected at least one of "
+                         f"{', '.join(COLUMN_MAPPING)}")
+
+    print(f"Parsed raw {input_format} export with {engine} in {time.perf_counter() - start:.3f}s "
+          f"({len(df_files_dat)} FILES_DAT rows{', streamed' if streaming else ''})")
+    if cache is not None:
+        cache.put(cache_key, df_files_dat, df_visits)
+    return df_files_dat, df_visits
+
+
+def read_csv_export(source, engine='pyarrow'):
+    """
+    Read a FILES_DAT table exported as CSV.
+
+    A CSV export has no VISITS sheet. For a path, VISITS is read from
+    "<name>_VISITS.csv" next to it when that file exists; otherwise it is empty and
+    the report takes the patient fields from the manual inputs only.
+
+    Args:
+        source: Path or file-like object with the CSV
+        engine: 'pyarrow' or 'c' (pandas' parser)
+
+    Returns:
+        Tuple of (files_dat_df, visits_df) like read_raw_workbook, before the metric conversion
+    """
+    df_files_dat = _parse_csv(_read_source_bytes(source), FILES_DAT_COLUMNS, FILES_DAT_DTYPES, engine)
+    return df_files_dat, read_csv_visits(source, engine)
+
+
+def read_csv_visits(source, engine='pyarrow'):
+    """VISITS of a CSV export from "<name>_VISITS.csv" next to a path source, else an empty frame."""
+    if hasattr(source, 'read'):
+        return pd.DataFrame(columns=VISITS_COLUMNS)
+    visits_path = os.path.splitext(source)[0] + CSV_VISITS_SUFFIX
+    if not os.path.exists(visits_path):
+        return pd.DataFrame(columns=VISITS_COLUMNS)
+    df_visits = _parse_csv(_read_source_bytes(visits_path), VISITS_COLUMNS, {}, engine)
+    for col in df_visits.columns:
+        if pd.api.types.is_numeric_dtype(df_visits[col]):
+            continue
+        # Dates written as ISO text become timestamps, as date cells do in the workbook
+        # (built from datetime objects like the Excel readers do, so the resolution matches too)
+        dates = pd.to_datetime(df_visits[col], format='ISO8601', errors='coerce')
+        if dates.notna().sum() == df_visits[col].notna().sum() > 0:
+            df_visits[col] = pd.Series(list(dates.dt.to_pydatetime()), index=df_visits.index)
+    return df_visits
+
+
+def _parse_csv(data, columns, dtypes, engine):
+    """Parse the given columns of CSV bytes, detecting the encoding (UTF-8 or Latin-1) and delimiter."""
+    try:
+        data.decode('utf-8')
+        encoding = 'utf-8-sig'
+    except UnicodeDecodeError:
+        encoding = 'latin-1'
+    header_line = data.split(b'\n', 1)[0].decode(encoding).rstrip('\r')
+    if not header_line.strip():
+        return pd.DataFrame()
+    delimiter, header = _csv_header(header_line)
+    usecols = list(dict.fromkeys(name for name in header if name in columns))
+    # pandas' own parser only matches the workbook's float values with round_trip precision
+    options = {'float_precision': 'round_trip'} if engine == 'c' else {}
+    return pd.read_csv(io.BytesIO(data), engine=engine, sep=delimiter, encoding=encoding, usecols=usecols,
+                       dtype={col: dtype for col, dtype in dtypes.items() if col in usecols}, **options)
+
+
+def _csv_header(header_line):
+    """(delimiter, column names) of a CSV header line; comma, semicolon or tab separated."""
+    if not header_line.strip():
+        return ',', []
+    try:
+        delimiter = csv.Sniffer().sniff(header_line, delimiters=',;\t').delimiter
+    except csv.Error:
+        delimiter = ','
+    return delimiter, next(csv.reader([header_line], delimiter=delimiter))
+
+
+def _xlsx_sheet_rows(source, sheet_name):
+    """
+    Number of rows an xlsx declares for a sheet in its <dimension> element, None when unknown.
+
+    Only the workbook part and the start of the sheet part are read, so this is cheap
+    enough to decide between readers before opening the workbook with one of them.
+    """
+    position = source.tell() if hasattr(source, 'read') else None
+    try:
+        with zipfile.ZipFile(source) as package:
+            with package.open(sheet_part(package, sheet_name)) as part:
+                head = part.read(4096).decode('utf-8', 'ignore')
+    except (KeyError, OSError, zipfile.BadZipFile):
+        return None
+    finally:
+        if position is not None:
+            source.seek(position)
+    match = re.search(r'<dimension ref="(?:[A-Z]+\d+:)?[A-Z]+(\d+)"', head)
+    return int(match.group(1)) if match else None
+
+
+def read_files_dat_chunks(worksheet, chunk_rows=STREAMING_CHUNK_ROWS):
+    """
+    Stream a read-only FILES_DAT worksheet in row chunks, keeping only the trial rows.
+
+    Each chunk is projected to the report's columns and filtered as it is read:
+    ".dat" summary rows and rows whose metrics are all empty or 0 (which
+    process_original_excel_data would drop anyway) are discarded. Kept rows are
+    stored compactly, "File comment" as a categorical and the metrics as float32,
+    so peak memory is one chunk of raw rows plus the compact result.
+
+    Args:
+        worksheet: FILES_DAT sheet of a workbook opened with read_only=True
+        chunk_rows: Number of raw rows converted at a time
+
+    Returns:
+        DataFrame with "File comment" and the metric columns present in the sheet
+        ("File short name" is only used for the .dat filter and not returned)
+    """
+    rows = worksheet.iter_rows(values_only=True)
+    header = next(rows, None) or ()
+    positions = {}
+    for position, name in enumerate(header):
+        # The first of duplicate column names wins, as in pd.read_excel
+        if name in FILES_DAT_COLUMNS and name not in positions:
+            positions[name] = position
+    columns = sorted(positions, key=positions.get)
+    project = _row_projection([positions[col] for col in columns])
+
+    chunks = []
+    buffer = []
+    for row in rows:
+        buffer.append(project(row))
+        if len(buffer) >= chunk_rows:
+            chunks.append(_compact_chunk(buffer, columns))
+            buffer = []
+    if buffer or not chunks:
+        chunks.append(_compact_chunk(buffer, columns))
+
+    df = pd.concat(chunks, ignore_index=True)
+    if "File comment" in df.columns:
+        # Chunks have different categories, which concat would turn back into strings
+        df["File comment"] = union_categoricals([chunk["File comment"] for chunk in chunks], ignore_order=True)
+    return df
+
+
+def _row_projection(indices):
+    """Function picking the given cell positions out of a row tuple, padding short rows with None."""
+    if not indices:
+        return lambda row: ()
+    getter = itemgetter(*indices)
+    last = max(indices)
+
+    def project(row):
+        if len(row) <= last:
+            row = tuple(row) + (None,) * (last + 1 - len(row))
+        values = getter(row)
+        return values if len(indices) > 1 else (values,)
+    return project
+
+
+def _compact_chunk(rows, columns):
+    """Filter one chunk of projected FILES_DAT rows and convert it to compact dtypes."""
+    chunk = pd.DataFrame.from_records(rows, columns=columns)
+    if "File short name" in chunk.columns:
+        names = chunk.pop("File short name")
+        is_dat = names[names.notna()].astype(str).str.endswith(".dat").reindex(names.index, fill_value=False)
+        chunk = chunk[~is_dat.to_numpy(dtype=bool)]
+
+    metric_columns = [col for col in METRIC_COLUMNS if col in chunk.columns]
+    for col in metric_columns:
+        chunk[col] = pd.to_numeric(chunk[col], errors='coerce').astype('float32')
+    if metric_columns:
+        chunk = chunk[(chunk[metric_columns].fillna(0) != 0).any(axis=1)]
+
+    if "File comment" in chunk.columns:
+        comments = chunk["File comment"]
+        comments = comments.where(comments.isna(), comments.astype(str))
+        chunk = chunk.assign(**{"File comment": comments.astype('category')})
+    return chunk.reset_index(drop=True)
+
+
+def _read_source_bytes(source):
+    """Raw bytes of a path or file-like source, leaving file objects rewound."""
+    if hasattr(source, 'getvalue'):
+        return source.getvalue()
+    if hasattr(source, 'read'):
+        source.seek(0)
+        data = source.read()
+        source.seek(0)
+        return data
+    with open(source, 'rb') as f:
+        return f.read()
+
+
+def read_visits(source):
+    """
+    Read only the VISITS sheet, e.g. to look up the patient before deciding to process FILES_DAT.
+
+    Args:
+        source: Path or file-like object with the raw workbook
+
+    Returns:
+        visits_df projected down to the columns the report uses
+    """
+    input_format = detect_format(source)
+    if input_format == 'csv':
+        return read_csv_visits(source, select_engine(input_format))
+    with pd.ExcelFile(source, engine=select_engine(input_format)) as xls:
+        return xls.parse(VISITS_SHEET, usecols=lambda col: col in VISITS_COLUMNS)
+
+
+def read_raw_workbook_legacy(source):
+    """Read both sheets the way app.py used to: two full pd.read_excel calls."""
+    df_files_dat = pd.read_excel(source, sheet_name=FILES_DAT_SHEET)
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    df_visits = pd.read_excel(source, sheet_name=VISITS_SHEET)
+    return df_files_dat, df_visits
+
+
+def compare_ingestion(source, repeat=3):
+    """
+    Time the single-open projected read and the chunked streaming read against the legacy two-read path.
+
+    Peak memory is measured with tracemalloc in one extra run per path, so it does not
+    slow down the timed runs.
+
+    Args:
+        source: Path or file-like object with the raw workbook
+        repeat: Number of runs per path, the best run is reported
+
+    Returns:
+        Dictionary with the best time in seconds, peak traced memory in MB and FILES_DAT
+        frame size in MB of the legacy, projected and streaming paths, and the speedup
+        of the projected path
+    """
+    if hasattr(source, 'read'):
+        data = source.read()
+    else:
+        with open(source, 'rb') as f:
+            data = f.read()
+
+    def best_time(reader):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            reader(io.BytesIO(data))
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    def peak_memory(reader):
+        tracemalloc.start()
+        try:
+            df_files_dat, _ = reader(io.BytesIO(data))
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return peak / (1024 * 1024), float(df_files_dat.memory_usage(deep=True).sum()) / (1024 * 1024)
+
+    readers = {
+        'legacy': read_raw_workbook_legacy,
+        'projected': lambda buffer: read_raw_workbook(buffer, streaming=False),
+        'streaming': lambda buffer: read_raw_workbook(buffer, streaming=True),
+    }
+    result = {}
+    for name, reader in readers.items():
+        result[f'{name}_seconds'] = best_time(reader)
+        result[f'{name}_peak_mb'], result[f'{name}_frame_mb'] = peak_memory(reader)
+    result['speedup'] = (result['legacy_seconds'] / result['projected_seconds']
+                         if result['projected_seconds'] else None)
+    return result
+
+
+if __name__ == "__main__":
+    import sys
+
+    for path in sys.argv[1:]:
+        result = compare_ingestion(path)
+        print(f"{path}: legacy {result['legacy_seconds']:.3f}s, "
+              f"projected {result['projected_seconds']:.3f}s, "
+              f"streaming {result['streaming_seconds']:.3f}s, "
+              f"speedup {result['speedup']:.2f}x")
+        print(f"{path}: peak memory legacy {result['legacy_peak_mb']:.1f} MB, "
+              f"projected {result['projected_peak_mb']:.1f} MB, "
+              f"streaming {result['streaming_peak_mb']:.1f} MB; "
+              f"FILES_DAT frame {result['projected_frame_mb']:.1f} MB projected, "
+              f"{result['streaming_frame_mb']:.1f} MB streamed")
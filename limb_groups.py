@@ -0,0 +1,86 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+LIMBS = ['LF', 'LH', 'RF', 'RH']
+# Trial labels in "Data Source": "LF_1" as written by process_original_excel_data, or the raw "LF1"
+LABEL_PATTERN = r'^\s*(LF|LH|RF|RH)_?(\d+)'
+
+
+@dataclass
+class LimbGroups:
+    """
+    Which processed row holds which limb of which trial, parsed once from the "Data Source" labels.
+
+    table is a trials x limbs (LF, LH, RF, RH) array of 0-based row positions in the
+    processed DataFrame, -1 where a trial is missing that limb. Trials are ordered by
+    trial number, so rows may arrive in any order; row_group and row_limb map each
+    row back to its trial and limb index (-1 for rows without a usable label).
+    """
+    table: np.ndarray
+    row_group: np.ndarray
+    row_limb: np.ndarray
+
+    @property
+    def num_groups(self):
+        return len(self.table)
+
+    def complete_groups(self):
+        """Row positions of the trials that have all four limbs, one row of table per trial."""
+        return self.table[(self.table >= 0).all(axis=1)]
+
+    def limb_rows(self, limb):
+        """Row positions of one limb's trials, in row order."""
+        rows = self.table[:, LIMBS.index(limb)]
+        return np.sort(rows[rows >= 0])
+
+    def pairs(self, left, right):
+        """(left_rows, right_rows) of the trials that have both limbs, e.g. pairs('LF', 'RF')."""
+        left_rows = self.table[:, LIMBS.index(left)]
+        right_rows = self.table[:, LIMBS.index(right)]
+        both = (left_rows >= 0) & (right_rows >= 0)
+        return left_rows[both], right_rows[both]
+
+
+def build_limb_groups(data_source):
+    """
+    Group rows into trials by their limb/trial labels in one vectorized pass.
+
+    A limb/trial label that occurs more than once starts a new set of trials (e.g. two
+    sessions both numbered from 1), so repeats are paired with each other instead of
+    with the first session's rows. When no row has a limb label at all, rows are
+    grouped positionally in blocks of four in LF, LH, RF, RH order.
+
+    Args:
+        data_source: The "Data Source" column of the processed DataFrame
+
+    Returns:
+        LimbGroups
+    """
+    labels = pd.Series(data_source, dtype=object).astype(str).reset_index(drop=True)
+    num_rows = len(labels)
+    parts = labels.str.extract(LABEL_PATTERN)
+    valid = parts[0].notna().to_numpy()
+
+    if not valid.any():
+        positions = np.arange(num_rows)
+        limbs = positions % 4
+        keys = pd.DataFrame({'session': 0, 'trial': positions // 4})
+    else:
+        positions = np.flatnonzero(valid)
+        limbs = pd.Categorical(parts[0][valid], categories=LIMBS).codes.astype(np.int64)
+        keys = pd.DataFrame({'limb': limbs, 'trial': parts[1][valid].astype(np.int64).to_numpy()})
+        keys['session'] = keys.groupby(['limb', 'trial']).cumcount()
+
+    # One group per (session, trial), ordered by session then trial number
+    group_keys = pd.MultiIndex.from_frame(keys[['session', 'trial']])
+    groups, uniques = pd.factorize(group_keys, sort=True)
+
+    table = np.full((len(uniques), len(LIMBS)), -1, dtype=np.int64)
+    table[groups, limbs] = positions
+    row_group = np.full(num_rows, -1, dtype=np.int64)
+    row_group[positions] = groups
+    row_limb = np.full(num_rows, -1, dtype=np.int64)
+    row_limb[positions] = limbs
+    return LimbGroups(table, row_group, row_limb)
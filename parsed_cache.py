@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import threading
+
+import pyarrow as pa
+import pyarrow.ipc
+
+from ingest import COLUMN_MAPPING, FILES_DAT_COLUMNS, FILES_DAT_DTYPES, METRIC_COLUMNS, VISITS_COLUMNS
+
+# Bump when the on-disk layout changes; the ingestion projection is hashed in as well
+PARSED_CACHE_FORMAT = 2
+SHEETS = ("files_dat", "visits")
+
+_schema_version = None
+
+
+def get_schema_version():
+    """Hash of everything that shapes the parsed frames, so changing the column mapping invalidates the cache."""
+    global _schema_version
+    if _schema_version is None:
+        spec = [PARSED_CACHE_FORMAT, list(COLUMN_MAPPING.items()), FILES_DAT_COLUMNS, VISITS_COLUMNS,
+                sorted(FILES_DAT_DTYPES), METRIC_COLUMNS]
+        _schema_version = hashlib.sha256(json.dumps(spec).encode('utf-8')).hexdigest()[:16]
+    return _schema_version
+
+
+class ParsedExportCache:
+    """
+    Disk cache of the FILES_DAT and VISITS frames parsed from a raw export.
+
+    Entries are uncompressed Arrow IPC files, one per sheet, keyed by a hash of the
+    upload bytes and the schema version. They are memory-mapped on read. Once the
+    directory grows past max_bytes, the least recently used entries are evicted.
+    """
+
+    def __init__(self, cache_dir, max_bytes=1024 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def make_key(self, upload_bytes, representation=''):
+        """
+        Content address of an upload under the current schema version.
+
+        representation names how the frames were read ("streaming" or the reader engine),
+        since a streamed read returns categorical and float32 columns.
+        """
+        digest = hashlib.sha256(upload_bytes)
+        digest.update(get_schema_version().encode('utf-8'))
+        digest.update(representation.encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return (files_dat_df, visits_df) for key, or None on a miss."""
+        paths = [self._path(key, sheet) for sheet in SHEETS]
+        try:
+            frames = []
+            for path in paths:
+                with pa.memory_map(path) as source:
+                    frames.append(pa.ipc.open_file(source).read_all().to_pandas())
+            # Touch the entry so eviction treats it as recently used
+            for path in paths:
+                os.utime(path)
+        except (OSError, pa.ArrowInvalid):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return tuple(frames)
+
+    def put(self, key, files_dat_df, visits_df):
+        """Store both frames; frames Arrow cannot represent (mixed-type columns) are not cached."""
+        try:
+            tables = [pa.Table.from_pandas(df, preserve_index=False) for df in (files_dat_df, visits_df)]
+        except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError) as e:
+            print(f"Warning: parsed export not cached: {e}")
+            return False
+
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            for sheet, table in zip(SHEETS, tables):
+                path = self._path(key, sheet)
+                with pa.OSFile(path + suffix, 'wb') as sink:
+                    with pa.ipc.new_file(sink, table.schema) as writer:
+                        writer.write_table(table)
+            # Publish VISITS last so a reader never finds it without its FILES_DAT
+            for sheet in SHEETS:
+                path = self._path(key, sheet)
+                os.replace(path + suffix, path)
+        except OSError as e:
+            print(f"Warning: could not write parsed export cache entry: {e}")
+            return False
+        self._evict()
+        return True
+
+    def stats(self):
+        """Hit/miss counters and the current size of the cache directory."""
+        entries = self._entries()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(entries),
+            'bytes': sum(size for _, size, _ in entries.values()),
+        }
+
+    def _path(self, key, sheet):
+        return os.path.join(self.cache_dir, f"{key}.{sheet}.arrow")
+
+    def _entries(self):
+        """key -> (last used, total size, paths) for every entry on disk."""
+        entries = {}
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.arrow'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            key = name.split('.', 1)[0]
+            last_used, size, paths = entries.get(key, (stat.st_mtime, 0, []))
+            entries[key] = (min(last_used, stat.st_mtime), size + stat.st_size, paths + [path])
+        return entries
+
+    def _evict(self):
+        """Remove least recently used entries until the directory is under max_bytes."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries.values())
+        for _, size, paths in sorted(entries.values()):
+            if total <= self.max_bytes:
+                break
+            for path in paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
@@ -1,55 +1,156 @@
-import tempfile
-import os
+import io
 from datetime import datetime
+from xml.sax.saxutils import escape
 from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
 
-def process_pdf_report(excel_file_path, original_filename):
+from gait_metrics import SUMMARY_COLUMNS, compute_gait_metrics
+from pipeline_stats import NULL_STATS
+from report_assets import get_dog_image_png
+
+# Table styles are immutable command lists, so one instance serves every report
+SUMMARY_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+
+COLUMN_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('FONTSIZE', (0, 1), (-1, -1), 8),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+])
+
+LIMB_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 8),
+    ('FONTSIZE', (0, 1), (-1, -1), 8),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+])
+
+# Dog diagram size next to the limb summary, half of its Sheet1 size
+PDF_DOG_IMAGE_SIZE = (65, 200)
+
+_pdf_styles = None
+
+
+def get_pdf_styles():
+    """Paragraph styles of the PDF report, built once per process."""
+    global _pdf_styles
+    if _pdf_styles is None:
+        styles = getSampleStyleSheet()
+        styles.add(ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=18,
+            spaceAfter=30,
+            alignment=1  # Center alignment
+        ))
+        styles.add(ParagraphStyle(
+            'InfoStyle',
+            parent=styles['Normal'],
+            fontSize=12,
+            spaceAfter=12
+        ))
+        styles.add(ParagraphStyle(
+            'Error',
+            parent=styles['Normal'],
+            fontSize=14,
+            textColor=colors.red
+        ))
+        _pdf_styles = styles
+    return _pdf_styles
+
+
+def process_pdf_report(excel_file_path, original_filename, output=None, stats=None):
     """
-    Create a PDF report from the Excel file.
-    Input: excel_file_path (str) - path to the Excel file
-    Output: PDF data as bytes
+    Create a PDF report from a generated Excel report.
+    Reads the trial table back from Sheet2; when the processed DataFrame is still
+    in memory, call build_pdf_report instead to skip the second parse.
+    Input: excel_file_path (str, bytes or file object) - the Excel report
+           output (file object, optional) - binary file object to write the PDF into
+           stats (PipelineStats, optional) - collects per-stage timings
+    Output: PDF data as bytes, or None when written to output
     """
+    stats = stats if stats is not None else NULL_STATS
+    try:
+        with stats.stage('pdf_read_excel') as record:
+            processed_df = read_report_data(excel_file_path)
+            record.rows = len(processed_df)
+    except Exception as e:
+        return write_error_pdf(e, output)
+    return build_pdf_report(processed_df, original_filename, output=output, stats=stats)
+
+
+def read_report_data(excel_file_path):
+    """
+    Read the processed trial table (Sheet2 columns A:D) from a generated Excel report.
+    The table ends at the first blank row, the summary tables below it are skipped.
+    """
+    import pandas as pd
+    if isinstance(excel_file_path, bytes):
+        excel_file_path = io.BytesIO(excel_file_path)
+    df = pd.read_excel(excel_file_path, sheet_name="Sheet2", usecols="A:D")
+    blank_rows = df.iloc[:, 0].isna().to_numpy()
+    if blank_rows.any():
+        df = df.iloc[:blank_rows.argmax()].copy()
+    # The summary text below the table made the metric columns object dtype
+    for col in df.columns[1:]:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    return df
+
+
+def build_pdf_report(processed_df, original_filename, metrics=None, output=None, stats=None):
+    """
+    Create a PDF report from the processed trial table.
+    Input: processed_df (DataFrame) - output of process_original_excel_data
+           metrics (GaitMetrics, optional) - limb summaries already computed for processed_df
+           output (file object, optional) - binary file object to write the PDF into
+           stats (PipelineStats, optional) - collects per-stage timings
+    Output: PDF data as bytes, or None when written to output
+    """
+    stats = stats if stats is not None else NULL_STATS
     # Get styles - define this at the beginning so it's available everywhere
-    styles = getSampleStyleSheet()
+    styles = get_pdf_styles()
+    df = processed_df
     
     try:
-        # Read the Excel file to get the DataFrame
-        import pandas as pd
-        df = pd.read_excel(excel_file_path, sheet_name="FILES_DAT")
-        
-        # Create a temporary file for the PDF
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-        temp_file.close()
+        # Build the PDF straight into the output buffer
+        buffer = output if output is not None else io.BytesIO()
         
         # Create PDF document
-        doc = SimpleDocTemplate(temp_file.name, pagesize=A4)
+        doc = SimpleDocTemplate(buffer, pagesize=A4)
         story = []
         
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=18,
-            spaceAfter=30,
-            alignment=1  # Center alignment
-        )
-        
         # Title
-        title = Paragraph("Data Processing Report", title_style)
+        title = Paragraph("Data Processing Report", styles['CustomTitle'])
         story.append(title)
         story.append(Spacer(1, 20))
         
         # Processing information
-        info_style = ParagraphStyle(
-            'InfoStyle',
-            parent=styles['Normal'],
-            fontSize=12,
-            spaceAfter=12
-        )
+        info_style = styles['InfoStyle']
         
-        story.append(Paragraph(f"<b>Original File:</b> {original_filename}", info_style))
+        # Paragraph text is markup, so a file name like "a&b<c.xlsx" must be escaped
+        story.append(Paragraph(f"<b>Original File:</b> {escape(str(original_filename))}", info_style))
         story.append(Paragraph(f"<b>Processing Date:</b> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", info_style))
         story.append(Paragraph(f"<b>Total Rows:</b> {len(df)}", info_style))
         story.append(Paragraph(f"<b>Total Columns:</b> {len(df.columns)}", info_style))
@@ -64,26 +165,18 @@ def process_pdf_report(excel_file_path, original_filename):
         summary_data.append(['Total Rows', str(len(df))])
         summary_data.append(['Total Columns', str(len(df.columns))])
         
-        # Add numeric column statistics
-        numeric_columns = df.select_dtypes(include=['number']).columns
+        # Add numeric column statistics, first 3 numeric columns in one aggregation
+        numeric_columns = df.select_dtypes(include=['number']).columns[:3]
         if len(numeric_columns) > 0:
-            for col in numeric_columns[:3]:  # Show first 3 numeric columns
-                summary_data.append([f'{col} - Mean', f"{df[col].mean():.2f}"])
-                summary_data.append([f'{col} - Max', f"{df[col].max():.2f}"])
-                summary_data.append([f'{col} - Min', f"{df[col].min():.2f}"])
+            numeric_stats = df[numeric_columns].agg(['mean', 'max', 'min'])
+            for col in numeric_columns:
+                summary_data.append([f'{col} - Mean', f"{numeric_stats.at['mean', col]:.2f}"])
+                summary_data.append([f'{col} - Max', f"{numeric_stats.at['max', col]:.2f}"])
+                summary_data.append([f'{col} - Min', f"{numeric_stats.at['min', col]:.2f}"])
         
         # Create table
         summary_table = Table(summary_data)
-        summary_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
+        summary_table.setStyle(SUMMARY_TABLE_STYLE)
         
         story.append(summary_table)
         story.append(Spacer(1, 20))
@@ -103,56 +196,65 @@ def process_pdf_report(excel_file_path, original_filename):
             ])
         
         col_table = Table(col_data)
-        col_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('FONTSIZE', (0, 1), (-1, -1), 8),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ]))
+        col_table.setStyle(COLUMN_TABLE_STYLE)
         
         story.append(col_table)
         
-        # Build PDF
-        doc.build(story)
-        
-        # Read the PDF file
-        with open(temp_file.name, 'rb') as f:
-            pdf_data = f.read()
+        # Limb summary, the same mean±SD values as the Sheet2 summary table
+        if metrics is None:
+            metrics = compute_gait_metrics(df)
+        story.append(Spacer(1, 20))
+        story.append(Paragraph("<b>Limb Summary</b>", styles['Heading2']))
+        story.append(Spacer(1, 12))
         
-        # Clean up temporary file
-        os.unlink(temp_file.name)
+        # Same cached PNG as the workbook, no file access per report
+        dog_image_png = get_dog_image_png()
+        if dog_image_png is not None:
+            width, height = PDF_DOG_IMAGE_SIZE
+            story.append(Image(io.BytesIO(dog_image_png), width=width, height=height))
+            story.append(Spacer(1, 12))
         
-        return pdf_data
+        limb_data = [['Limb'] + list(SUMMARY_COLUMNS)]
+        for limb, summaries in metrics.limb_summary.items():
+            limb_data.append([limb] + [summaries[col].as_text() for col in SUMMARY_COLUMNS])
+        limb_data.append(['Forelimb SI', metrics.forelimb_si.as_text(), '', '', ''])
+        limb_data.append(['Hindlimb SI', metrics.hindlimb_si.as_text(), '', '', ''])
         
-    except Exception as e:
-        # Return a simple error PDF if something goes wrong
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-        temp_file.close()
+        limb_table = Table(limb_data)
+        limb_table.setStyle(LIMB_TABLE_STYLE)
         
-        doc = SimpleDocTemplate(temp_file.name, pagesize=A4)
-        story = []
+        story.append(limb_table)
         
-        error_style = ParagraphStyle(
-            'Error',
-            parent=styles['Normal'],
-            fontSize=14,
-            textColor=colors.red
-        )
-        
-        story.append(Paragraph("Error Generating PDF", styles['Heading1']))
-        story.append(Spacer(1, 20))
-        story.append(Paragraph(f"An error occurred while converting Excel to PDF: {str(e)}", error_style))
-        
-        doc.build(story)
+        # Build PDF
+        with stats.stage('pdf_render'):
+            doc.build(story)
         
-        with open(temp_file.name, 'rb') as f:
-            pdf_data = f.read()
+        return None if output is not None else buffer.getvalue()
         
-        os.unlink(temp_file.name)
-        return pdf_data
+    except Exception as e:
+        return write_error_pdf(e, output)
+
+
+def write_error_pdf(error, output=None):
+    """
+    Return a simple error PDF if something goes wrong.
+    Output: PDF data as bytes, or None when written to output
+    """
+    styles = get_pdf_styles()
+    buffer = output if output is not None else io.BytesIO()
+    if output is not None:
+        output.seek(0)
+        output.truncate()
+    
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    story = []
+    
+    error_style = styles['Error']
+    
+    story.append(Paragraph("Error Generating PDF", styles['Heading1']))
+    story.append(Spacer(1, 20))
+    story.append(Paragraph(f"An error occurred while converting Excel to PDF: {escape(str(error))}", error_style))
+    
+    doc.build(story)
+    
+    return None if output is not None else buffer.getvalue()
@@ -0,0 +1,144 @@
+import cProfile
+import io
+import pstats
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class StageRecord:
+    """Timing of one pipeline stage; rows can be filled in while the stage runs."""
+
+    __slots__ = ('name', 'depth', 'seconds', 'rows', 'peak_memory_mb', 'max_rss_mb')
+
+    def __init__(self, name, rows=None, depth=0):
+        self.name = name
+        self.depth = depth
+        self.seconds = None
+        self.rows = rows
+        self.peak_memory_mb = None
+        self.max_rss_mb = None
+
+    def as_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+class PipelineStats:
+    """
+    Collects per-stage wall time, row counts and memory for one report request.
+
+    Pass an instance as stats= to process_excel_report / process_pdf_report. Used as a
+    context manager it can also profile the whole request with cProfile
+    (profile=True) and trace Python allocations per stage (track_memory=True,
+    which slows the pipeline down noticeably).
+    """
+
+    def __init__(self, profile=False, track_memory=False):
+        self.stages = []
+        self.profile = profile
+        self.track_memory = track_memory
+        self._profiler = None
+        self._started_tracemalloc = False
+        self._open = []
+
+    def __enter__(self):
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        if self.profile:
+            self._profiler = cProfile.Profile()
+            try:
+                self._profiler.enable()
+            except ValueError as e:
+                # Only one profiler can be active at a time on newer Pythons
+                print(f"Warning: profiling disabled: {e}")
+                self._profiler = None
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        return False
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        """
+        Time the enclosed block as one stage and yield its StageRecord.
+
+        Stages opened inside another stage are recorded as its sub-stages (depth + 1).
+        """
+        record = StageRecord(name, rows, len(self._open))
+        # Keep the stage order by start time even though records complete inside-out
+        self.stages.append(record)
+        tracing = tracemalloc.is_tracing() and self.track_memory
+        if tracing:
+            # reset_peak() is global, so fold the enclosing stage's peak so far into its running maximum
+            if self._open:
+                self._open[-1][1] = max(self._open[-1][1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        self._open.append([record, 0])
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.seconds = time.perf_counter() - start
+            _, running_peak = self._open.pop()
+            if tracing:
+                peak = max(running_peak, tracemalloc.get_traced_memory()[1])
+                record.peak_memory_mb = peak / (1024 * 1024)
+                if self._open:
+                    self._open[-1][1] = max(self._open[-1][1], peak)
+            record.max_rss_mb = _max_rss_mb()
+
+    @property
+    def total_seconds(self):
+        """Wall time of the top-level stages (sub-stages are already included in them)."""
+        return sum(record.seconds for record in self.stages if record.depth == 0 and record.seconds)
+
+    def as_rows(self):
+        """Stage records as a list of dictionaries, ready for a table."""
+        return [record.as_dict() for record in self.stages]
+
+    def profile_text(self, limit=25, sort='cumulative'):
+        """Top functions of the cProfile run as text, or an empty string when not profiled."""
+        if self._profiler is None:
+            return ""
+        output = io.StringIO()
+        pstats.Stats(self._profiler, stream=output).sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+    def dump_profile(self, path):
+        """Write the cProfile data to a .pstats file for snakeviz/pstats. Returns False when not profiled."""
+        if self._profiler is None:
+            return False
+        self._profiler.dump_stats(path)
+        return True
+
+
+class _NullStats:
+    """Stand-in used when the caller does not collect stats."""
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        yield StageRecord(name, rows)
+
+
+NULL_STATS = _NullStats()
+
+
+def _max_rss_mb():
+    """Peak resident set size of this process so far, in MB (None where unavailable)."""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return max_rss / (1024 * 1024) if sys.platform == 'darwin' else max_rss / 1024
@@ -0,0 +1,68 @@
+import io
+import os
+import threading
+
+from PIL import Image as PILImage
+
+# Images ship next to this module, so they are found whatever the working directory is
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DOG_TOP_VIEW = "DogTopView.png"
+# Display size of the dog diagram on Sheet1, in pixels
+DOG_IMAGE_SIZE = (130, 400)
+
+_scaled_images = {}
+_lock = threading.Lock()
+
+
+def get_scaled_png(filename, size):
+    """
+    Load an asset once per process, resized to its display size and encoded as PNG.
+
+    Args:
+        filename: Image file name inside ASSET_DIR
+        size: (width, height) in pixels
+
+    Returns:
+        PNG bytes, or None if the asset is missing or unreadable
+    """
+    key = (filename, size)
+    with _lock:
+        if key in _scaled_images:
+            return _scaled_images[key]
+
+    data = None
+    try:
+        with PILImage.open(os.path.join(ASSET_DIR, filename)) as image:
+            scaled = image.resize(size, PILImage.LANCZOS)
+        buffer = io.BytesIO()
+        scaled.save(buffer, format="png", optimize=True)
+        data = buffer.getvalue()
+    except OSError as e:
+        print(f"Warning: could not load {filename}: {e}")
+
+    with _lock:
+        _scaled_images[key] = data
+    return data
+
+
+def get_dog_image_png():
+    """DogTopView.png scaled to DOG_IMAGE_SIZE, or None if it is missing."""
+    return get_scaled_png(DOG_TOP_VIEW, DOG_IMAGE_SIZE)
+
+
+def make_dog_image():
+    """
+    New openpyxl Image of the dog diagram backed by the cached PNG bytes.
+
+    Each workbook needs its own Image object, but none of them touch the file
+    system or re-encode the picture.
+
+    Returns:
+        openpyxl Image, or None if DogTopView.png is missing
+    """
+    data = get_dog_image_png()
+    if data is None:
+        return None
+    from openpyxl.drawing.image import Image
+    return Image(io.BytesIO(data))
@@ -0,0 +1,208 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+# Modules and assets that determine the generated reports; editing any of them invalidates the cache
+PIPELINE_MODULES = ["excel_processor.py", "writer_backends.py", "report_styles.py", "ingest.py",
+                    "gait_metrics.py", "pdf_processor.py", "report_assets.py", "DogTopView.png",
+                    "visit_store.py", "report_jobs.py", "limb_groups.py",
+                    "report_patch.py", "xlsx_package.py"]
+
+_code_version = None
+
+
+def get_code_version():
+    """Hash of the report pipeline sources, computed once per process."""
+    global _code_version
+    if _code_version is None:
+        digest = hashlib.sha256()
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        for module in PIPELINE_MODULES:
+            path = os.path.join(base_dir, module)
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    digest.update(f.read())
+        _code_version = digest.hexdigest()[:16]
+    return _code_version
+
+
+def make_cache_key(upload_bytes, manual_patient_data=None, backend="openpyxl", report_date=None, extra=None):
+    """
+    Build the content address of a report.
+
+    Args:
+        upload_bytes: Raw bytes of the uploaded workbook
+        manual_patient_data: Dictionary with manual patient data (optional)
+        backend: Writer backend name used to build the report
+        report_date: Date printed on Sheet1, defaults to today so cached reports never show a stale date
+        extra: Any other JSON-serializable input the report depends on, e.g. trend visits (optional)
+
+    Returns:
+        Hex digest identifying the report
+    """
+    digest = hashlib.sha256()
+    digest.update(hashlib.sha256(upload_bytes).digest())
+    digest.update(json.dumps(manual_patient_data or {}, sort_keys=True).encode('utf-8'))
+    digest.update(backend.encode('utf-8'))
+    digest.update(get_code_version().encode('utf-8'))
+    digest.update((report_date or date.today()).isoformat().encode('utf-8'))
+    if extra is not None:
+        digest.update(json.dumps(extra, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ReportCache:
+    """
+    Two-tier cache of generated report bytes keyed by make_cache_key.
+
+    The memory tier is an LRU bounded by entry count and total bytes. The optional
+    disk tier stores one file per key in disk_dir and evicts entries older than
+    ttl_seconds or, oldest first, when the directory grows past max_disk_bytes.
+    """
+
+    def __init__(self, max_entries=32, max_memory_bytes=64 * 1024 * 1024,
+                 disk_dir=None, max_disk_bytes=512 * 1024 * 1024, ttl_seconds=7 * 24 * 3600):
+        self.max_entries = max_entries
+        self.max_memory_bytes = max_memory_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def get(self, key):
+        """Return the cached bytes for key, or None on a miss."""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return data
+
+        data = self._read_disk(key)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, data)
+        return data
+
+    def put(self, key, data):
+        """Store report bytes in the memory tier and, when configured, on disk."""
+        with self._lock:
+            self._remember(key, data)
+        self._write_disk(key, data)
+
+    def get_or_build(self, key, build):
+        """Return the cached bytes for key, calling build() and storing its result on a miss."""
+        data = self.get(key)
+        if data is None:
+            data = build()
+            self.put(key, data)
+        return data
+
+    def stats(self):
+        """Hit/miss counters and current size of the memory tier."""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                'entries': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+            }
+
+    def clear(self):
+        """Drop every entry from the memory tier (disk entries are left to TTL eviction)."""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+
+    def _remember(self, key, data):
+        if len(data) > self.max_memory_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while len(self._memory) > self.max_entries or self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.bin")
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl_seconds:
+                os.remove(path)
+                return None
+            with open(path, 'rb') as f:
+                data = f.read()
+            # Touch the entry so size eviction treats it as recently used
+            os.utime(path)
+            return data
+        except OSError:
+            return None
+
+    def _write_disk(self, key, data):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Warning: could not write report cache entry: {e}")
+            return
+        self._evict_disk()
+
+    def _evict_disk(self):
+        """Remove expired entries, then the least recently used ones until under max_disk_bytes."""
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith('.bin'):
+                continue
+            path = os.path.join(self.disk_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if now - stat.st_mtime > self.ttl_seconds:
+                _remove_quietly(path)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            _remove_quietly(path)
+            total -= size
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
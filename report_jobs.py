@@ -0,0 +1,370 @@
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+
+class ServerBusyError(RuntimeError):
+    """Raised when the report queue is full and a job cannot be admitted."""
+
+
+def generate_reports(upload_bytes, filename, manual_patient_data=None, backend="openpyxl", previous_visits=None,
+                     parse_cache_dir=None, parse_cache_max_bytes=1024 * 1024 * 1024, visit_store_path=None,
+                     profile_path=None, track_memory=False):
+    """
+    Build the Excel and PDF reports for one upload. Runs inside a pool worker.
+
+    Args:
+        upload_bytes: Raw bytes of the uploaded workbook
+        filename: Name of the uploaded file, shown in the PDF
+        manual_patient_data: Dictionary with manual patient data (optional)
+        backend: Excel writer backend
+        previous_visits: Earlier visit summaries for the trend sheet, None for no trend sheet
+        parse_cache_dir: Directory of the parsed export cache (optional)
+        parse_cache_max_bytes: Size bound of the parsed export cache
+        visit_store_path: SQLite visit store to record the visit in (optional)
+        profile_path: Write a cProfile .pstats file of the job here (optional)
+        track_memory: Record peak Python memory per stage
+
+    Returns:
+        Dictionary with excel_data, pdf_data, stages, total_seconds, profile (text), and
+        visits_df and num_data_rows for report_patch.patch_sheet1
+    """
+    from pipeline_stats import PipelineStats
+
+    stats = PipelineStats(profile=bool(profile_path), track_memory=track_memory)
+    with stats:
+        processed_df, df_visits = _parse_upload(stats, upload_bytes, parse_cache_dir, parse_cache_max_bytes)
+        reports = _build_reports(stats, processed_df, df_visits, filename, manual_patient_data, backend,
+                                 previous_visits, visit_store_path)
+    return _job_result(stats, reports, profile_path)
+
+
+def split_export(upload_bytes, parse_cache_dir=None, parse_cache_max_bytes=1024 * 1024 * 1024):
+    """
+    Parse one upload and split it into its visits (see visit_split.split_by_visit). Runs inside a pool worker.
+
+    The parts hold only the processed trial rows, so generate_visit_report can build
+    each visit's reports on another worker without parsing the upload again.
+
+    Returns:
+        List of dictionaries with label, processed_df and visits_df per VISITS row
+
+    Raises:
+        ValueError: the trials cannot be matched to the VISITS rows
+    """
+    from pipeline_stats import NULL_STATS
+    from visit_split import split_by_visit
+
+    processed_df, df_visits = _parse_upload(NULL_STATS, upload_bytes, parse_cache_dir, parse_cache_max_bytes)
+    return split_by_visit(processed_df, df_visits)
+
+
+def generate_visit_report(processed_df, visits_df, filename, manual_patient_data=None, backend="openpyxl",
+                          visit_store_path=None, profile_path=None, track_memory=False):
+    """
+    Build the Excel and PDF reports of one visit from split_export. Runs inside a pool worker.
+
+    Args:
+        processed_df: The visit's processed trial rows
+        visits_df: The visit's VISITS row
+        filename: Name of the uploaded file, shown in the PDF
+        (other arguments as for generate_reports)
+
+    Returns:
+        Dictionary like generate_reports
+    """
+    from pipeline_stats import PipelineStats
+
+    stats = PipelineStats(profile=bool(profile_path), track_memory=track_memory)
+    with stats:
+        reports = _build_reports(stats, processed_df, visits_df, filename, manual_patient_data, backend,
+                                 None, visit_store_path)
+    return _job_result(stats, reports, profile_path)
+
+
+def _parse_upload(stats, upload_bytes, parse_cache_dir, parse_cache_max_bytes):
+    """Read the raw export once (both sheets, only the columns we use) and filter its trial rows."""
+    import io
+
+    from excel_processor import process_original_excel_data
+    from ingest import read_raw_workbook
+
+    parse_cache = None
+    if parse_cache_dir:
+        from parsed_cache import ParsedExportCache
+        parse_cache = ParsedExportCache(parse_cache_dir, max_bytes=parse_cache_max_bytes)
+    with stats.stage('read') as record:
+        df_files_dat, df_visits = read_raw_workbook(io.BytesIO(upload_bytes), cache=parse_cache)
+        record.rows = len(df_files_dat)
+    with stats.stage('filter', rows=len(df_files_dat)) as record:
+        processed_df = process_original_excel_data(df_files_dat)
+        record.rows = len(processed_df)
+    return processed_df, df_visits
+
+
+def _build_reports(stats, processed_df, df_visits, filename, manual_patient_data, backend, previous_visits,
+                   visit_store_path):
+    """Metrics, visit store entry, workbook and PDF of processed trial rows."""
+    from excel_processor import process_excel_report
+    from gait_metrics import compute_gait_metrics
+    from limb_groups import build_limb_groups
+    from pdf_processor import build_pdf_report
+    from visit_store import VisitStore, visit_identity, visit_summary
+
+    with stats.stage('metrics', rows=len(processed_df)):
+        # Parse the limb/trial labels once for the metrics, the workbook and the PDF
+        limb_groups = build_limb_groups(processed_df["Data Source"])
+        metrics = compute_gait_metrics(processed_df, limb_groups)
+
+    identity = visit_identity(df_visits, manual_patient_data)
+    trend_visits = None
+    if identity is not None and previous_visits is not None:
+        trend_visits = previous_visits + [visit_summary(identity, metrics)]
+
+    # Process Excel with patient data from VISITS sheet and manual inputs,
+    # the workbook is built in memory and returned as bytes
+    excel_data = process_excel_report(processed_df, None, df_visits, manual_patient_data, backend=backend,
+                                      stats=stats, preprocessed=True, trend_visits=trend_visits,
+                                      limb_groups=limb_groups)
+
+    # Save this visit for future trend sheets, only once its report has been built
+    if identity is not None and visit_store_path:
+        try:
+            store = VisitStore(visit_store_path)
+            store.record_visit(identity, metrics, filename)
+            store.close()
+        except Exception as e:
+            print(f"Warning: could not record visit: {e}")
+
+    # The PDF reuses the processed data instead of parsing the workbook again
+    with stats.stage('pdf'):
+        pdf_data = build_pdf_report(processed_df, filename, metrics, stats=stats)
+    return {
+        'excel_data': excel_data,
+        'pdf_data': pdf_data,
+        'visits_df': df_visits,
+        'num_data_rows': len(processed_df),
+    }
+
+
+def _job_result(stats, reports, profile_path):
+    if profile_path:
+        os.makedirs(os.path.dirname(profile_path) or '.', exist_ok=True)
+        stats.dump_profile(profile_path)
+    return {
+        **reports,
+        'stages': stats.as_rows(),
+        'total_seconds': stats.total_seconds,
+        'profile': stats.profile_text(),
+    }
+
+
+class ReportJob:
+    """Handle of one submitted report job, kept in the submitting session."""
+
+    def __init__(self, future, label=''):
+        self.future = future
+        self.label = label
+        self.submitted_at = time.monotonic()
+        self.finished_at = None
+        future.add_done_callback(self._finished)
+
+    def _finished(self, future):
+        self.finished_at = time.monotonic()
+
+    @property
+    def status(self):
+        """One of 'queued', 'running', 'done', 'failed' or 'cancelled'."""
+        if self.future.cancelled():
+            return 'cancelled'
+        if self.future.done():
+            return 'failed' if self.future.exception() is not None else 'done'
+        return 'running' if self.future.running() else 'queued'
+
+    @property
+    def elapsed(self):
+        """Seconds since submission, up to completion."""
+        return (self.finished_at or time.monotonic()) - self.submitted_at
+
+    def done(self):
+        return self.future.done()
+
+    def result(self, timeout=None):
+        """
+        The job's return value; re-raises the exception of a failed job.
+
+        Raises:
+            concurrent.futures.TimeoutError: the job did not finish within timeout seconds
+        """
+        return self.future.result(timeout)
+
+    def cancel(self):
+        """Cancel the job if it has not started yet."""
+        return self.future.cancel()
+
+
+class ReportJobPool:
+    """
+    Process pool that runs report jobs outside the Streamlit script threads.
+
+    Jobs wait in a FIFO queue and are handed to the workers one per free worker,
+    so a queued job can still be cancelled and its queue position is exact.
+    At most max_pending jobs may be queued or running at once; submit() raises
+    ServerBusyError beyond that so the app can answer straight away instead of
+    piling up work. max_workers=0 runs jobs inline in the calling thread.
+
+    A worker that dies (killed, out of memory, crashed in native code) breaks the
+    whole executor; the jobs that were running on it fail with BrokenProcessPool
+    and the pool starts a fresh executor for the queued and later jobs.
+    """
+
+    def __init__(self, max_workers=None, max_pending=None):
+        self.max_workers = min(4, os.cpu_count() or 1) if max_workers is None else max_workers
+        self.max_pending = max_pending or max(self.max_workers, 1) * 2
+        # Re-entrant: a worker future that is already done runs its callback inside _dispatch
+        self._lock = threading.RLock()
+        self._jobs = []
+        self._queue = deque()
+        self._running = 0
+        self._executor = None
+        if self.max_workers > 0:
+            self._executor = self._new_executor()
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(self.max_workers, mp_context=_pool_context(), initializer=_init_worker)
+
+    def _replace_broken_executor(self, executor):
+        """Swap in a fresh executor if executor is still the current, broken one."""
+        with self._lock:
+            if executor is not self._executor:
+                return
+            print("Warning: a report worker stopped unexpectedly, restarting the worker pool")
+            self._executor = self._new_executor()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, fn, *args, label='', **kwargs):
+        """
+        Queue fn(*args, **kwargs) and return its ReportJob.
+
+        Raises:
+            ServerBusyError: max_pending jobs are already queued or running
+        """
+        with self._lock:
+            self._jobs = [job for job in self._jobs if not job.done()]
+            if len(self._jobs) >= self.max_pending:
+                raise ServerBusyError(f"{len(self._jobs)} reports are already being generated, "
+                                      f"please try again in a minute")
+            job = ReportJob(Future(), label)
+            self._jobs.append(job)
+            self._queue.append((job.future, fn, args, kwargs))
+
+        if self._executor is None:
+            # Inline mode: run outside the lock so other sessions are still admitted or refused
+            future, fn, args, kwargs = self._queue.popleft()
+            if future.set_running_or_notify_cancel():
+                _copy_outcome(future, fn, args, kwargs)
+        else:
+            self._dispatch()
+        return job
+
+    def _dispatch(self):
+        """Hand queued jobs to the executor while workers are free."""
+        with self._lock:
+            while self._queue and self._running < self.max_workers:
+                future, fn, args, kwargs = self._queue.popleft()
+                # Skip jobs cancelled while they were queued
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self._running += 1
+                executor = self._executor
+                try:
+                    try:
+                        worker_future = executor.submit(fn, *args, **kwargs)
+                    except BrokenProcessPool:
+                        # Broken before the failed jobs' callbacks ran; this job never started
+                        self._replace_broken_executor(executor)
+                        executor = self._executor
+                        worker_future = executor.submit(fn, *args, **kwargs)
+                except Exception as e:
+                    self._running -= 1
+                    future.set_exception(e)
+                    continue
+                worker_future.add_done_callback(partial(self._worker_done, future, executor))
+
+    def _worker_done(self, future, executor, worker_future):
+        with self._lock:
+            self._running -= 1
+        try:
+            future.set_result(worker_future.result())
+        except BrokenProcessPool as e:
+            self._replace_broken_executor(executor)
+            future.set_exception(e)
+        except Exception as e:
+            future.set_exception(e)
+        self._dispatch()
+
+    def queue_position(self, job):
+        """Number of queued jobs submitted before job (0 when it is next or already running)."""
+        with self._lock:
+            ahead = 0
+            for other in self._jobs:
+                if other is job:
+                    break
+                if other.status == 'queued':
+                    ahead += 1
+            return ahead
+
+    def stats(self):
+        """Worker count and current admission state."""
+        with self._lock:
+            jobs = [job for job in self._jobs if not job.done()]
+            return {
+                'workers': self.max_workers,
+                'max_pending': self.max_pending,
+                'pending': len(jobs),
+                'running': sum(1 for job in jobs if job.status == 'running'),
+            }
+
+    def warm_up(self):
+        """Start every worker process now so the first report does not pay for spawning and imports."""
+        if self._executor is not None:
+            for _ in range(self.max_workers):
+                self._executor.submit(_noop)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            while self._queue:
+                self._queue.popleft()[0].cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def _copy_outcome(future, fn, args, kwargs):
+    """Run fn in this thread and store its result or exception on future."""
+    try:
+        future.set_result(fn(*args, **kwargs))
+    except Exception as e:
+        future.set_exception(e)
+
+
+def _pool_context():
+    # Forking a multi-threaded server process is unsafe; fresh interpreters are
+    # started from a fork server where available, otherwise spawned
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+def _init_worker():
+    """Import the report pipeline once when a worker starts."""
+    import excel_processor
+    import pdf_processor
+
+
+def _noop():
+    return None
@@ -0,0 +1,188 @@
+import io
+import math
+import numbers
+import re
+import zipfile
+from xml.sax.saxutils import escape, unescape
+
+from openpyxl.utils import get_column_letter
+
+from excel_processor import process_sheet1_data, summary_rows
+from writer_backends import SheetRecorder
+from xlsx_package import sheet_part, sheet_parts
+
+SHARED_STRINGS_PART = 'xl/sharedStrings.xml'
+# A cell that refers to the shared string table: group 2 is the string's index
+SHARED_STRING_CELL = re.compile(r'(<c\b[^>]*\bt="s"[^>]*>\s*<v>)(\d+)(</v>)')
+
+
+def sheet1_layout(visits_df, num_data_rows, manual_patient_data):
+    """Record Sheet1 as process_excel_report builds it for a Sheet2 with num_data_rows data rows."""
+    recorder = SheetRecorder("Sheet1")
+    summary_start_row, forelimb_start_row = summary_rows(num_data_rows)
+    process_sheet1_data(recorder, visits_df, summary_start_row, forelimb_start_row, manual_patient_data)
+    return recorder
+
+
+def patch_sheet1(excel_data, visits_df, num_data_rows, previous_manual_data, manual_patient_data):
+    """
+    Regenerate only Sheet1 of a finished report after the patient fields changed.
+
+    Sheet2 depends only on FILES_DAT, so the workbook is re-zipped with its other
+    parts untouched and the new values written into the existing Sheet1 cells.
+    When the workbook has a shared string table (xlsxwriter), it is rebuilt from
+    the cells that still use it, so the previous patient fields do not stay in it.
+    This only works while the patient fields change cell values, not the layout
+    (cells, styles, formulas, merges); otherwise None is returned and the caller
+    regenerates the whole report.
+
+    Args:
+        excel_data: Workbook bytes from process_excel_report
+        visits_df: DataFrame with patient data from VISITS sheet the report was built from
+        num_data_rows: Number of Sheet2 data rows (len of the processed DataFrame)
+        previous_manual_data: Manual patient data the report was built with
+        manual_patient_data: New manual patient data
+
+    Returns:
+        The patched workbook bytes, or None when Sheet1 must be rebuilt from scratch
+    """
+    previous = sheet1_layout(visits_df, num_data_rows, previous_manual_data)
+    current = sheet1_layout(visits_df, num_data_rows, manual_patient_data)
+    if not _same_layout(previous, current):
+        return None
+
+    try:
+        with zipfile.ZipFile(io.BytesIO(excel_data)) as package:
+            sheet_path = sheet_part(package, current.title)
+            sheet_xml = package.read(sheet_path).decode('utf-8')
+            shared_strings = _read_shared_strings(package)
+            # Every plain value is rewritten, so the report date is refreshed as well
+            for (row, column), recorded in current.cells.items():
+                if _is_formula(recorded.value):
+                    continue
+                sheet_xml = _replace_cell(sheet_xml, f"{get_column_letter(column)}{row}", recorded.value,
+                                          shared_strings)
+                if sheet_xml is None:
+                    return None
+
+            parts = {sheet_path: sheet_xml}
+            if shared_strings is not None:
+                parts.update(_rebuild_shared_strings(package, parts, shared_strings))
+
+            output = io.BytesIO()
+            with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as patched:
+                for info in package.infolist():
+                    data = parts[info.filename].encode('utf-8') if info.filename in parts else package.read(info)
+                    patched.writestr(info, data)
+    except (KeyError, ValueError, zipfile.BadZipFile) as e:
+        print(f"Warning: could not patch Sheet1: {e}")
+        return None
+    return output.getvalue()
+
+
+def _same_layout(previous, current):
+    """True when two recorded sheets differ only in plain cell values."""
+    if previous.cells.keys() != current.cells.keys():
+        return False
+    for key, recorded in current.cells.items():
+        before = previous.cells[key]
+        if (before.font, before.alignment, before.fill) != (recorded.font, recorded.alignment, recorded.fill):
+            return False
+        if (_is_formula(before.value) or _is_formula(recorded.value)) and before.value != recorded.value:
+            return False
+    return (previous.merged_ranges == current.merged_ranges
+            and len(previous.images) == len(current.images)
+            and _dimensions(previous) == _dimensions(current))
+
+
+def _dimensions(recorder):
+    return ({key: (dim.width, dim.hidden) for key, dim in recorder.column_dimensions.items()},
+            {key: dim.height for key, dim in recorder.row_dimensions.items()})
+
+
+def _is_formula(value):
+    return isinstance(value, str) and value.startswith('=')
+
+
+def _read_shared_strings(package):
+    """The <si> elements of the shared string table, or None when the workbook has none."""
+    if SHARED_STRINGS_PART not in package.namelist():
+        return None
+    table = package.read(SHARED_STRINGS_PART).decode('utf-8')
+    return re.findall(r'<si>.*?</si>|<si/>', table, re.DOTALL)
+
+
+def _shared_string_text(element):
+    return ''.join(unescape(text) for text in re.findall(r'<t\b[^>]*>(.*?)</t>', element, re.DOTALL))
+
+
+def _rebuild_shared_strings(package, parts, shared_strings):
+    """
+    Renumber the shared string cells of every worksheet into a new table of only the strings in use.
+
+    Strings are numbered by first use in workbook order, and equal strings share one entry.
+
+    Returns:
+        Dictionary of the changed parts (zip path -> XML), including the new table
+    """
+    entries = []
+    new_index = {}
+    count = 0
+
+    def renumber(match):
+        nonlocal count
+        element = shared_strings[int(match.group(2))]
+        text = _shared_string_text(element)
+        if text not in new_index:
+            new_index[text] = len(entries)
+            entries.append(element)
+        count += 1
+        return f"{match.group(1)}{new_index[text]}{match.group(3)}"
+
+    changed = {}
+    for path in sheet_parts(package):
+        sheet_xml = parts[path] if path in parts else package.read(path).decode('utf-8')
+        renumbered = SHARED_STRING_CELL.sub(renumber, sheet_xml)
+        if renumbered != sheet_xml:
+            changed[path] = renumbered
+
+    table = package.read(SHARED_STRINGS_PART).decode('utf-8')
+    header = re.search(r'<sst\b[^>]*>', table)
+    if header is None:
+        raise ValueError("shared string table without <sst> element")
+    start = re.sub(r'(\s)count="\d+"', r'\g<1>count="%d"' % count, header.group(0))
+    start = re.sub(r'uniqueCount="\d+"', 'uniqueCount="%d"' % len(entries), start)
+    changed[SHARED_STRINGS_PART] = table[:header.start()] + start + ''.join(entries) + '</sst>'
+    return changed
+
+
+def _replace_cell(sheet_xml, reference, value, shared_strings=None):
+    """
+    Replace the value of an existing <c> element, keeping its style; None if the cell is not in the XML.
+
+    Text goes to the end of shared_strings when given (renumbered by _rebuild_shared_strings), inline otherwise.
+    """
+    match = re.search(r'<c r="%s"(?=[\s/>])([^>]*?)(/>|>.*?</c>)' % reference, sheet_xml, re.DOTALL)
+    if match is None:
+        return None
+    style = re.search(r'\ss="(\d+)"', match.group(1))
+    attributes = f' r="{reference}"' + (f' s="{style.group(1)}"' if style else '')
+
+    if hasattr(value, 'item') and not isinstance(value, (str, bytes)):
+        value = value.item()  # numpy scalar
+    if value is None or value == '':
+        element = f'<c{attributes}/>'
+    elif isinstance(value, bool):
+        element = f'<c{attributes} t="b"><v>{int(value)}</v></c>'
+    elif isinstance(value, numbers.Number):
+        if not math.isfinite(value):
+            return None
+        element = f'<c{attributes}><v>{value!r}</v></c>'
+    elif shared_strings is not None:
+        text = str(value)
+        space = ' xml:space="preserve"' if text != text.strip() else ''
+        shared_strings.append(f'<si><t{space}>{escape(text)}</t></si>')
+        element = f'<c{attributes} t="s"><v>{len(shared_strings) - 1}</v></c>'
+    else:
+        element = f'<c{attributes} t="inlineStr"><is><t xml:space="preserve">{escape(str(value))}</t></is></c>'
+    return sheet_xml[:match.start()] + element + sheet_xml[match.end():]
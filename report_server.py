@@ -0,0 +1,270 @@
+import argparse
+import io
+import json
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from report_jobs import ReportJobPool, ServerBusyError, generate_reports
+
+MANUAL_FIELDS = ('species', 'breed', 'color', 'purdue_id', 'primary_dvm')
+CONTENT_TYPES = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'pdf': 'application/pdf',
+    'zip': 'application/zip',
+}
+COUNTERS = ('requests', 'reports_completed', 'reports_failed', 'rejected_busy', 'timed_out', 'bad_requests')
+
+
+class ServerMetrics:
+    """Request counters and report timings for the /metrics endpoint, shared by the handler threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.report_seconds = 0.0
+        self.max_report_seconds = 0.0
+
+    def count(self, name, report_seconds=None):
+        with self._lock:
+            self.counters[name] += 1
+            if report_seconds is not None:
+                self.report_seconds += report_seconds
+                self.max_report_seconds = max(self.max_report_seconds, report_seconds)
+
+    def snapshot(self):
+        with self._lock:
+            completed = self.counters['reports_completed']
+            return {
+                **self.counters,
+                'uptime_seconds': round(time.time() - self.started_at, 1),
+                'mean_report_seconds': round(self.report_seconds / completed, 3) if completed else None,
+                'max_report_seconds': round(self.max_report_seconds, 3),
+            }
+
+
+class ReportServer(ThreadingHTTPServer):
+    """
+    HTTP server that generates reports on a ReportJobPool.
+
+    Every request is handled in its own thread, which only waits for its job; the
+    pool bounds how many reports are generated (max_workers) and queued
+    (max_pending) at once, and requests beyond that are refused with 503.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, pool, timeout=300, max_upload_bytes=200 * 1024 * 1024, backend="openpyxl",
+                 parse_cache_dir=None, visit_store_path=None):
+        super().__init__(address, ReportRequestHandler)
+        self.pool = pool
+        self.report_timeout = timeout
+        self.max_upload_bytes = max_upload_bytes
+        self.backend = backend
+        self.parse_cache_dir = parse_cache_dir
+        self.visit_store_path = visit_store_path
+        self.metrics = ServerMetrics()
+
+
+class ReportRequestHandler(BaseHTTPRequestHandler):
+    """
+    Endpoints:
+        POST /reports  raw FILES_DAT/VISITS workbook (or FILES_DAT CSV) as the request body; query parameters
+                       filename, format (xlsx, pdf or zip with both) and the manual patient
+                       fields species, breed, color, purdue_id, primary_dvm
+        GET /health    liveness and worker pool state
+        GET /metrics   request counters and report timings
+    """
+    server_version = "PPARReportServer/1.0"
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/health':
+            stats = self.server.pool.stats()
+            self._send_json(HTTPStatus.OK, {
+                'status': 'busy' if stats['pending'] >= stats['max_pending'] else 'ok',
+                **stats,
+            })
+        elif path == '/metrics':
+            self._send_json(HTTPStatus.OK, {**self.server.metrics.snapshot(), 'pool': self.server.pool.stats()})
+        else:
+            self._send_error(HTTPStatus.NOT_FOUND, f"unknown path {path}")
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/reports':
+            self._send_error(HTTPStatus.NOT_FOUND, f"unknown path {url.path}")
+            return
+        metrics = self.server.metrics
+        metrics.count('requests')
+
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        report_format = query.get('format', 'xlsx')
+        if report_format not in CONTENT_TYPES:
+            metrics.count('bad_requests')
+            self._send_error(HTTPStatus.BAD_REQUEST, f"format must be one of {', '.join(CONTENT_TYPES)}")
+            return
+        filename = os.path.basename(query.get('filename', 'upload.xlsx')).replace('"', '') or 'upload.xlsx'
+        manual_patient_data = {field: query.get(field, '') for field in MANUAL_FIELDS}
+
+        upload_bytes = self._read_body()
+        if upload_bytes is None:
+            metrics.count('bad_requests')
+            return
+
+        try:
+            job = self.server.pool.submit(
+                generate_reports, upload_bytes, filename, manual_patient_data,
+                backend=self.server.backend, parse_cache_dir=self.server.parse_cache_dir,
+                visit_store_path=self.server.visit_store_path, label=filename)
+        except ServerBusyError as e:
+            metrics.count('rejected_busy')
+            self._send_error(HTTPStatus.SERVICE_UNAVAILABLE, str(e), headers={'Retry-After': '30'})
+            return
+
+        try:
+            result = job.result(timeout=self.server.report_timeout)
+        except FutureTimeoutError:
+            # A queued job is dropped; a running one cannot be interrupted and finishes in its worker
+            job.cancel()
+            metrics.count('timed_out')
+            self._send_error(HTTPStatus.GATEWAY_TIMEOUT,
+                             f"report not ready after {self.server.report_timeout} seconds")
+            return
+        except BrokenProcessPool as e:
+            # The pool has already started fresh workers, so only the reports running in the crash fail
+            metrics.count('reports_failed')
+            self._send_error(HTTPStatus.INTERNAL_SERVER_ERROR,
+                             f"report worker crashed, the workers have been restarted: {e}")
+            return
+        except Exception as e:
+            metrics.count('reports_failed')
+            self._send_error(HTTPStatus.UNPROCESSABLE_ENTITY, f"error processing file: {e}")
+            return
+        metrics.count('reports_completed', report_seconds=job.elapsed)
+
+        base_name = filename.replace('.xlsx', '').replace('.xls', '').replace('.csv', '')
+        excel_filename, pdf_filename = f"processed_{base_name}.xlsx", f"report_{base_name}.pdf"
+        if report_format == 'xlsx':
+            body, download_name = result['excel_data'], excel_filename
+        elif report_format == 'pdf':
+            body, download_name = result['pdf_data'], pdf_filename
+        else:
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, 'w') as archive:
+                # The xlsx is already deflated inside
+                archive.writestr(excel_filename, result['excel_data'], compress_type=zipfile.ZIP_STORED)
+                archive.writestr(pdf_filename, result['pdf_data'], compress_type=zipfile.ZIP_DEFLATED)
+            body, download_name = buffer.getvalue(), f"reports_{base_name}.zip"
+
+        self._send(HTTPStatus.OK, body, CONTENT_TYPES[report_format], headers={
+            'Content-Disposition': f'attachment; filename="{download_name}"',
+            'X-Report-Seconds': f"{job.elapsed:.3f}",
+        })
+
+    def _read_body(self):
+        """The request body, or None after an error response (missing, empty or too large)."""
+        length = self.headers.get('Content-Length')
+        if length is None:
+            self._send_error(HTTPStatus.LENGTH_REQUIRED, "Content-Length is required")
+            return None
+        try:
+            length = int(length)
+        except ValueError:
+            self._send_error(HTTPStatus.BAD_REQUEST, "invalid Content-Length")
+            return None
+        if length > self.server.max_upload_bytes:
+            self._send_error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                             f"upload larger than {self.server.max_upload_bytes // (1024 * 1024)} MB")
+            return None
+        if length <= 0:
+            self._send_error(HTTPStatus.BAD_REQUEST, "the raw workbook must be sent as the request body")
+            return None
+        return self.rfile.read(length)
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, payload, headers=None):
+        self._send(status, json.dumps(payload).encode('utf-8'), 'application/json', headers)
+
+    def _send_error(self, status, message, headers=None):
+        # Error bodies are JSON like every other response; keep-alive is dropped since the body may be unread
+        self.close_connection = True
+        self._send_json(status, {'error': message}, headers)
+
+
+def make_server(host="127.0.0.1", port=8503, workers=None, max_pending=None, **settings):
+    """
+    Create a ReportServer with its own worker pool; port 0 picks a free port (see server.server_address).
+
+    Args:
+        host: Interface to listen on, localhost by default
+        port: TCP port
+        workers: Worker processes (default: up to 4, 0 runs reports in the request threads)
+        max_pending: Reports that may be queued or running before requests are refused
+        **settings: timeout, max_upload_bytes, backend, parse_cache_dir, visit_store_path
+
+    Returns:
+        ReportServer; call serve_forever(), then shutdown() and pool.shutdown()
+    """
+    pool = ReportJobPool(max_workers=workers, max_pending=max_pending)
+    return ReportServer((host, port), pool, **settings)
+
+
+def _env_int(name):
+    value = os.environ.get(name)
+    return int(value) if value else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve gait lab report generation over HTTP.")
+    parser.add_argument("--host", default=os.environ.get("PPAR_SERVER_HOST", "127.0.0.1"),
+                        help="Interface to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=_env_int("PPAR_SERVER_PORT") or 8503,
+                        help="Port to listen on (default: 8503)")
+    parser.add_argument("-j", "--workers", type=int, default=_env_int("PPAR_REPORT_WORKERS"),
+                        help="Worker processes (default: up to 4, 0 generates reports in the request threads)")
+    parser.add_argument("--max-queued", type=int, default=_env_int("PPAR_MAX_QUEUED_REPORTS"),
+                        help="Reports queued or running before requests get 503 (default: twice the workers)")
+    parser.add_argument("--timeout", type=float, default=_env_int("PPAR_REPORT_TIMEOUT") or 300,
+                        help="Seconds a request waits for its report before 504 (default: 300)")
+    parser.add_argument("--max-upload-mb", type=int, default=_env_int("PPAR_MAX_UPLOAD_MB") or 200,
+                        help="Largest accepted upload (default: 200)")
+    parser.add_argument("--backend", default="openpyxl", help="Excel writer backend (openpyxl or xlsxwriter)")
+    parser.add_argument("--parse-cache", default=os.environ.get("PPAR_PARSE_CACHE_DIR"),
+                        help="Directory to cache parsed raw exports in, for faster repeated requests")
+    parser.add_argument("--visit-store", help="SQLite visit store to save each visit to")
+    args = parser.parse_args(argv)
+
+    server = make_server(args.host, args.port, workers=args.workers, max_pending=args.max_queued,
+                         timeout=args.timeout, max_upload_bytes=args.max_upload_mb * 1024 * 1024,
+                         backend=args.backend, parse_cache_dir=args.parse_cache,
+                         visit_store_path=args.visit_store)
+    server.pool.warm_up()
+    host, port = server.server_address[:2]
+    print(f"Serving reports on http://{host}:{port} with {server.pool.max_workers} worker(s)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.pool.shutdown(wait=False)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
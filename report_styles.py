@@ -0,0 +1,85 @@
+import weakref
+
+from openpyxl.styles import PatternFill, Alignment, Font
+from openpyxl.styles.cell_style import StyleArray
+
+CENTER = Alignment(horizontal="center", vertical="center")
+LEFT = Alignment(horizontal="left", vertical="center")
+RIGHT = Alignment(horizontal="right", vertical="center")
+FOOTNOTE_FONT = Font(italic=True, size=10, underline='single')
+DEFAULT_FONT = Font()
+DEFAULT_ALIGNMENT = Alignment()
+DEFAULT_FILL = PatternFill()
+
+# Every font/alignment combination used in the report, built once per process
+NAMED_STYLES = {
+    'plain': (None, None),
+    'center': (None, CENTER),
+    'bold': (Font(bold=True), None),
+    'header': (Font(bold=True), CENTER),
+    'title': (Font(bold=True, size=16), CENTER),
+    'date': (Font(size=10), CENTER),
+    'label': (Font(bold=True, size=12), LEFT),
+    'value': (Font(size=12), LEFT),
+    'heading': (Font(bold=True, size=14), CENTER),
+    'heading_right': (Font(bold=True, size=14), RIGHT),
+    'bold_right': (Font(bold=True), RIGHT),
+    'arrow': (Font(size=14), CENTER),
+    'arrow_header': (Font(size=12), CENTER),
+    'footnote': (FOOTNOTE_FONT, CENTER),
+    'footnote_right': (FOOTNOTE_FONT, RIGHT),
+}
+
+_fills = {}
+# Per-workbook cache of the openpyxl StyleArray each (style, fill) pair resolves to
+_workbook_styles = weakref.WeakKeyDictionary()
+
+
+def get_fill(color):
+    """Return the shared solid PatternFill for an RGB hex color."""
+    fill = _fills.get(color)
+    if fill is None:
+        fill = _fills[color] = PatternFill(start_color=color, end_color=color, fill_type='solid')
+    return fill
+
+
+def apply_style(cell, name, fill_color=None):
+    """
+    Give a cell one of the NAMED_STYLES, optionally with a solid fill.
+
+    On openpyxl cells the font/alignment/fill are registered with the workbook
+    once per (name, fill_color) and later cells just copy the resulting style
+    ids. Other worksheet stand-ins (SheetRecorder) get the shared style objects.
+
+    Args:
+        cell: Cell returned by ws.cell(...)
+        name: Key in NAMED_STYLES
+        fill_color: RGB hex string for a solid fill (optional)
+    """
+    font, alignment = NAMED_STYLES[name]
+    key = (name, fill_color)
+
+    if hasattr(cell, '_style'):
+        styles = _workbook_styles.setdefault(cell.parent.parent, {})
+        style_array = styles.get(key)
+        if style_array is not None:
+            cell._style = StyleArray(style_array)
+            return cell
+        cell._style = StyleArray()
+        _assign(cell, font, alignment, fill_color)
+        styles[key] = StyleArray(cell._style)
+        return cell
+
+    cell.font = font if font is not None else DEFAULT_FONT
+    cell.alignment = alignment if alignment is not None else DEFAULT_ALIGNMENT
+    cell.fill = get_fill(fill_color) if fill_color is not None else DEFAULT_FILL
+    return cell
+
+
+def _assign(cell, font, alignment, fill_color):
+    if font is not None:
+        cell.font = font
+    if alignment is not None:
+        cell.alignment = alignment
+    if fill_color is not None:
+        cell.fill = get_fill(fill_color)
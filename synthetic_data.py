@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+
+from ingest import COLUMN_MAPPING
+
+LIMBS = ['LF', 'LH', 'RF', 'RH']
+
+# Typical ranges of the measured metrics per limb: (max force %BW, impulse %BW*s, contact time ms)
+LIMB_RANGES = {
+    'LF': ((45, 65), (10, 16), (250, 380)),
+    'RF': ((45, 65), (10, 16), (250, 380)),
+    'LH': ((25, 45), (5, 10), (220, 340)),
+    'RH': ((25, 45), (5, 10), (220, 340)),
+}
+
+# Other columns the pressure platform software exports, used as filler
+EXTRA_COLUMN_NAMES = [
+    "Peak pressure [N/cm²]", "Contact area [cm²]", "Stance phase [%]", "Swing time [ms]",
+    "Step length [cm]", "Stride length [cm]", "Gait velocity [m/s]", "Paw width [cm]",
+]
+
+
+def make_files_dat(num_trials, extra_columns=40, missing_rate=0.02, include_dat_rows=True, seed=0):
+    """
+    Generate a raw FILES_DAT sheet like the pressure platform exports.
+
+    Rows come in LF, LH, RF, RH blocks labelled "LF1", "LH1", ... in "File comment".
+    Each block is preceded by the block's .dat summary row (filtered out by the report),
+    a fraction of metric values is left empty and unused columns pad the width.
+
+    Args:
+        num_trials: Number of trial (limb) rows kept by the report, 4 trials make one full block
+        extra_columns: Number of unused columns to add
+        missing_rate: Fraction of metric cells left empty
+        include_dat_rows: Add one ".dat" row per block
+        seed: Random seed
+
+    Returns:
+        DataFrame with the raw FILES_DAT columns
+    """
+    rng = np.random.default_rng(seed)
+    num_blocks = -(-num_trials // 4)
+    block_numbers = np.repeat(np.arange(1, num_blocks + 1), 4)[:num_trials]
+    limbs = np.tile(LIMBS, num_blocks)[:num_trials]
+
+    metric_columns = [col for col in COLUMN_MAPPING if col != "File comment"]
+    metrics = np.empty((num_trials, len(metric_columns)))
+    for limb, ranges in LIMB_RANGES.items():
+        mask = limbs == limb
+        for col_idx, (low, high) in enumerate(ranges):
+            metrics[mask, col_idx] = rng.uniform(low, high, mask.sum())
+    metrics[rng.random(metrics.shape) < missing_rate] = np.nan
+
+    trials = pd.DataFrame({
+        "File short name": [f"trial{number:05d}_{limb}.gait" for number, limb in zip(block_numbers, limbs)],
+        "File comment": [f"{limb}{number}" for number, limb in zip(block_numbers, limbs)],
+    })
+    for col_idx, col in enumerate(metric_columns):
+        trials[col] = metrics[:, col_idx]
+    trials["_order"] = np.arange(num_trials) + block_numbers  # leave a slot before each block
+
+    frames = [trials]
+    if include_dat_rows and num_trials:
+        dat_rows = pd.DataFrame({
+            "File short name": [f"trial{number:05d}.dat" for number in range(1, num_blocks + 1)],
+            "File comment": [f"Trial {number}" for number in range(1, num_blocks + 1)],
+        })
+        for col in metric_columns:
+            dat_rows[col] = rng.uniform(0, 100, num_blocks)
+        dat_rows["_order"] = (np.arange(num_blocks) * 5).astype(float)
+        frames.append(dat_rows)
+
+    df = pd.concat(frames, ignore_index=True).sort_values("_order", kind="stable").drop(columns="_order")
+    df = df.reset_index(drop=True)
+
+    for col_idx in range(extra_columns):
+        name = EXTRA_COLUMN_NAMES[col_idx % len(EXTRA_COLUMN_NAMES)]
+        if col_idx >= len(EXTRA_COLUMN_NAMES):
+            name = f"{name} ({col_idx // len(EXTRA_COLUMN_NAMES) + 1})"
+        df[name] = rng.uniform(0, 100, len(df)).round(3)
+    return df
+
+
+def make_visits(num_visits=1, seed=0):
+    """Generate a raw VISITS sheet with one row per visit."""
+    rng = np.random.default_rng(seed)
+    visit_dates = pd.Timestamp("2025-08-21") + pd.to_timedelta(np.arange(num_visits) * 30, unit="D")
+    return pd.DataFrame({
+        "First name": [f"Patient{i + 1}" for i in range(num_visits)],
+        "Last name": ["Synthetic"] * num_visits,
+        "Gender": rng.choice(["M", "F", "MN", "FS"], num_visits),
+        "ID": [f"MR{100000 + i}" for i in range(num_visits)],
+        "Date of birth": ["4/1/18"] * num_visits,
+        "Date of visit": visit_dates,
+        "Body mass [kg]": rng.uniform(8, 45, num_visits).round(1),
+        "N1": rng.integers(0, 10, num_visits),
+        "N2": rng.integers(0, 10, num_visits),
+        "N3": rng.integers(0, 10, num_visits),
+    })
+
+
+def write_raw_workbook(target, files_dat_df, visits_df):
+    """Write FILES_DAT and VISITS sheets to a path or binary file object."""
+    with pd.ExcelWriter(target, engine="xlsxwriter") as writer:
+        files_dat_df.to_excel(writer, sheet_name="FILES_DAT", index=False)
+        visits_df.to_excel(writer, sheet_name="VISITS", index=False)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write a synthetic raw pressure-platform export.")
+    parser.add_argument("output", help="Output .xlsx path")
+    parser.add_argument("-n", "--trials", type=int, default=40, help="Number of trial rows")
+    parser.add_argument("--extra-columns", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_raw_workbook(args.output, make_files_dat(args.trials, args.extra_columns, seed=args.seed),
+                       make_visits(seed=args.seed))
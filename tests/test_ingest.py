@@ -0,0 +1,76 @@
+import pandas as pd
+import pytest
+
+from excel_processor import process_original_excel_data
+from ingest import read_raw_workbook
+from parsed_cache import ParsedExportCache
+from synthetic_data import make_files_dat, make_visits, write_raw_workbook
+
+
+@pytest.fixture(scope="module")
+def export_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp("export") / "export.xlsx"
+    write_raw_workbook(str(path), make_files_dat(203, extra_columns=5, seed=4), make_visits(seed=4))
+    return str(path)
+
+
+def test_streaming_read_gives_the_same_processed_frame(export_path):
+    regular_files_dat, regular_visits = read_raw_workbook(export_path, streaming=False, engine='openpyxl')
+    streamed_files_dat, streamed_visits = read_raw_workbook(export_path, streaming=True)
+
+    assert isinstance(streamed_files_dat["File comment"].dtype, pd.CategoricalDtype)
+    pd.testing.assert_frame_equal(process_original_excel_data(streamed_files_dat),
+                                  process_original_excel_data(regular_files_dat))
+    pd.testing.assert_frame_equal(streamed_visits, regular_visits)
+
+
+def test_streaming_with_another_engine_is_an_error(export_path):
+    with pytest.raises(ValueError, match="openpyxl"):
+        read_raw_workbook(export_path, streaming=True, engine='calamine')
+
+
+def test_cache_keeps_streamed_and_regular_reads_apart(export_path, tmp_path):
+    cache = ParsedExportCache(str(tmp_path / "cache"))
+    streamed_files_dat, _ = read_raw_workbook(export_path, cache=cache, streaming=True)
+    regular_files_dat, _ = read_raw_workbook(export_path, cache=cache, streaming=False, engine='openpyxl')
+
+    assert cache.misses == 2
+    assert isinstance(streamed_files_dat["File comment"].dtype, pd.CategoricalDtype)
+    assert not isinstance(regular_files_dat["File comment"].dtype, pd.CategoricalDtype)
+    cached_files_dat, _ = read_raw_workbook(export_path, cache=cache, streaming=True)
+    assert cache.hits == 1
+    pd.testing.assert_frame_equal(cached_files_dat, streamed_files_dat)
+
+
+@pytest.fixture(scope="module")
+def csv_export_path(tmp_path_factory):
+    """The same export as FILES_DAT CSV, with its VISITS in "<name>_VISITS.csv"."""
+    directory = tmp_path_factory.mktemp("csv_export")
+    make_files_dat(203, extra_columns=5, seed=4).to_csv(directory / "export.csv", index=False)
+    make_visits(seed=4).to_csv(directory / "export_VISITS.csv", index=False)
+    return str(directory / "export.csv")
+
+
+@pytest.mark.parametrize("path, engine", [
+    ("xlsx", "calamine"),
+    ("csv", "pyarrow"),
+    ("csv", "c"),
+])
+def test_engines_read_the_same_frames(export_path, csv_export_path, path, engine):
+    pytest.importorskip({"calamine": "python_calamine", "pyarrow": "pyarrow", "c": "pandas"}[engine])
+    expected_files_dat, expected_visits = read_raw_workbook(export_path, streaming=False, engine='openpyxl')
+    files_dat, visits = read_raw_workbook(export_path if path == "xlsx" else csv_export_path,
+                                          streaming=False, engine=engine)
+
+    pd.testing.assert_frame_equal(files_dat, expected_files_dat)
+    pd.testing.assert_frame_equal(process_original_excel_data(files_dat),
+                                  process_original_excel_data(expected_files_dat))
+    pd.testing.assert_frame_equal(visits, expected_visits)
+
+
+@pytest.mark.parametrize("content", [b"a,b,c\n1,2,3\n", b"File comment,Notes\nLF1,x\n", b"\x00\x01\x02", b""])
+def test_unrecognised_content_is_rejected(tmp_path, content):
+    path = tmp_path / "upload.csv"
+    path.write_bytes(content)
+    with pytest.raises(ValueError, match="Unrecognised file"):
+        read_raw_workbook(str(path))
@@ -0,0 +1,158 @@
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from excel_processor import LIMB_KEY_COLUMN, process_sheet2_data
+from gait_metrics import CONTACT_TIME_COLUMN, IMPULSE_COLUMN, MAX_FORCE_COLUMN
+from limb_groups import LIMBS, build_limb_groups
+
+
+def trial_labels(trials):
+    return [f"{limb}_{trial}" for trial in trials for limb in LIMBS]
+
+
+def processed_frame(labels, seed=0):
+    """Processed trial rows with the given "Data Source" labels and random metrics."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'Data Source': labels,
+        MAX_FORCE_COLUMN: rng.uniform(20, 70, len(labels)),
+        IMPULSE_COLUMN: rng.uniform(5, 15, len(labels)),
+        CONTACT_TIME_COLUMN: rng.uniform(200, 400, len(labels)),
+    })
+
+
+def expected_table(labels, groups):
+    """Trials x limbs positions from explicit (label, group) pairs, -1 where absent."""
+    table = np.full((max(groups) + 1, len(LIMBS)), -1)
+    for position, (label, group) in enumerate(zip(labels, groups)):
+        if group >= 0:
+            table[group, LIMBS.index(label[:2])] = position
+    return table
+
+
+def sheet2(labels):
+    """Sheet2 written for labels, and the sheet rows (1-based) by label."""
+    ws = Workbook().active
+    process_sheet2_data(processed_frame(labels), ws, preprocessed=True)
+    rows = {label: position + 2 for position, label in enumerate(labels)}
+    return ws, rows
+
+
+def referenced_rows(formula):
+    """Sheet rows of the column B cells a formula refers to, expanding B2:B5 ranges."""
+    rows = set()
+    for first, last in re.findall(r'B(\d+)(?::B(\d+))?', formula):
+        rows.update(range(int(first), int(last or first) + 1))
+    return rows
+
+
+def weight_bearing_rows(ws, row):
+    cell = ws.cell(row=row, column=6).value
+    return referenced_rows(cell) if isinstance(cell, str) and cell.startswith('=') else None
+
+
+def asymmetry_rows(ws, row):
+    cell = ws.cell(row=row, column=7).value
+    return referenced_rows(cell) if isinstance(cell, str) and cell.startswith('=') else None
+
+
+def test_shuffled_rows():
+    labels = trial_labels([1, 2, 3])
+    order = np.random.default_rng(1).permutation(len(labels))
+    shuffled = [labels[i] for i in order]
+
+    groups = build_limb_groups(pd.Series(shuffled))
+    trials = [int(label.split('_')[1]) - 1 for label in shuffled]
+    np.testing.assert_array_equal(groups.table, expected_table(shuffled, trials))
+    np.testing.assert_array_equal(groups.row_group, trials)
+
+    ws, rows = sheet2(shuffled)
+    for trial in (1, 2, 3):
+        trial_rows = {rows[f"{limb}_{trial}"] for limb in LIMBS}
+        for limb in LIMBS:
+            assert weight_bearing_rows(ws, rows[f"{limb}_{trial}"]) == trial_rows
+        assert asymmetry_rows(ws, rows[f"LF_{trial}"]) == {rows[f"LF_{trial}"], rows[f"RF_{trial}"]}
+        assert asymmetry_rows(ws, rows[f"LH_{trial}"]) == {rows[f"LH_{trial}"], rows[f"RH_{trial}"]}
+        assert asymmetry_rows(ws, rows[f"RF_{trial}"]) is None
+
+
+def test_trial_missing_a_limb():
+    labels = [label for label in trial_labels([1, 2, 3]) if label != 'RH_2']
+
+    groups = build_limb_groups(pd.Series(labels))
+    np.testing.assert_array_equal(groups.table[1], [4, 5, 6, -1])
+    assert len(groups.complete_groups()) == 2
+
+    ws, rows = sheet2(labels)
+    # No weight bearing over the wrong rows for the incomplete trial
+    for limb in ('LF', 'LH', 'RF'):
+        assert weight_bearing_rows(ws, rows[f"{limb}_2"]) is None
+    assert weight_bearing_rows(ws, rows['LF_3']) == {rows[f"{limb}_3"] for limb in LIMBS}
+    assert asymmetry_rows(ws, rows['LF_2']) == {rows['LF_2'], rows['RF_2']}
+    assert asymmetry_rows(ws, rows['LH_2']) is None
+
+
+def test_limb_missing_from_every_trial():
+    labels = [label for label in trial_labels([1, 2]) if not label.startswith('RH')]
+
+    groups = build_limb_groups(pd.Series(labels))
+    assert (groups.table[:, LIMBS.index('RH')] == -1).all()
+    assert len(groups.limb_rows('RH')) == 0
+
+    ws, _ = sheet2(labels)
+    summary_row = len(labels) + 4 + 2 + 1 + LIMBS.index('RH')
+    assert ws.cell(row=summary_row, column=1).value == 'RH'
+    assert all(ws.cell(row=summary_row, column=col).value is None for col in range(2, 6))
+    assert not any(isinstance(ws.cell(row=row, column=6).value, str) for row in range(2, len(labels) + 2))
+
+
+def test_duplicate_labels_start_a_new_session():
+    # Two sessions both numbered from 1
+    labels = trial_labels([1, 2]) + trial_labels([1, 2])
+
+    groups = build_limb_groups(pd.Series(labels))
+    np.testing.assert_array_equal(groups.table, expected_table(labels, [0] * 4 + [1] * 4 + [2] * 4 + [3] * 4))
+
+    ws, _ = sheet2(labels)
+    for first_row in (2, 6, 10, 14):
+        block = set(range(first_row, first_row + 4))
+        assert all(weight_bearing_rows(ws, row) == block for row in block)
+        assert asymmetry_rows(ws, first_row) == {first_row, first_row + 2}
+
+
+def test_unlabeled_rows():
+    labels = trial_labels([1]) + ['comment', 'static'] + trial_labels([2])
+
+    groups = build_limb_groups(pd.Series(labels))
+    np.testing.assert_array_equal(groups.table, [[0, 1, 2, 3], [6, 7, 8, 9]])
+    np.testing.assert_array_equal(groups.row_group, [0, 0, 0, 0, -1, -1, 1, 1, 1, 1])
+    np.testing.assert_array_equal(groups.row_limb, [0, 1, 2, 3, -1, -1, 0, 1, 2, 3])
+
+    ws, rows = sheet2(labels)
+    for label in ('comment', 'static'):
+        assert weight_bearing_rows(ws, rows[label]) is None
+        assert asymmetry_rows(ws, rows[label]) is None
+        assert ws.cell(row=rows[label], column=LIMB_KEY_COLUMN).value is None
+    assert weight_bearing_rows(ws, rows['LF_2']) == set(range(8, 12))
+    assert ws.cell(row=rows['RH_2'], column=LIMB_KEY_COLUMN).value == 'RH'
+
+
+def test_no_labels_groups_positionally():
+    labels = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h']
+
+    groups = build_limb_groups(pd.Series(labels))
+    np.testing.assert_array_equal(groups.table, [[0, 1, 2, 3], [4, 5, 6, 7]])
+
+    ws, _ = sheet2(labels)
+    assert weight_bearing_rows(ws, 6) == set(range(6, 10))
+    assert asymmetry_rows(ws, 2) == {2, 4}
+
+
+@pytest.mark.parametrize("label", ["LF1", " LF_1", "LF_1.dat"])
+def test_label_spellings(label):
+    groups = build_limb_groups(pd.Series([label]))
+    np.testing.assert_array_equal(groups.table, [[0, -1, -1, -1]])
@@ -0,0 +1,102 @@
+import io
+import re
+
+import numpy as np
+import pytest
+from openpyxl import load_workbook
+from openpyxl.worksheet.formula import ArrayFormula
+
+from excel_processor import process_excel_report, process_original_excel_data
+from gait_metrics import SUMMARY_COLUMNS, WEIGHT_BEARING_COLUMN, compute_gait_metrics
+from synthetic_data import make_files_dat, make_visits
+
+MANUAL_PATIENT_DATA = {'species': '', 'breed': '', 'color': '', 'purdue_id': '', 'primary_dvm': ''}
+STDEV_IF = re.compile(r'STDEV\(IF\((?P<condition>.*),(?P<column>[A-Z]+)\$2:[A-Z]+\$\d+\)\)')
+CONDITION = re.compile(r'\$?([A-Z]+)\$2:\$?[A-Z]+\$\d+(=|<>)"([^"]*)"')
+
+
+def stdev_if(ws, formula, column_values):
+    """
+    Evaluate the STDEV(IF(...)) part of a limb summary formula with Excel's array semantics.
+
+    Inside an array IF a blank value cell counts as 0; text and FALSE are ignored by STDEV.
+    column_values maps the formula columns (F, G) to the values Excel would compute.
+    """
+    match = STDEV_IF.search(formula)
+    conditions = CONDITION.findall(match.group('condition'))
+    values = []
+    for row in range(2, ws.max_row + 1):
+        def cell_value(column):
+            if column in column_values:
+                value = column_values[column][row - 2] if row - 2 < len(column_values[column]) else np.nan
+                formula_cell = ws[f"{column}{row}"].value
+                return None if formula_cell is None or np.isnan(value) else value
+            return ws[f"{column}{row}"].value
+
+        def compare(column, op, text):
+            value = cell_value(column)
+            value = "" if value is None else value
+            return value == text if op == "=" else value != text
+
+        if not all(compare(*condition) for condition in conditions):
+            continue
+        value = cell_value(match.group('column'))
+        if value is None:
+            values.append(0.0)
+        elif not isinstance(value, str):
+            values.append(float(value))
+    return np.std(values, ddof=1)
+
+
+@pytest.fixture(scope="module")
+def report():
+    # 41 trials: the last trial only has its LF row, so its weight bearing and asymmetry cells are blank
+    processed_df = process_original_excel_data(make_files_dat(41, extra_columns=2, seed=3))
+    metrics = compute_gait_metrics(processed_df)
+    excel_data = process_excel_report(processed_df, None, make_visits(), MANUAL_PATIENT_DATA,
+                                      preprocessed=True, limb_groups=metrics.limb_groups)
+    ws = load_workbook(io.BytesIO(excel_data))["Sheet2"]
+    column_values = {'F': metrics.weight_bearing, 'G': metrics.asymmetry_index}
+    return ws, metrics, column_values
+
+
+def summary_formulas(ws):
+    """(row, column letter, formula text) of every array formula below the data rows."""
+    return [(cell.row, cell.column_letter, cell.value.text) for row in ws.iter_rows() for cell in row
+            if isinstance(cell.value, ArrayFormula)]
+
+
+def test_incomplete_trial_leaves_blank_cells(report):
+    ws, metrics, _ = report
+    last_row = len(metrics.weight_bearing) + 1
+    assert ws[f"H{last_row}"].value == "LF"
+    assert ws[f"F{last_row}"].value is None
+    assert ws[f"G{last_row}"].value is None
+
+
+def test_limb_summary_sd_matches_gait_metrics(report):
+    ws, metrics, column_values = report
+    summary_columns = dict(zip("BCDF", SUMMARY_COLUMNS))
+    checked = 0
+    for row, column, formula in summary_formulas(ws):
+        limb = ws[f"A{row}"].value
+        if limb not in metrics.limb_summary:
+            continue
+        value_column = STDEV_IF.search(formula).group('column')
+        expected = metrics.limb_summary[limb][summary_columns[value_column]].std
+        assert stdev_if(ws, formula, column_values) == pytest.approx(expected), (limb, value_column)
+        checked += 1
+    assert checked == 16
+    assert metrics.limb_summary['LF'][WEIGHT_BEARING_COLUMN].count == 10
+
+
+def test_forelimb_hindlimb_sd_matches_gait_metrics(report):
+    ws, metrics, column_values = report
+    expected = {"Forelimb": metrics.forelimb_si.std, "Hindlimb": metrics.hindlimb_si.std}
+    checked = 0
+    for row, column, formula in summary_formulas(ws):
+        label = ws[f"A{row}"].value
+        if label in expected:
+            assert stdev_if(ws, formula, column_values) == pytest.approx(expected[label]), label
+            checked += 1
+    assert checked == 2
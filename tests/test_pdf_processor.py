@@ -0,0 +1,44 @@
+import base64
+import re
+import zlib
+
+import pytest
+
+import pdf_processor
+from excel_processor import process_original_excel_data
+from synthetic_data import make_files_dat
+
+
+def page_text(pdf_bytes):
+    """Strings drawn on the pages of a reportlab PDF, with the spaces dropped where lines wrap."""
+    text = b""
+    for stream in re.findall(rb'stream\r?\n(.*?)endstream', pdf_bytes, re.DOTALL):
+        stream = stream.strip()
+        if stream.endswith(b"~>"):
+            # reportlab wraps Flate in ASCII85 unless told otherwise
+            stream = base64.a85decode(stream[:-2])
+        try:
+            text += zlib.decompress(stream)
+        except zlib.error:
+            continue
+    return b"".join(re.findall(rb'\((.*?)\) Tj', text)).replace(b" ", b"")
+
+
+@pytest.fixture
+def no_error_pdf(monkeypatch):
+    """Make build_pdf_report raise instead of returning the fallback error PDF."""
+    def reraise(error, output=None):
+        raise error
+    monkeypatch.setattr(pdf_processor, "write_error_pdf", reraise)
+
+
+def test_markup_characters_in_file_name(no_error_pdf):
+    processed_df = process_original_excel_data(make_files_dat(8, extra_columns=0))
+    pdf = pdf_processor.build_pdf_report(processed_df, "a&b<c>.xlsx")
+    assert pdf.startswith(b"%PDF")
+    assert b"OriginalFile:a&b<c>.xlsx" in page_text(pdf)
+
+
+def test_error_pdf_escapes_the_message():
+    pdf = pdf_processor.write_error_pdf(ValueError("column <File comment> & more"))
+    assert b"column<Filecomment>&more" in page_text(pdf)
@@ -0,0 +1,110 @@
+import os
+import time
+from datetime import date
+
+import report_cache
+from report_cache import ReportCache, get_code_version, make_cache_key
+
+UPLOAD = b"raw export bytes"
+PATIENT = {'species': 'Canine', 'breed': 'Labrador', 'color': '', 'purdue_id': 'P1', 'primary_dvm': ''}
+
+
+def test_memory_tier_evicts_least_recently_used_entry():
+    cache = ReportCache(max_entries=2)
+    cache.put("a", b"1")
+    cache.put("b", b"2")
+    assert cache.get("a") == b"1"  # "b" is now the least recently used
+    cache.put("c", b"3")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1"
+    assert cache.get("c") == b"3"
+    assert cache.stats()['entries'] == 2
+
+
+def test_memory_tier_is_bounded_by_bytes():
+    cache = ReportCache(max_entries=10, max_memory_bytes=10)
+    cache.put("a", b"x" * 6)
+    cache.put("b", b"y" * 6)
+    assert cache.get("a") is None
+    assert cache.stats()['memory_bytes'] == 6
+    # Entries larger than the whole tier are not kept in memory at all
+    cache.put("huge", b"z" * 11)
+    assert cache.get("huge") is None
+    assert cache.get("b") == b"y" * 6
+
+
+def test_disk_tier_serves_entries_after_memory_eviction(tmp_path):
+    cache = ReportCache(max_entries=1, disk_dir=str(tmp_path))
+    cache.put("a", b"1")
+    cache.put("b", b"2")
+    assert cache.get("a") == b"1"
+    stats = cache.stats()
+    assert (stats['memory_hits'], stats['disk_hits'], stats['misses']) == (0, 1, 0)
+
+
+def test_disk_tier_drops_expired_entries(tmp_path):
+    cache = ReportCache(max_entries=1, disk_dir=str(tmp_path), ttl_seconds=60)
+    cache.put("old", b"1")
+    cache.clear()
+    old = time.time() - 120
+    os.utime(tmp_path / "old.bin", (old, old))
+    assert cache.get("old") is None
+    assert not (tmp_path / "old.bin").exists()
+
+
+def test_disk_tier_evicts_least_recently_used_files_over_size(tmp_path):
+    cache = ReportCache(max_entries=1, disk_dir=str(tmp_path), max_disk_bytes=10)
+    for age, key in ((30, "a"), (20, "b")):
+        cache.put(key, b"x" * 4)
+        stamp = time.time() - age
+        os.utime(tmp_path / f"{key}.bin", (stamp, stamp))
+    cache.put("c", b"x" * 4)
+    assert sorted(os.listdir(tmp_path)) == ["b.bin", "c.bin"]
+
+
+def test_get_or_build_builds_once():
+    cache = ReportCache()
+    calls = []
+    build = lambda: calls.append(1) or b"report"
+    assert cache.get_or_build("k", build) == b"report"
+    assert cache.get_or_build("k", build) == b"report"
+    assert len(calls) == 1
+
+
+def test_cache_key_depends_on_every_input():
+    base = make_cache_key(UPLOAD, PATIENT, "xlsxwriter", report_date=date(2025, 1, 1))
+    assert base == make_cache_key(UPLOAD, dict(reversed(list(PATIENT.items()))), "xlsxwriter",
+                                  report_date=date(2025, 1, 1))
+    variants = [
+        make_cache_key(UPLOAD + b"!", PATIENT, "xlsxwriter", report_date=date(2025, 1, 1)),
+        make_cache_key(UPLOAD, {**PATIENT, 'breed': 'Beagle'}, "xlsxwriter", report_date=date(2025, 1, 1)),
+        make_cache_key(UPLOAD, PATIENT, "openpyxl", report_date=date(2025, 1, 1)),
+        make_cache_key(UPLOAD, PATIENT, "xlsxwriter", report_date=date(2025, 1, 2)),
+        make_cache_key(UPLOAD, PATIENT, "xlsxwriter", report_date=date(2025, 1, 1), extra=[{'visit': 1}]),
+    ]
+    assert len({base, *variants}) == len(variants) + 1
+
+
+def test_app_pdf_key_ignores_patient_fields():
+    from app import report_cache_keys
+
+    excel_key, pdf_key, data_key = report_cache_keys(UPLOAD, "export.xlsx", PATIENT)
+    edited = report_cache_keys(UPLOAD, "export.xlsx", {**PATIENT, 'primary_dvm': 'Dr. Smith'})
+    assert edited[0] != excel_key
+    assert edited[1:] == (pdf_key, data_key)
+    # The PDF shows the file name
+    assert report_cache_keys(UPLOAD, "other.xlsx", PATIENT)[1] != pdf_key
+
+
+def test_cache_key_changes_with_code_version(tmp_path, monkeypatch):
+    module = tmp_path / "pipeline.py"
+    module.write_text("VERSION = 1\n")
+    monkeypatch.setattr(report_cache, "PIPELINE_MODULES", [str(module)])
+    monkeypatch.setattr(report_cache, "_code_version", None)
+    before_version = get_code_version()
+    before = make_cache_key(UPLOAD, PATIENT)
+
+    module.write_text("VERSION = 2\n")
+    monkeypatch.setattr(report_cache, "_code_version", None)
+    assert get_code_version() != before_version
+    assert make_cache_key(UPLOAD, PATIENT) != before
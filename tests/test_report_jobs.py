@@ -0,0 +1,32 @@
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from report_jobs import ReportJobPool
+
+
+@pytest.fixture
+def pool():
+    pool = ReportJobPool(max_workers=1, max_pending=4)
+    yield pool
+    pool.shutdown()
+
+
+def test_jobs_run_on_workers(pool):
+    assert pool.submit(sum, [1, 2, 3]).result(timeout=60) == 6
+
+
+def test_pool_recovers_from_killed_worker(pool):
+    assert pool.submit(sum, [1]).result(timeout=60) == 1
+    # The worker exits mid-job, as if it had been killed; the next job waits in the pool's queue
+    crashed = pool.submit(os._exit, 1)
+    queued = pool.submit(sum, [2, 3])
+
+    with pytest.raises(BrokenProcessPool):
+        crashed.result(timeout=60)
+    assert crashed.status == 'failed'
+    assert queued.result(timeout=60) == 5
+    assert pool.submit(sum, [4]).result(timeout=60) == 4
+    assert pool.stats()['pending'] == 0
+
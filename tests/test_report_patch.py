@@ -0,0 +1,63 @@
+import io
+import re
+import zipfile
+from xml.sax.saxutils import unescape
+
+import pytest
+from openpyxl import load_workbook
+from openpyxl.worksheet.formula import ArrayFormula
+
+from excel_processor import process_excel_report, process_original_excel_data
+from report_patch import patch_sheet1
+from synthetic_data import make_files_dat, make_visits
+
+PREVIOUS = {'species': 'Canine', 'breed': 'Old Breed', 'color': 'Brindle', 'purdue_id': 'P-OLD-1',
+            'primary_dvm': 'Dr. Previous'}
+CURRENT = {'species': 'Feline', 'breed': '<Siamese & co>', 'color': 'Black', 'purdue_id': 'P-NEW-2',
+           'primary_dvm': 'Dr. Current'}
+
+
+def cell_values(excel_data):
+    workbook = load_workbook(io.BytesIO(excel_data))
+    return {
+        ws.title: {cell.coordinate: cell.value.text if isinstance(cell.value, ArrayFormula) else cell.value
+                   for row in ws.iter_rows() for cell in row if cell.value is not None}
+        for ws in workbook.worksheets
+    }
+
+
+def shared_strings(excel_data):
+    """Texts of the shared string table in table order, None when the workbook has none."""
+    with zipfile.ZipFile(io.BytesIO(excel_data)) as package:
+        if 'xl/sharedStrings.xml' not in package.namelist():
+            return None
+        table = package.read('xl/sharedStrings.xml').decode('utf-8')
+    return [unescape(''.join(re.findall(r'<t\b[^>]*>(.*?)</t>', entry, re.DOTALL)))
+            for entry in re.findall(r'<si>.*?</si>|<si/>', table, re.DOTALL)]
+
+
+def package_text(excel_data):
+    with zipfile.ZipFile(io.BytesIO(excel_data)) as package:
+        return b''.join(package.read(name) for name in package.namelist() if name.endswith('.xml'))
+
+
+@pytest.mark.parametrize("backend", ["openpyxl", "xlsxwriter"])
+def test_patched_report_matches_fresh_build(backend):
+    processed_df = process_original_excel_data(make_files_dat(12, extra_columns=0))
+    visits_df = make_visits(1)
+    previous = process_excel_report(processed_df, None, visits_df, PREVIOUS, backend=backend, preprocessed=True)
+    fresh = process_excel_report(processed_df, None, visits_df, CURRENT, backend=backend, preprocessed=True)
+
+    patched = patch_sheet1(previous, visits_df, len(processed_df), PREVIOUS, CURRENT)
+
+    assert patched is not None
+    assert cell_values(patched) == cell_values(fresh)
+    patched_strings, fresh_strings = shared_strings(patched), shared_strings(fresh)
+    if fresh_strings is None:
+        assert patched_strings is None
+    else:
+        # Same table up to order: each string once, none left over from the previous report
+        assert len(patched_strings) == len(set(patched_strings))
+        assert sorted(patched_strings) == sorted(fresh_strings)
+    for value in ('Old Breed', 'Brindle', 'P-OLD-1', 'Dr. Previous'):
+        assert value.encode() not in package_text(patched)
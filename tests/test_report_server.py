@@ -0,0 +1,133 @@
+import io
+import json
+import os
+import signal
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pandas as pd
+import pytest
+
+from report_server import make_server
+from synthetic_data import make_files_dat, make_visits, write_raw_workbook
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = make_server(port=0, workers=1, max_pending=2, timeout=120)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.pool.warm_up()
+    yield server
+    server.shutdown()
+    server.server_close()
+    server.pool.shutdown()
+
+
+@pytest.fixture
+def settings(server):
+    """Restore the per-request settings a test changes."""
+    saved = server.report_timeout, server.max_upload_bytes
+    yield server
+    server.report_timeout, server.max_upload_bytes = saved
+
+
+def workbook_bytes(files_dat):
+    buffer = io.BytesIO()
+    write_raw_workbook(buffer, files_dat, make_visits())
+    return buffer.getvalue()
+
+
+@pytest.fixture(scope="module")
+def upload():
+    return workbook_bytes(make_files_dat(8, extra_columns=0))
+
+
+def request(server, path, body=None):
+    """(status, headers, body) of a request to the test server; POST when body is given."""
+    host, port = server.server_address[:2]
+    req = urllib.request.Request(f"http://{host}:{port}{path}", data=body)
+    try:
+        with urllib.request.urlopen(req, timeout=120) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def occupy_workers(server, seconds, count=1):
+    """Jobs that keep the pool's worker(s) busy, as a slow report would."""
+    return [server.pool.submit(time.sleep, seconds) for _ in range(count)]
+
+
+def test_report(server, upload):
+    status, headers, body = request(server, "/reports?filename=export.xlsx&species=Canine", upload)
+    assert status == 200
+    assert headers['Content-Disposition'] == 'attachment; filename="processed_export.xlsx"'
+    assert body.startswith(b'PK')
+
+
+def test_upload_too_large(settings, upload):
+    settings.max_upload_bytes = len(upload) - 1
+    status, _, body = request(settings, "/reports", upload)
+    assert status == 413
+    assert 'error' in json.loads(body)
+
+
+@pytest.mark.parametrize("content", [
+    workbook_bytes(pd.DataFrame({'a': [1, 2], 'b': [3, 4], 'c': [5, 6]})),
+    b"a,b,c\n1,2,3\n",
+], ids=["workbook", "csv"])
+def test_unprocessable_upload(server, content):
+    status, _, body = request(server, "/reports", content)
+    assert status == 422
+    assert json.loads(body)['error'].startswith("error processing file")
+    assert server.metrics.snapshot()['reports_failed'] >= 1
+
+
+def test_server_busy(server, upload):
+    jobs = occupy_workers(server, 2, count=server.pool.max_pending)
+    try:
+        status, headers, _ = request(server, "/reports", upload)
+        assert status == 503
+        assert headers['Retry-After'] == '30'
+    finally:
+        for job in jobs:
+            job.result(timeout=60)
+
+
+def test_report_timeout(settings, upload):
+    jobs = occupy_workers(settings, 2)
+    settings.report_timeout = 0.2
+    try:
+        status, _, body = request(settings, "/reports", upload)
+        assert status == 504
+        assert 'not ready' in json.loads(body)['error']
+    finally:
+        for job in jobs:
+            job.result(timeout=60)
+
+
+def test_health(server):
+    status, _, body = request(server, "/health")
+    health = json.loads(body)
+    assert status == 200
+    assert health['status'] == 'ok'
+    assert health['workers'] == 1 and health['max_pending'] == 2
+
+
+def test_report_after_worker_killed(server, upload):
+    assert request(server, "/reports", upload)[0] == 200
+    executor = server.pool._executor
+    for process in list(executor._processes.values()):
+        os.kill(process.pid, signal.SIGKILL)
+    # Wait until the executor has noticed, so the next request hits the broken pool
+    deadline = time.monotonic() + 30
+    while not executor._broken and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert executor._broken
+
+    status, _, body = request(server, "/reports", upload)
+    assert status == 200
+    assert body.startswith(b'PK')
@@ -0,0 +1,63 @@
+import pytest
+
+import batch_cli
+import excel_processor
+import report_jobs
+from excel_processor import process_original_excel_data
+from synthetic_data import make_files_dat, make_visits
+from visit_store import VisitStore, visit_identity
+
+MANUAL = {'species': 'Canine', 'breed': '', 'color': '', 'purdue_id': '', 'primary_dvm': ''}
+
+
+@pytest.fixture
+def export():
+    processed_df = process_original_excel_data(make_files_dat(8, extra_columns=0))
+    visits_df = make_visits(1)
+    return processed_df, visits_df, visit_identity(visits_df, MANUAL)
+
+
+def stored_visits(path, identity):
+    store = VisitStore(path)
+    try:
+        return store.previous_visits(identity['patient_id'], '9999-12-31')
+    finally:
+        store.close()
+
+
+def fail_build(*args, **kwargs):
+    raise ValueError("workbook could not be built")
+
+
+def build_with_report_jobs(export, store_path):
+    processed_df, visits_df, _ = export
+    report_jobs.generate_visit_report(processed_df, visits_df, "export.xlsx", MANUAL, visit_store_path=store_path)
+
+
+def build_with_batch_cli(export, store_path, tmp_path):
+    processed_df, visits_df, _ = export
+    paths = (str(tmp_path / "out.xlsx"), str(tmp_path / "out.pdf"))
+    batch_cli.write_reports(processed_df, visits_df, "export.xlsx", paths, manual_patient_data=MANUAL,
+                            visit_store_path=store_path)
+
+
+@pytest.mark.parametrize("build", ["report_jobs", "batch_cli"])
+def test_visit_recorded_after_build(export, tmp_path, build):
+    store_path = str(tmp_path / "visits.sqlite")
+    if build == "report_jobs":
+        build_with_report_jobs(export, store_path)
+    else:
+        build_with_batch_cli(export, store_path, tmp_path)
+    assert len(stored_visits(store_path, export[2])) == 1
+
+
+@pytest.mark.parametrize("build", ["report_jobs", "batch_cli"])
+def test_failed_build_not_recorded(export, tmp_path, monkeypatch, build):
+    monkeypatch.setattr(excel_processor, "process_excel_report", fail_build)
+    store_path = str(tmp_path / "visits.sqlite")
+    with pytest.raises(ValueError):
+        if build == "report_jobs":
+            build_with_report_jobs(export, store_path)
+        else:
+            build_with_batch_cli(export, store_path, tmp_path)
+    assert stored_visits(store_path, export[2]) == []
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from limb_groups import LIMBS
+from visit_split import _visit_row, assign_visits, split_by_visit, visit_label
+
+
+def session_labels(num_trials):
+    """One visit's labels, trials numbered from 1."""
+    return [f"{limb}_{trial}" for trial in range(1, num_trials + 1) for limb in LIMBS]
+
+
+def processed_frame(labels):
+    return pd.DataFrame({'Data Source': labels, 'Maximum force [%BW]': np.arange(len(labels), dtype=float)})
+
+
+def visits_frame(num_visits):
+    return pd.DataFrame({
+        'ID': [f"MR{100 + i}" for i in range(num_visits)],
+        'Date of visit': pd.Timestamp("2025-08-21") + pd.to_timedelta(np.arange(num_visits) * 30, unit="D"),
+        'Body mass [kg]': [18.0, 32.5, np.nan][:num_visits],
+    })
+
+
+def test_assign_visits_restarts_at_repeated_labels():
+    labels = session_labels(2) + session_labels(3)
+    np.testing.assert_array_equal(assign_visits(pd.Series(labels)), [0] * 8 + [1] * 12)
+
+
+def test_assign_visits_keeps_unlabeled_rows_with_the_row_before():
+    labels = ['Trial 1'] + session_labels(1) + ['Trial 1', 'comment'] + session_labels(1)
+    np.testing.assert_array_equal(assign_visits(pd.Series(labels)), [0] * 7 + [1] * 4)
+
+
+def test_split_by_visit_exact_match():
+    processed_df = processed_frame(session_labels(2) + session_labels(1))
+    visits_df = visits_frame(2)
+
+    parts = split_by_visit(processed_df, visits_df)
+
+    assert [part['label'] for part in parts] == ['visit1_MR100_2025-08-21', 'visit2_MR101_2025-09-20']
+    pd.testing.assert_frame_equal(parts[0]['processed_df'], processed_df.iloc[:8].reset_index(drop=True))
+    pd.testing.assert_frame_equal(parts[1]['processed_df'], processed_df.iloc[8:].reset_index(drop=True))
+    assert [part['visits_df']['ID'].tolist() for part in parts] == [['MR100'], ['MR101']]
+
+
+def test_split_by_visit_with_unlabeled_rows():
+    labels = session_labels(1) + ['static'] + session_labels(1)
+    parts = split_by_visit(processed_frame(labels), visits_frame(2))
+    assert [part['processed_df']['Data Source'].tolist() for part in parts] == [
+        session_labels(1) + ['static'], session_labels(1)]
+
+
+def test_split_by_visit_single_visit_keeps_the_frame():
+    processed_df = processed_frame(session_labels(2) + session_labels(2))
+    parts = split_by_visit(processed_df, visits_frame(1))
+    assert len(parts) == 1
+    assert parts[0]['processed_df'] is processed_df
+
+
+@pytest.mark.parametrize("num_visits", [0, 3])
+def test_split_by_visit_count_mismatch(num_visits):
+    processed_df = processed_frame(session_labels(2) + session_labels(2))
+    with pytest.raises(ValueError):
+        split_by_visit(processed_df, visits_frame(num_visits))
+
+
+def test_visit_row_converts_whole_floats_to_int64():
+    visits_df = visits_frame(3)
+
+    whole, fraction, missing = (_visit_row(visits_df, index) for index in range(3))
+
+    assert whole['Body mass [kg]'].dtype == np.int64
+    assert whole.at[0, 'Body mass [kg]'] == 18
+    assert fraction['Body mass [kg]'].dtype == np.float64
+    assert fraction.at[0, 'Body mass [kg]'] == 32.5
+    assert missing['Body mass [kg]'].dtype == np.float64
+    assert list(missing.index) == [0]
+    assert whole['ID'].tolist() == ['MR100']
+
+
+def test_visit_label_is_filename_safe():
+    row = pd.Series({'ID': 'MR 1/2', 'Date of visit': pd.NaT})
+    assert visit_label(row, 4) == 'visit5_MR_1_2'
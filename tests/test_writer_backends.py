@@ -0,0 +1,45 @@
+import io
+
+import pytest
+from openpyxl import load_workbook
+from openpyxl.worksheet.formula import ArrayFormula
+
+from excel_processor import TREND_SHEET, process_excel_report, process_original_excel_data
+from gait_metrics import compute_gait_metrics
+from synthetic_data import make_files_dat, make_visits
+from visit_store import visit_identity, visit_summary
+
+MANUAL_PATIENT_DATA = {'species': '', 'breed': '', 'color': '', 'purdue_id': '', 'primary_dvm': ''}
+
+
+@pytest.fixture(scope="module")
+def trend_report_inputs():
+    processed_df = process_original_excel_data(make_files_dat(16, extra_columns=2, seed=4))
+    visits_df = make_visits()
+    metrics = compute_gait_metrics(processed_df)
+    current = visit_summary(visit_identity(visits_df, MANUAL_PATIENT_DATA), metrics)
+    earlier = {**current, 'visit_date': "2025-06-01"}
+    return processed_df, visits_df, [earlier, current]
+
+
+def sheet_contents(workbook, title):
+    ws = workbook[title]
+    values = {cell.coordinate: cell.value.text if isinstance(cell.value, ArrayFormula) else cell.value
+              for row in ws.iter_rows() for cell in row if cell.value is not None}
+    return values, sorted(str(merged) for merged in ws.merged_cells.ranges)
+
+
+def test_xlsxwriter_path_target_keeps_row_spanning_merges(trend_report_inputs, tmp_path):
+    processed_df, visits_df, trend_visits = trend_report_inputs
+    reference = process_excel_report(processed_df, None, visits_df, MANUAL_PATIENT_DATA,
+                                     preprocessed=True, trend_visits=trend_visits)
+    path = tmp_path / "report.xlsx"
+    # A path target is written with xlsxwriter's constant_memory mode where possible
+    process_excel_report(processed_df, str(path), visits_df, MANUAL_PATIENT_DATA, backend="xlsxwriter",
+                         preprocessed=True, trend_visits=trend_visits)
+
+    expected = load_workbook(io.BytesIO(reference))
+    written = load_workbook(path)
+    for title in ("Sheet1", "Sheet2", TREND_SHEET):
+        assert sheet_contents(written, title) == sheet_contents(expected, title), title
+    assert written[TREND_SHEET]["B3"].value == expected[TREND_SHEET]["B3"].value is not None
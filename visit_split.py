@@ -0,0 +1,100 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from limb_groups import LABEL_PATTERN
+
+
+def assign_visits(data_source):
+    """
+    Visit index of every processed row, from the limb/trial labels in file order.
+
+    FILES_DAT has no column linking a trial to its visit, but every visit numbers
+    its trials from 1 again. A new visit therefore starts at the first label that
+    already occurred in the current visit. Rows without a limb label stay with the
+    visit of the row before them.
+
+    Args:
+        data_source: The "Data Source" column of the processed DataFrame
+
+    Returns:
+        numpy array of 0-based visit indices, one per row
+    """
+    parts = pd.Series(data_source, dtype=object).astype(str).str.extract(LABEL_PATTERN)
+    visits = np.zeros(len(parts), dtype=np.int64)
+    visit = 0
+    seen = set()
+    for row, (limb, trial) in enumerate(zip(parts[0].tolist(), parts[1].tolist())):
+        if isinstance(limb, str):
+            key = (limb, int(trial))
+            if key in seen:
+                visit += 1
+                seen = set()
+            seen.add(key)
+        visits[row] = visit
+    return visits
+
+
+def visit_label(visit_row, index):
+    """Filename-safe label of one VISITS row, e.g. "visit2_MR100001_2025-09-20"."""
+    parts = [f"visit{index + 1}"]
+    patient_id = visit_row.get('ID')
+    if pd.notna(patient_id) and str(patient_id).strip():
+        parts.append(str(patient_id).strip())
+    visit_date = pd.to_datetime(visit_row.get('Date of visit'), errors='coerce')
+    if pd.notna(visit_date):
+        parts.append(visit_date.date().isoformat())
+    return re.sub(r'[^\w.-]+', '_', "_".join(parts))
+
+
+def split_by_visit(processed_df, visits_df):
+    """
+    Split a multi-visit export into one part per VISITS row.
+
+    The trials are split with assign_visits and paired with the VISITS rows in order,
+    so the n-th visit in FILES_DAT gets the n-th VISITS row.
+
+    Args:
+        processed_df: DataFrame from process_original_excel_data
+        visits_df: DataFrame with patient data from VISITS sheet
+
+    Returns:
+        List of dictionaries with label, processed_df and visits_df (a single row) per visit
+
+    Raises:
+        ValueError: the number of visits in FILES_DAT does not match the VISITS rows
+    """
+    if visits_df is None or visits_df.empty:
+        raise ValueError("The VISITS sheet has no rows to split the export by")
+    visits_df = visits_df.reset_index(drop=True)
+    if len(visits_df) == 1:
+        return [{'label': visit_label(visits_df.iloc[0], 0), 'processed_df': processed_df, 'visits_df': visits_df}]
+
+    row_visits = assign_visits(processed_df["Data Source"])
+    num_visits = int(row_visits.max()) + 1 if len(row_visits) else 0
+    if num_visits != len(visits_df):
+        raise ValueError(f"FILES_DAT holds {num_visits} visit(s) (trial numbers restarting at 1) "
+                         f"but VISITS has {len(visits_df)} rows, so the trials cannot be matched to the visits")
+
+    return [{
+        'label': visit_label(visits_df.iloc[index], index),
+        'processed_df': processed_df[row_visits == index].reset_index(drop=True),
+        'visits_df': _visit_row(visits_df, index),
+    } for index in range(num_visits)]
+
+
+def _visit_row(visits_df, index):
+    """
+    One VISITS row as it would be read from a single-visit export.
+
+    The readers give a column of whole numbers mixed with fractions (e.g. body
+    masses 18 and 32.5) the float dtype; read on its own, 18 would be an integer
+    and Sheet1 would show "18 kg" rather than "18.0 kg".
+    """
+    row = visits_df.iloc[[index]].reset_index(drop=True)
+    for column in row.columns:
+        value = row.at[0, column]
+        if pd.api.types.is_float_dtype(row[column]) and pd.notna(value) and float(value).is_integer():
+            row[column] = row[column].astype(np.int64)
+    return row
@@ -0,0 +1,240 @@
+import math
+import os
+import sqlite3
+import threading
+
+import pandas as pd
+
+from gait_metrics import (LIMBS, MAX_FORCE_COLUMN, IMPULSE_COLUMN, CONTACT_TIME_COLUMN,
+                          WEIGHT_BEARING_COLUMN)
+
+# Default database, next to the app unless PPAR_VISIT_STORE points elsewhere
+DEFAULT_STORE_PATH = os.environ.get(
+    "PPAR_VISIT_STORE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "visit_store.sqlite"))
+
+# Summary column -> field name used in the database and in visit summaries
+METRIC_FIELDS = {
+    MAX_FORCE_COLUMN: "max_force",
+    IMPULSE_COLUMN: "impulse",
+    CONTACT_TIME_COLUMN: "contact_time",
+    WEIGHT_BEARING_COLUMN: "weight_bearing",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS visits (
+    id INTEGER PRIMARY KEY,
+    patient_id TEXT NOT NULL,
+    visit_date TEXT NOT NULL,
+    purdue_id TEXT,
+    patient_name TEXT,
+    body_mass REAL,
+    forelimb_si_mean REAL,
+    forelimb_si_sd REAL,
+    hindlimb_si_mean REAL,
+    hindlimb_si_sd REAL,
+    source_file TEXT,
+    recorded_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (patient_id, visit_date)
+);
+CREATE INDEX IF NOT EXISTS idx_visits_purdue_id ON visits (purdue_id, visit_date);
+CREATE TABLE IF NOT EXISTS limb_metrics (
+    visit_id INTEGER NOT NULL REFERENCES visits (id) ON DELETE CASCADE,
+    limb TEXT NOT NULL,
+    trials INTEGER,
+    max_force_mean REAL,
+    max_force_sd REAL,
+    impulse_mean REAL,
+    impulse_sd REAL,
+    contact_time_mean REAL,
+    contact_time_sd REAL,
+    weight_bearing_mean REAL,
+    weight_bearing_sd REAL,
+    PRIMARY KEY (visit_id, limb)
+);
+"""
+
+
+def visit_identity(visits_df, manual_patient_data=None):
+    """
+    Identify the visit in a raw export for the store.
+
+    The patient is the VISITS "ID" (MR-ID), or the manual Purdue ID when the export has none.
+
+    Args:
+        visits_df: DataFrame with patient data from VISITS sheet
+        manual_patient_data: Dictionary with manual patient data (optional)
+
+    Returns:
+        Dictionary with patient_id, visit_date (ISO), purdue_id, patient_name and body_mass,
+        or None when the patient or visit date is unknown
+    """
+    purdue_id = (manual_patient_data or {}).get('purdue_id', '').strip()
+    if visits_df is None or visits_df.empty:
+        return None
+    patient_data = visits_df.iloc[0]
+
+    patient_id = patient_data.get('ID', '')
+    patient_id = str(patient_id).strip() if pd.notna(patient_id) else ''
+    patient_id = patient_id or purdue_id
+    visit_date = pd.to_datetime(patient_data.get('Date of visit'), errors='coerce')
+    if not patient_id or pd.isna(visit_date):
+        return None
+
+    name = f"{patient_data.get('First name', '')} {patient_data.get('Last name', '')}".strip()
+    body_mass = pd.to_numeric(patient_data.get('Body mass [kg]'), errors='coerce')
+    return {
+        'patient_id': patient_id,
+        'visit_date': visit_date.date().isoformat(),
+        'purdue_id': purdue_id,
+        'patient_name': name,
+        'body_mass': None if pd.isna(body_mass) else float(body_mass),
+    }
+
+
+def visit_summary(identity, metrics):
+    """
+    Combine a visit identity with its GaitMetrics into the dictionary the store and trend sheet use.
+
+    Returns:
+        Dictionary with the identity fields, forelimb_si / hindlimb_si means and
+        limbs: {limb: {field: mean}} for every METRIC_FIELDS field
+    """
+    return {
+        **identity,
+        'forelimb_si': _number(metrics.forelimb_si.mean),
+        'hindlimb_si': _number(metrics.hindlimb_si.mean),
+        'limbs': {
+            limb: {field: _number(metrics.limb_summary[limb][col].mean) for col, field in METRIC_FIELDS.items()}
+            for limb in LIMBS
+        },
+    }
+
+
+class VisitStore:
+    """
+    SQLite store of per-visit gait metrics, indexed by patient ID and visit date.
+
+    One visit is kept per (patient_id, visit_date); recording it again replaces it.
+    Connections are opened per thread, so one store can be shared by Streamlit sessions.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH, timeout=30):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA foreign_keys = ON")
+            # WAL lets report requests read trends while another one records a visit
+            conn.execute("PRAGMA journal_mode = WAL")
+            self._local.conn = conn
+        return conn
+
+    def record_visit(self, identity, metrics, source_file=''):
+        """
+        Save one visit's limb summaries and symmetry indices.
+
+        Args:
+            identity: Dictionary returned by visit_identity
+            metrics: GaitMetrics of the visit's processed trials
+            source_file: Name of the raw export (optional)
+
+        Returns:
+            Row id of the visit
+        """
+        conn = self._connection()
+        with conn:
+            visit_id = conn.execute("""
+                INSERT INTO visits (patient_id, visit_date, purdue_id, patient_name, body_mass,
+                                    forelimb_si_mean, forelimb_si_sd, hindlimb_si_mean, hindlimb_si_sd, source_file)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (patient_id, visit_date) DO UPDATE SET
+                    purdue_id = excluded.purdue_id,
+                    patient_name = excluded.patient_name,
+                    body_mass = excluded.body_mass,
+                    forelimb_si_mean = excluded.forelimb_si_mean,
+                    forelimb_si_sd = excluded.forelimb_si_sd,
+                    hindlimb_si_mean = excluded.hindlimb_si_mean,
+                    hindlimb_si_sd = excluded.hindlimb_si_sd,
+                    source_file = excluded.source_file,
+                    recorded_at = CURRENT_TIMESTAMP
+                RETURNING id
+            """, (
+                identity['patient_id'], identity['visit_date'], identity.get('purdue_id'),
+                identity.get('patient_name'), identity.get('body_mass'),
+                _number(metrics.forelimb_si.mean), _number(metrics.forelimb_si.std),
+                _number(metrics.hindlimb_si.mean), _number(metrics.hindlimb_si.std), source_file,
+            )).fetchone()[0]
+
+            rows = []
+            for limb in LIMBS:
+                summaries = metrics.limb_summary[limb]
+                row = [visit_id, limb, summaries[MAX_FORCE_COLUMN].count]
+                for col in METRIC_FIELDS:
+                    row += [_number(summaries[col].mean), _number(summaries[col].std)]
+                rows.append(row)
+            conn.execute("DELETE FROM limb_metrics WHERE visit_id = ?", (visit_id,))
+            conn.executemany(f"INSERT INTO limb_metrics VALUES ({', '.join('?' * len(rows[0]))})", rows)
+        return visit_id
+
+    def previous_visits(self, patient_id, before_date, limit=20):
+        """
+        The patient's visits before a date, oldest first, as visit_summary dictionaries.
+
+        Both queries are answered from the (patient_id, visit_date) and
+        (visit_id, limb) indexes, no matter how many visits are stored.
+
+        Args:
+            patient_id: Patient identifier from visit_identity
+            before_date: ISO date; only earlier visits are returned
+            limit: Maximum number of (most recent) visits
+        """
+        conn = self._connection()
+        visits = conn.execute("""
+            SELECT * FROM visits
+            WHERE patient_id = ? AND visit_date < ?
+            ORDER BY visit_date DESC
+            LIMIT ?
+        """, (patient_id, before_date, limit)).fetchall()
+        if not visits:
+            return []
+
+        visit_ids = [visit['id'] for visit in visits]
+        limbs = {}
+        for row in conn.execute(f"SELECT * FROM limb_metrics WHERE visit_id IN ({', '.join('?' * len(visit_ids))})",
+                                visit_ids):
+            limbs.setdefault(row['visit_id'], {})[row['limb']] = {
+                field: row[f"{field}_mean"] for field in METRIC_FIELDS.values()
+            }
+
+        return [{
+            'patient_id': visit['patient_id'],
+            'visit_date': visit['visit_date'],
+            'purdue_id': visit['purdue_id'],
+            'patient_name': visit['patient_name'],
+            'body_mass': visit['body_mass'],
+            'forelimb_si': visit['forelimb_si_mean'],
+            'hindlimb_si': visit['hindlimb_si_mean'],
+            'limbs': limbs.get(visit['id'], {}),
+        } for visit in reversed(visits)]
+
+    def close(self):
+        """Close this thread's connection."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def _number(value):
+    """Plain float for SQLite/JSON, None for NaN."""
+    value = float(value)
+    return None if math.isnan(value) else value
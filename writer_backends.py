@@ -0,0 +1,333 @@
+import os
+
+from openpyxl import Workbook
+from openpyxl.styles import Font, Alignment, PatternFill
+from openpyxl.utils import column_index_from_string
+from openpyxl.utils.cell import range_boundaries, coordinate_from_string
+from openpyxl.worksheet.formula import ArrayFormula
+
+from pipeline_stats import NULL_STATS
+
+# Default (empty) styles for recorded cells that were never formatted
+DEFAULT_FONT = Font()
+DEFAULT_ALIGNMENT = Alignment()
+DEFAULT_FILL = PatternFill()
+
+# xlsxwriter adds 5 pixels of padding to every column width it writes;
+# subtracting it up front keeps the stored widths identical to openpyxl's
+XLSXWRITER_WIDTH_PADDING = 5 / 7
+
+# Worksheets of a report, in workbook order
+REPORT_SHEETS = ("Sheet1", "Sheet2")
+
+
+def save_with_openpyxl(excel_filename, build_sheets, stats=NULL_STATS, sheet_names=REPORT_SHEETS):
+    """
+    Build the report on an in-memory openpyxl Workbook and save it.
+
+    Args:
+        excel_filename: Output Excel filename or writable binary file object
+        build_sheets: Callable taking one worksheet per sheet name (ws1, ws2, ...) that fills them
+        stats: PipelineStats that collects per-stage timings (optional)
+        sheet_names: Worksheet titles in workbook order
+    """
+    wb = Workbook()
+    worksheets = [wb.active] + [wb.create_sheet(name) for name in sheet_names[1:]]
+    worksheets[0].title = sheet_names[0]
+    build_sheets(*worksheets)
+    with stats.stage('save'):
+        wb.save(excel_filename)
+
+
+def save_with_xlsxwriter(excel_filename, build_sheets, stats=NULL_STATS, sheet_names=REPORT_SHEETS):
+    """
+    Build the report on recording worksheets and write it out with xlsxwriter.
+
+    The sheet builders run unchanged against SheetRecorder objects; the recorded
+    cells are then written row by row with one shared xlsxwriter format per
+    distinct style. This is faster than saving an openpyxl Workbook, but not a
+    low-memory path: every sheet is recorded in full before it is written, so
+    peak memory grows with the number of cells either way. File paths are
+    written in constant_memory mode, which only saves xlsxwriter's own copy of
+    the cells; file objects are assembled in memory.
+
+    Args:
+        excel_filename: Output Excel filename or writable binary file object
+        build_sheets: Callable taking one worksheet per sheet name (ws1, ws2, ...) that fills them
+        stats: PipelineStats that collects per-stage timings (optional)
+        sheet_names: Worksheet titles in workbook order
+    """
+    recorders = [SheetRecorder(name) for name in sheet_names]
+    build_sheets(*recorders)
+
+    with stats.stage('save'):
+        _write_xlsxwriter_workbook(excel_filename, recorders)
+
+
+def _write_xlsxwriter_workbook(excel_filename, recorders):
+    import xlsxwriter
+
+    to_path = isinstance(excel_filename, (str, os.PathLike))
+    # constant_memory flushes a row as soon as a later row is written, and merge_range writes the
+    # blanks below a merge's first row straight away: the rest of that first row would be lost
+    constant_memory = to_path and not any(recorder.has_row_spanning_merges() for recorder in recorders)
+    workbook = xlsxwriter.Workbook(excel_filename, {
+        'constant_memory': constant_memory,
+        'in_memory': not to_path,
+        'strings_to_urls': False,
+        'nan_inf_to_errors': True,
+    })
+    try:
+        formats = {}
+        for recorder in recorders:
+            recorder.write_to_xlsxwriter(workbook, formats)
+    finally:
+        workbook.close()
+
+
+WRITER_BACKENDS = {
+    'openpyxl': save_with_openpyxl,
+    'xlsxwriter': save_with_xlsxwriter,
+}
+
+
+def get_writer_backend(name):
+    """Return the save function registered for a writer backend name."""
+    try:
+        return WRITER_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown writer backend '{name}', expected one of {sorted(WRITER_BACKENDS)}")
+
+
+class RecordedCell:
+    """Value and styles written to one cell of a SheetRecorder."""
+
+    __slots__ = ('value', 'font', 'alignment', 'fill', 'data_type')
+
+    def __init__(self, value=None, font=DEFAULT_FONT, alignment=DEFAULT_ALIGNMENT, fill=DEFAULT_FILL):
+        self.value = value
+        self.font = font
+        self.alignment = alignment
+        self.fill = fill
+        self.data_type = None
+
+
+class _Dimension:
+    """Stand-in for openpyxl row/column dimensions, only width, height and hidden are kept."""
+
+    def __init__(self):
+        self.width = None
+        self.height = None
+        self.hidden = False
+
+
+class _Dimensions(dict):
+    def __missing__(self, key):
+        dimension = self[key] = _Dimension()
+        return dimension
+
+
+class SheetRecorder:
+    """
+    Worksheet stand-in that records what the sheet builders write.
+
+    It supports the subset of the openpyxl Worksheet API used in excel_processor
+    (cell, merge_cells, add_image, row/column dimensions, single-cell ArrayFormula
+    values) plus write_block for bulk DataFrame writes, so the same layout code
+    can target any backend.
+    """
+
+    def __init__(self, title):
+        self.title = title
+        self.cells = {}
+        self.blocks = []
+        self.merged_ranges = []
+        self.images = []
+        self.column_dimensions = _Dimensions()
+        self.row_dimensions = _Dimensions()
+
+    def cell(self, row, column, value=None):
+        key = (row, column)
+        recorded = self.cells.get(key)
+        if recorded is None:
+            recorded = self.cells[key] = self._cell_from_block(row, column)
+        if value is not None:
+            recorded.value = value
+        return recorded
+
+    def _cell_from_block(self, row, column):
+        for start_row, start_col, columns, alignment in self.blocks:
+            row_offset = row - start_row
+            col_offset = column - start_col
+            if 0 <= row_offset < len(columns[0]) and 0 <= col_offset < len(columns):
+                return RecordedCell(columns[col_offset][row_offset], alignment=alignment)
+        return RecordedCell()
+
+    def write_block(self, start_row, start_col, df, alignment=DEFAULT_ALIGNMENT):
+        """Record a whole DataFrame as a block of values sharing one alignment."""
+        if len(df) == 0:
+            return
+        columns = [df[col].tolist() for col in df.columns]
+        self.blocks.append((start_row, start_col, columns, alignment))
+
+    def merge_cells(self, range_string):
+        self.merged_ranges.append(range_string)
+
+    def add_image(self, img, anchor):
+        self.images.append((img, anchor))
+
+    def has_row_spanning_merges(self):
+        """True when a merged range covers more than one row (e.g. the Trends sheet headers)."""
+        for range_string in self.merged_ranges:
+            _, min_row, _, max_row = range_boundaries(range_string)
+            if max_row > min_row:
+                return True
+        return False
+
+    def iter_rows(self):
+        """
+        Yield (row, {column: RecordedCell or (value, alignment)}) in ascending row order.
+
+        Block values are looked up when their row is reached instead of being copied
+        into one dictionary for the whole sheet first.
+        """
+        cell_rows = {}
+        for (row, column), recorded in self.cells.items():
+            cell_rows.setdefault(row, {})[column] = recorded
+        rows = set(cell_rows)
+        for start_row, _, columns, _ in self.blocks:
+            rows.update(range(start_row, start_row + len(columns[0])))
+
+        for row in sorted(rows):
+            row_cells = {}
+            for start_row, start_col, columns, alignment in self.blocks:
+                row_offset = row - start_row
+                if 0 <= row_offset < len(columns[0]):
+                    for col_offset, values in enumerate(columns):
+                        row_cells[start_col + col_offset] = (values[row_offset], alignment)
+            # Cells written explicitly take precedence over the block values they were created from
+            row_cells.update(cell_rows.get(row, ()))
+            yield row, row_cells
+
+    def write_to_xlsxwriter(self, workbook, formats):
+        """Write the recorded sheet into a new xlsxwriter worksheet in row order."""
+        worksheet = workbook.add_worksheet(self.title)
+
+        for letter, dimension in self.column_dimensions.items():
+            if dimension.width is not None or dimension.hidden:
+                col = column_index_from_string(letter) - 1
+                width = None if dimension.width is None else max(dimension.width - XLSXWRITER_WIDTH_PADDING, 0)
+                worksheet.set_column(col, col, width, None, {'hidden': True} if dimension.hidden else {})
+
+        merges = {}
+        for range_string in self.merged_ranges:
+            min_col, min_row, max_col, max_row = range_boundaries(range_string)
+            merges[(min_row, min_col)] = (max_row, max_col)
+            # Make sure every merged range is reached by the row-ordered pass below
+            self.cell(row=min_row, column=min_col)
+
+        for img, anchor in self.images:
+            _insert_image(worksheet, img, anchor)
+
+        for row, row_cells in self.iter_rows():
+            dimension = self.row_dimensions.get(row)
+            if dimension is not None and dimension.height is not None:
+                worksheet.set_row(row - 1, dimension.height)
+
+            run_start, run_values, run_format = None, [], None
+            for column in sorted(row_cells):
+                value, cell_format = _value_and_format(row_cells[column], workbook, formats)
+                if (row, column) in merges:
+                    max_row, max_col = merges[(row, column)]
+                    worksheet.merge_range(row - 1, column - 1, max_row - 1, max_col - 1,
+                                          _to_native(value), cell_format)
+                    continue
+                if isinstance(value, ArrayFormula):
+                    _write_run(worksheet, row, run_start, run_values, run_format)
+                    run_start, run_values, run_format = None, [], None
+                    worksheet.write_array_formula(row - 1, column - 1, row - 1, column - 1, value.text, cell_format)
+                    continue
+                if run_values and column == run_start + len(run_values) and cell_format is run_format:
+                    run_values.append(value)
+                    continue
+                _write_run(worksheet, row, run_start, run_values, run_format)
+                run_start, run_values, run_format = column, [value], cell_format
+            _write_run(worksheet, row, run_start, run_values, run_format)
+        return worksheet
+
+
+def _write_run(worksheet, row, start_col, values, cell_format):
+    if not values:
+        return
+    values = [_to_native(value) for value in values]
+    if len(values) == 1:
+        worksheet.write(row - 1, start_col - 1, values[0], cell_format)
+    else:
+        worksheet.write_row(row - 1, start_col - 1, values, cell_format)
+
+
+def _to_native(value):
+    """Convert numpy scalars to plain Python values and None to an empty string."""
+    if value is None:
+        return ""
+    if hasattr(value, 'item') and not isinstance(value, (str, bytes)):
+        return value.item()
+    return value
+
+
+def _value_and_format(recorded, workbook, formats):
+    """Return the cell value and the shared xlsxwriter format for a recorded cell."""
+    if isinstance(recorded, tuple):
+        value, alignment = recorded
+        font, fill = DEFAULT_FONT, DEFAULT_FILL
+    else:
+        value, font, alignment, fill = recorded.value, recorded.font, recorded.alignment, recorded.fill
+
+    # Key on the translated properties rather than the openpyxl objects, whose hashing is slow
+    properties = _format_properties(font, alignment, fill)
+    key = tuple(properties.items())
+    if key not in formats:
+        formats[key] = workbook.add_format(properties) if properties else None
+    return value, formats[key]
+
+
+def _format_properties(font, alignment, fill):
+    """Translate openpyxl Font/Alignment/PatternFill objects into xlsxwriter format properties."""
+    properties = {}
+    if font.b:
+        properties['bold'] = True
+    if font.i:
+        properties['italic'] = True
+    if font.u == 'single':
+        properties['underline'] = 1
+    elif font.u == 'double':
+        properties['underline'] = 2
+    if font.sz:
+        properties['font_size'] = font.sz
+    if font.name:
+        properties['font_name'] = font.name
+    if alignment.horizontal:
+        properties['align'] = alignment.horizontal
+    if alignment.vertical:
+        properties['valign'] = 'vcenter' if alignment.vertical == 'center' else alignment.vertical
+    if fill.fill_type == 'solid':
+        properties['pattern'] = 1
+        properties['fg_color'] = '#' + fill.start_color.rgb[-6:]
+    return properties
+
+
+def _insert_image(worksheet, img, anchor):
+    """Insert an openpyxl Image into an xlsxwriter worksheet at its display size."""
+    import io
+    from PIL import Image as PILImage
+
+    data = img._data()
+    with PILImage.open(io.BytesIO(data)) as pil_image:
+        native_width, native_height = pil_image.size
+    col_letter, row = coordinate_from_string(anchor)
+    worksheet.insert_image(row - 1, column_index_from_string(col_letter) - 1, f"image.{img.format}", {
+        'image_data': io.BytesIO(data),
+        'x_scale': img.width / native_width,
+        'y_scale': img.height / native_height,
+        'object_position': 2,
+    })
@@ -0,0 +1,30 @@
+import posixpath
+import re
+from xml.sax.saxutils import escape
+
+
+def sheet_part(package, title):
+    """Zip path of the worksheet called title, resolved through workbook.xml and its relationships."""
+    workbook = package.read('xl/workbook.xml').decode('utf-8')
+    match = re.search(r'<sheet\b[^>]*\bname="%s"[^>]*/?>' % re.escape(escape(title, {'"': '&quot;'})), workbook)
+    if match is None:
+        raise KeyError(f"no sheet named {title}")
+    return _relationship_target(package, match.group(0))
+
+
+def sheet_parts(package):
+    """Zip paths of all worksheets, in workbook order."""
+    workbook = package.read('xl/workbook.xml').decode('utf-8')
+    return [_relationship_target(package, match.group(0)) for match in re.finditer(r'<sheet\b[^>]*/?>', workbook)]
+
+
+def _relationship_target(package, sheet_element):
+    """Zip path that the r:id of a workbook.xml <sheet> element points to."""
+    rel_id = re.search(r'\br:id="([^"]+)"', sheet_element).group(1)
+    rels = package.read('xl/_rels/workbook.xml.rels').decode('utf-8')
+    for relationship in re.finditer(r'<Relationship\b[^>]*/?>', rels):
+        if re.search(r'\bId="%s"' % re.escape(rel_id), relationship.group(0)):
+            target = re.search(r'\bTarget="([^"]+)"', relationship.group(0)).group(1)
+            # Targets are relative to xl/ unless they start at the package root
+            return target.lstrip('/') if target.startswith('/') else posixpath.normpath(f"xl/{target}")
+    raise KeyError(f"no relationship {rel_id} for sheet element {sheet_element}")